@@ -0,0 +1,91 @@
+"""
+Compare the ways of reading CarOffers in a full collection scan: decoding plus CarOffer.from_dict, best of 5 scans.
+
+Run from the project root: PYTHONPATH=src python benchmarks/car_offer_read.py [--count n] [--uri uri]
+
+Without --uri the documents are decoded from BSON in memory, the way the driver decodes each batch of a cursor. With
+--uri they are read from a scratch collection, dropped afterwards.
+"""
+import argparse
+import datetime
+import decimal
+import time
+import typing
+
+import bson
+import pymongo
+
+from carscanner.dao import CarOffer
+from carscanner.dao.car_offer import VEHICLE_TYPE_REGISTRY, _K_LISTED
+
+
+def from_dict_before(d: dict) -> CarOffer:
+    """CarOffer.from_dict before the fast path"""
+    doc = d.copy()
+    doc['id'] = d['_id']['id']
+    del doc['_id']
+    doc.pop(_K_LISTED, None)
+    doc.setdefault('active', None)
+    doc['price'] = doc['price'].to_decimal()
+    return CarOffer(**doc)
+
+
+def offer_docs(count: int) -> typing.Iterator[dict]:
+    ts = datetime.datetime(2020, 4, 1, tzinfo=datetime.timezone.utc)
+    for i in range(count):
+        doc = CarOffer(ts, id=str(9000000000 + i), price=decimal.Decimal(f'{20000 + i % 30000}.00'), fuel='Diesel',
+                       image=f'https://a.allegroimg.com/s128/{i}', imported=False, last_spotted=ts,
+                       location='Warszawa', make='Skoda', mileage=100000 + i % 200000, model='Octavia',
+                       name='Skoda Octavia 1.6 TDI', url=f'https://allegro.pl/i{i}.html', voivodeship='mazowieckie',
+                       year=2000 + i % 20).to_dict()
+        doc[_K_LISTED] = ts
+        yield doc
+
+
+def report(name: str, count: int, fn: typing.Callable[[], typing.List[CarOffer]], repeat: int = 5) -> None:
+    """Best time of repeat scans"""
+    elapsed = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = min(elapsed or float('inf'), time.perf_counter() - start)
+        assert len(result) == count
+        del result
+    print(f'  {name:22s} {elapsed:6.2f} s, {elapsed / count * 1e6:5.1f} us per offer')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=100_000)
+    parser.add_argument('--uri')
+    ns = parser.parse_args()
+
+    plain = bson.CodecOptions(tz_aware=True)
+    registry = plain.with_options(type_registry=VEHICLE_TYPE_REGISTRY)
+    print(f'{ns.count} offers')
+
+    if not ns.uri:
+        data = b''.join(bson.encode(d) for d in offer_docs(ns.count))
+        report('before', ns.count, lambda: [from_dict_before(d) for d in bson.decode_all(data, plain)])
+        report('from_dict', ns.count, lambda: [CarOffer.from_dict(d) for d in bson.decode_all(data, plain)])
+        report('registry + from_dict', ns.count,
+               lambda: [CarOffer.from_dict(d) for d in bson.decode_all(data, registry)])
+        return
+
+    client = pymongo.MongoClient(ns.uri)
+    db = client.get_database('carscanner_benchmark')
+    try:
+        col = db.get_collection('vehicle')
+        col.drop()
+        col.insert_many(offer_docs(ns.count))
+        read_col = col.with_options(codec_options=registry)
+        col = col.with_options(codec_options=plain)
+        report('before', ns.count, lambda: [from_dict_before(d) for d in col.find()])
+        report('from_dict', ns.count, lambda: [CarOffer.from_dict(d) for d in col.find()])
+        report('registry + from_dict', ns.count, lambda: [CarOffer.from_dict(d) for d in read_col.find()])
+    finally:
+        client.drop_database('carscanner_benchmark')
+
+
+if __name__ == '__main__':
+    main()
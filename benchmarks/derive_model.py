@@ -0,0 +1,68 @@
+"""
+Compare the model matcher with the substring scan it replaced, on long descriptions.
+
+Run from the project root: PYTHONPATH=src python benchmarks/derive_model.py
+"""
+import json
+import pathlib
+import random
+import timeit
+import typing
+
+import tinydb
+
+from carscanner.dao import CarMakeModelDao
+from carscanner.data import ReadOnlyMiddleware
+from carscanner.service import ModelMatcher
+
+_STATIC = pathlib.Path(__file__).parent.parent / 'src' / 'carscanner' / 'dao' / 'resources' / 'static.json'
+
+_FILLER = ('sprzedam zadbany samochod bezwypadkowy serwisowany w aso pierwszy wlasciciel w kraju klimatyzacja '
+           'elektryczne szyby podgrzewane fotele komplet kol zimowych zarejestrowany oplacony stan idealny').split()
+
+
+def substring_scan(models: typing.List[str], name: str, description: str) -> typing.Optional[str]:
+    """The scan of derive_model before the matcher"""
+    name = name.lower()
+    description = description.lower()
+    matches = [model.capitalize() for model in models if model in name or model in description]
+    return max(matches, key=len, default=None)
+
+
+def description(models: typing.List[str], words: int) -> str:
+    text = random.choices(_FILLER, k=words)
+    text[random.randrange(words)] = random.choice(models)
+    return '<p>' + ' '.join(text) + '</p>'
+
+
+def main():
+    random.seed(0)
+    makes = {d['make']: d['models'] for d in json.loads(_STATIC.read_text())['make_model'].values()}
+    makes = {make: models for make, models in makes.items() if models}
+    dao = CarMakeModelDao(tinydb.TinyDB(_STATIC, storage=ReadOnlyMiddleware(tinydb.storages.JSONStorage)))
+
+    for words in (50, 500, 5000):
+        offers = [(make, f'{make} {random.choice(models)}', description(models, words))
+                  for make, models in random.choices(list(makes.items()), k=200)]
+        matchers = {}
+
+        def before():
+            # derive_model before the matcher: models looked up for each offer, then scanned
+            return [substring_scan(dao.get_models_by_make(make), name, desc) for make, name, desc in offers]
+
+        def after():
+            # CarOffersBuilder now: one matcher per make
+            result = []
+            for make, name, desc in offers:
+                if make not in matchers:
+                    matchers[make] = ModelMatcher(dao.get_models_by_make(make))
+                result.append(matchers[make].match(name, desc))
+            return result
+
+        old = timeit.timeit(before, number=5) / 5
+        new = timeit.timeit(after, number=5) / 5
+        print(f'{words:5d} words: before {old * 1000:8.2f} ms, after {new * 1000:8.2f} ms per {len(offers)} offers')
+
+
+if __name__ == '__main__':
+    main()
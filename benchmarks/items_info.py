@@ -0,0 +1,60 @@
+"""
+Compare parse_items_info with zeep on doGetItemsInfo replies: time and allocations per chunk of items.
+
+Run from the project root: PYTHONPATH=src:. python benchmarks/items_info.py
+"""
+import timeit
+import tracemalloc
+import types
+import typing
+
+from carscanner.allegro import ItemInfo, parse_items_info
+from tests.carscanner.allegro.stand_in import items_info_response, soap_client
+
+_CHUNK = 10
+"""get_items_info.items_limit"""
+
+
+def allocations(fn: typing.Callable) -> typing.Tuple[int, int]:
+    """Number of allocations still alive and peak memory while running fn"""
+    tracemalloc.start()
+    try:
+        result = fn()
+        current = len(tracemalloc.take_snapshot().traces)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current, peak
+
+
+def main():
+    client = soap_client()
+    binding = client.service._binding
+    operation = binding.get('doGetItemsInfo')
+
+    for description_kb in (1, 10, 50):
+        content = items_info_response(range(_CHUNK))
+        # pad the descriptions, real ones are whole HTML pages
+        content = content.replace(b'bezwypadkowe', b'bezwypadkowe' + b' x' * (description_kb * 512))
+        response = types.SimpleNamespace(status_code=200, headers={}, content=content, encoding='utf-8')
+
+        def zeep_path():
+            return [ItemInfo.from_struct(i) for i in binding.process_reply(client, operation, response)
+                    .arrayItemListInfo.item]
+
+        def zeep_only():
+            return binding.process_reply(client, operation, response)
+
+        def lean_path():
+            return parse_items_info(content)
+
+        print(f'{len(content) // 1024:5d} kB reply of {_CHUNK} items')
+        for name, fn in (('zeep', zeep_only), ('zeep + ItemInfo', zeep_path), ('parse_items_info', lean_path)):
+            seconds = timeit.timeit(fn, number=50) / 50
+            blocks, peak = allocations(fn)
+            print(f'  {name:17s} {seconds * 1000:7.2f} ms, {blocks:6d} live blocks, peak {peak // 1024:6d} kB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compare parse_listing with the allegro_api models on get_listing pages: time and allocations per page.
+
+Run from the project root: PYTHONPATH=src python benchmarks/listing.py
+"""
+import json
+import timeit
+import tracemalloc
+import types
+import typing
+
+import allegro_api
+
+from carscanner.allegro import ListingPage, parse_listing
+
+
+def offer(i: int) -> dict:
+    """A listed offer with the fields the listing returns for cars"""
+    return {
+        'id': str(9000000000 + i),
+        'name': f'Skoda Octavia 1.6 TDI Ambition, salon PL, serwis ASO {i}',
+        'seller': {'id': str(i), 'company': True, 'superSeller': False},
+        'promotion': {'emphasized': False, 'bold': False, 'highlight': False},
+        'delivery': {'availableForFree': False, 'lowestPrice': {'amount': '0.00', 'currency': 'PLN'}},
+        'images': [{'url': f'https://a.allegroimg.com/original/{i}/{n}'} for n in range(5)],
+        'sellingMode': {'format': 'BUY_NOW', 'price': {'amount': f'{30000 + i}.00', 'currency': 'PLN'},
+                        'popularity': 0},
+        'stock': {'unit': 'UNIT', 'available': 1},
+        'category': {'id': '4059'},
+        'publication': {'endingAt': '2020-05-01T10:00:00.000Z'},
+    }
+
+
+def page(size: int) -> bytes:
+    return json.dumps({
+        'items': {'promoted': [offer(i) for i in range(size // 10)],
+                  'regular': [offer(i) for i in range(size // 10, size)]},
+        'searchMeta': {'availableCount': 4321, 'totalCount': 4500, 'fallback': False},
+    }).encode()
+
+
+def allocations(fn: typing.Callable) -> typing.Tuple[int, int]:
+    """Number of allocations still alive and peak memory while running fn"""
+    tracemalloc.start()
+    try:
+        result = fn()
+        current = len(tracemalloc.take_snapshot().traces)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return current, peak
+
+
+def main():
+    client = allegro_api.ApiClient()
+    for size in (10, 100):
+        content = page(size)
+
+        def models():
+            # what get_listing does with the reply
+            return client.deserialize(types.SimpleNamespace(data=content.decode()), 'ListingResponse')
+
+        def models_page():
+            return ListingPage.from_response(models())
+
+        def lean():
+            return parse_listing(content)
+
+        print(f'{len(content) // 1024:5d} kB page of {size} offers')
+        for name, fn in (('models', models), ('models + page', models_page), ('parse_listing', lean)):
+            seconds = timeit.timeit(fn, number=50) / 50
+            blocks, peak = allocations(fn)
+            print(f'  {name:14s} {seconds * 1000:7.2f} ms, {blocks:6d} live blocks, peak {peak // 1024:6d} kB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Compare the run-tagged status sweep with update_status on a synthetic collection of offers.
+
+Run from the project root: PYTHONPATH=src python benchmarks/status_sweep.py [--count n] [--uri uri | --mongomock]
+
+Nine in ten offers are listed. The size of the requests is always shown. The updates are timed against the mongod at
+--uri, in a scratch database dropped afterwards, or in mongomock. mongomock has no indexes and copies documents on
+every update, so keep --count to some thousands there.
+"""
+import argparse
+import datetime
+import time
+
+import bson
+import mongomock
+import pymongo
+
+from carscanner.dao import CarOfferDao
+from carscanner.dao.car_offer import _LISTED_BULK, _LISTED_CHUNK
+
+_MAX_BSON_SIZE = 16 * 1024 * 1024
+
+
+def populate(col, count: int, listed: datetime.datetime) -> None:
+    docs = ({'_id': {'provider': 'allegro', 'id': str(9000000000 + i)}, 'active': True, 'listed': listed}
+            for i in range(count))
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == 10000:
+            col.insert_many(batch)
+            batch = []
+    if batch:
+        col.insert_many(batch)
+
+
+def timed(name: str, fn) -> None:
+    start = time.perf_counter()
+    try:
+        fn()
+    except (pymongo.errors.DocumentTooLarge, pymongo.errors.OperationFailure) as x:
+        print(f'  {name:20s} failed: {x}')
+        return
+    print(f'  {name:20s} {time.perf_counter() - start:8.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1_000_000)
+    parser.add_argument('--uri')
+    parser.add_argument('--mongomock', action='store_true')
+    ns = parser.parse_args()
+
+    previous = datetime.datetime(2020, 4, 1)
+    ts = datetime.datetime(2020, 4, 2)
+    listed_ids = [str(9000000000 + i) for i in range(ns.count) if i % 10]
+
+    query_size = len(bson.encode({'_id.id': {'$nin': listed_ids}, 'active': {'$ne': False}}))
+    print(f'{ns.count} offers, {len(listed_ids)} listed')
+    print(f'  update_status query {query_size / 2 ** 20:.1f} MB, the limit is {_MAX_BSON_SIZE / 2 ** 20:.0f} MB')
+    update_size = len(bson.encode({'q': {'_id.id': {'$in': listed_ids[:_LISTED_CHUNK]}}, 'u': {'$set': {'listed': ts}},
+                                   'multi': True}))
+    print(f'  run tag sweep: updates of {update_size / 2 ** 10:.0f} kB, '
+          f'bulk writes of {update_size * _LISTED_BULK / 2 ** 20:.1f} MB')
+
+    if not ns.uri and not ns.mongomock:
+        return
+    client = pymongo.MongoClient(ns.uri) if ns.uri else mongomock.MongoClient()
+    db = client.get_database('carscanner_benchmark')
+    try:
+        for name in ('update_status', 'run tag sweep'):
+            col = db.get_collection(name.replace(' ', '_'))
+            col.drop()
+            col.create_index('_id.id')
+            col.create_index('listed')
+            populate(col, ns.count, previous)
+            dao = CarOfferDao(col)
+
+            if name == 'update_status':
+                timed(name, lambda: dao.update_status(listed_ids, ts))
+            else:
+                timed(name, lambda: (dao.mark_listed(listed_ids, ts), dao.deactivate_unlisted(ts)))
+            print(f'  {col.count_documents({"active": False})} deactivated')
+    finally:
+        client.drop_database('carscanner_benchmark')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,7 @@
 from .allegro import CarscannerAllegro, codes_path
+from .async_allegro import AsyncCarscannerAllegro
 from .auth import CarScannerCodeAuth, EnvironClientCodeStore, InsecureTokenStore, YamlClientCodeStore
+from .cassette import CassetteWriter, RecordingAllegro, ReplayAllegro
+from .items_info import ItemInfo, parse_items_info
+from .listing import ListedOffer, ListingPage, parse_listing
+from .ratelimit import RequestScheduler, TokenBucket
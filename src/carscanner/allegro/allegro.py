@@ -1,7 +1,15 @@
+import logging
 import typing
 
 import allegro_api
 import allegro_pl
+import zeep.exceptions
+
+from .items_info import SESSION_ERRORS, ItemInfo, parse_items_info
+from .listing import ListingPage, parse_listing
+from .ratelimit import REST, SOAP, RequestScheduler
+
+log = logging.getLogger(__name__)
 
 
 def get_root():
@@ -16,9 +24,20 @@ codes_path = get_root() / 'allegro.yaml'
 
 
 class CarscannerAllegro:
-    def __init__(self, allegro: allegro_pl.Allegro):
+    def __init__(self, allegro: allegro_pl.Allegro, request_scheduler: typing.Optional[RequestScheduler] = None,
+                 lean_items_info: bool = False, lean_listing: bool = False):
+        """
+        :param request_scheduler: If set, every call goes through it, to be paced and retried.
+        :param lean_items_info: If set, get_item_infos reads the raw SOAP reply with parse_items_info instead of
+            letting zeep decode it. Needs a real SOAP client, not a cassette.
+        :param lean_listing: If set, get_listing_page reads the raw JSON with parse_listing instead of building the
+            allegro_api models. Needs a real REST service, not a cassette.
+        """
         rest = allegro.rest_service()
         soap = allegro.soap_service()
+        self._soap = soap
+        self._soap_client = allegro.soap_client() if lean_items_info else None
+        self._lean_listing = lean_listing
 
         self.get_categories = rest.get_categories
         self.get_category_parameters = rest.get_category_parameters
@@ -26,6 +45,18 @@ class CarscannerAllegro:
         self.get_listing = rest.get_listing
         self.get_states_info = soap.get_states_info
 
+        soap_names = ['get_items_info', 'get_states_info']
+        if lean_items_info:
+            # replaces get_items_info for the details, so it is paced as one
+            self.get_item_infos = self._get_item_infos_lean
+            soap_names.append('get_item_infos')
+
+        if request_scheduler:
+            for service, names in ((REST, ['get_categories', 'get_category_parameters', 'get_listing']),
+                                   (SOAP, soap_names)):
+                for name in names:
+                    setattr(self, name, request_scheduler.wrap(service, name, getattr(self, name)))
+
     def get_filters(self, cat_id: str) -> typing.List[allegro_api.models.ListingResponseFilters]:
         return self.get_listing(
             category_id=cat_id,
@@ -33,3 +64,29 @@ class CarscannerAllegro:
             include=['-all', 'filters'],
             _request_timeout=(30, 30),
         ).filters
+
+    def get_listing_page(self, **kwargs) -> ListingPage:
+        """get_listing, as a ListingPage"""
+        if self._lean_listing:
+            return parse_listing(self.get_listing(_preload_content=False, **kwargs).data)
+        return ListingPage.from_response(self.get_listing(**kwargs))
+
+    def get_item_infos(self, items: typing.List[str], description=False, image_url=False, attrs=False) \
+            -> typing.List[ItemInfo]:
+        """The items of get_items_info, as ItemInfo"""
+        container = self.get_items_info(items, description, image_url, attrs).arrayItemListInfo
+        return [ItemInfo.from_struct(i) for i in container.item] if container else []
+
+    def _get_item_infos_lean(self, items: typing.List[str], description=False, image_url=False, attrs=False) \
+            -> typing.List[ItemInfo]:
+        for attempt in (1, 2):
+            # the service still logs in when there's no session
+            with self._soap_client.settings(raw_response=True):
+                response = self._soap.get_items_info(items, description, image_url, attrs)
+            try:
+                return parse_items_info(response.content, response.status_code)
+            except zeep.exceptions.Fault as x:
+                if attempt == 2 or x.code not in SESSION_ERRORS:
+                    raise
+                log.warning("%s - %s", x.code, x.message)
+                self._soap.session_handle = None
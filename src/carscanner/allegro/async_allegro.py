@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import typing
+
+import aiohttp
+import allegro_api
+import allegro_pl
+import zeep.exceptions
+import zeep.wsdl.utils
+import zeep.xsd
+
+from .items_info import SESSION_ERRORS, ItemInfo, parse_items_info
+from .listing import ListingPage, parse_listing
+from .ratelimit import REST, SOAP, RequestScheduler
+
+log = logging.getLogger(__name__)
+
+_ACCEPT_PUBLIC_V1 = 'application/vnd.allegro.public.v1+json'
+
+
+class _Response:
+    """The parts of requests.Response that allegro_api and zeep read when decoding a reply"""
+
+    def __init__(self, status: int, headers: typing.Mapping[str, str], content: bytes):
+        self.status_code = status
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.data = content
+        self.encoding = 'utf-8'
+
+
+class AsyncCarscannerAllegro:
+    """
+    Asyncio counterpart of CarscannerAllegro.
+
+    Requests are sent with aiohttp, so hundreds of them can be in flight from a single thread; max_concurrency limits
+    how many. The token and the SOAP session are shared with the synchronous services: requests are built and replies
+    decoded by their clients, and tokens are refreshed through allegro_auth.
+
+    With a request_scheduler, calls are paced by the same token buckets as CarscannerAllegro's, before they take a
+    place among the max_concurrency, and retried on the same errors.
+
+    Use as an async context manager, the HTTP session lives as long as the block.
+    """
+
+    def __init__(self, allegro: allegro_pl.Allegro, allegro_auth: allegro_pl.AllegroAuth, max_concurrency: int = 100,
+                 rest_uri: str = None, soap_uri: str = None,
+                 request_scheduler: typing.Optional[RequestScheduler] = None):
+        self._rest_client = allegro.rest_client()
+        self._soap_client = allegro.soap_client()
+        self._soap = allegro.soap_service()
+        self._auth = allegro_auth
+        self._max_concurrency = max_concurrency
+        self._rest_uri = rest_uri or self._rest_client.configuration.host
+        self._soap_uri = soap_uri
+
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._semaphore: typing.Optional[asyncio.Semaphore] = None
+        self._login_lock: typing.Optional[asyncio.Lock] = None
+
+        if request_scheduler:
+            for service, names in ((REST, ['get_listing', 'get_listing_page', 'get_categories']),
+                                   (SOAP, ['get_items_info', 'get_item_infos'])):
+                for name in names:
+                    setattr(self, name, request_scheduler.wrap_async(service, name, getattr(self, name)))
+
+    async def __aenter__(self) -> 'AsyncCarscannerAllegro':
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._login_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self._max_concurrency))
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._session.close()
+        self._session = None
+
+    async def get_listing(self, category_id: str = None, offset: int = None, limit: int = None, sort: str = None,
+                          include: typing.List[str] = None, fallback: bool = None,
+                          dynamic_filters: typing.Dict[str, str] = None, **_) -> allegro_api.models.ListingResponse:
+        return await self._rest_get('/offers/listing', _listing_params(category_id, offset, limit, sort, include,
+                                                                       fallback, dynamic_filters), 'ListingResponse')
+
+    get_listing.limit_min = allegro_pl.AllegroRestService.get_listing.limit_min
+    get_listing.limit_max = allegro_pl.AllegroRestService.get_listing.limit_max
+
+    async def get_listing_page(self, category_id: str = None, offset: int = None, limit: int = None,
+                               sort: str = None, include: typing.List[str] = None, fallback: bool = None,
+                               dynamic_filters: typing.Dict[str, str] = None, **_) -> ListingPage:
+        """get_listing read by parse_listing, without building the allegro_api models"""
+        return await self._rest_get('/offers/listing', _listing_params(category_id, offset, limit, sort, include,
+                                                                       fallback, dynamic_filters), parse_listing)
+
+    async def get_categories(self, parent_id: str = None) -> allegro_api.models.CategoriesDto:
+        params = [('parent.id', parent_id)] if parent_id is not None else []
+        return await self._rest_get('/sale/categories', params, 'CategoriesDto')
+
+    async def get_filters(self, cat_id: str) -> typing.List[allegro_api.models.ListingResponseFilters]:
+        return (await self.get_listing(
+            category_id=cat_id,
+            limit=self.get_listing.limit_min,
+            include=['-all', 'filters'],
+        )).filters
+
+    async def get_items_info(self, items: typing.List[int], description=False, image_url=False, attrs=False,
+                             postage_opts=False, company_info=False, product_info=False, after_sales_conds=False,
+                             ean=False, additional_services_grp=False) -> zeep.xsd.CompoundValue:
+        def args():
+            return (self._soap.session_handle, self._soap_client.get_type('ns0:ArrayOfLong')(items), int(description),
+                    int(image_url), int(attrs), int(postage_opts), int(company_info), int(product_info),
+                    int(after_sales_conds), int(ean), int(additional_services_grp))
+
+        return await self._soap_call('doGetItemsInfo', args)
+
+    get_items_info.items_limit = allegro_pl.AllegroSoapService.get_items_info.items_limit
+
+    async def get_item_infos(self, items: typing.List[str], description=False, image_url=False, attrs=False) \
+            -> typing.List[ItemInfo]:
+        """get_items_info read by parse_items_info, without building zeep objects"""
+
+        def args():
+            return (self._soap.session_handle, self._soap_client.get_type('ns0:ArrayOfLong')(items), int(description),
+                    int(image_url), int(attrs), 0, 0, 0, 0, 0, 0)
+
+        return await self._soap_call('doGetItemsInfo', args, lambda resp: parse_items_info(resp.content, resp.status))
+
+    async def _rest_get(self, path: str, params: list,
+                        response_type: typing.Union[str, typing.Callable[[bytes], typing.Any]]):
+        """Decode the reply as the named allegro_api model, or with response_type if it's a function"""
+        for attempt in (1, 2):
+            headers = {
+                'Accept': _ACCEPT_PUBLIC_V1,
+                'Authorization': f'Bearer {self._rest_client.configuration.access_token}',
+            }
+            async with self._semaphore:
+                async with self._session.get(self._rest_uri + path, params=params, headers=headers) as resp:
+                    content = await resp.read()
+
+            if resp.status == 401 and attempt == 1 and _is_invalid_token(content):
+                await self._refresh_token()
+                continue
+            if not 200 <= resp.status < 300:
+                raise allegro_api.rest.ApiException(http_resp=_ApiExceptionResponse(resp.status, resp.reason,
+                                                                                     resp.headers, content))
+            if callable(response_type):
+                return response_type(content)
+            return self._rest_client.deserialize(_Response(resp.status, resp.headers, content), response_type)
+
+    async def _soap_call(self, operation: str, args: typing.Callable[[], tuple],
+                         process: typing.Callable[[_Response], typing.Any] = None):
+        binding = self._soap_client.service._binding
+        if process is None:
+            def process(resp: _Response):
+                return binding.process_reply(self._soap_client, binding.get(operation), resp)
+
+        for attempt in (1, 2):
+            if self._soap.session_handle is None or attempt == 2:
+                await self._login()
+
+            envelope, headers = binding._create(operation, args(), {}, client=self._soap_client)
+            address = self._soap_uri or self._soap_client.service._binding_options['address']
+
+            async with self._semaphore:
+                async with self._session.post(address, data=zeep.wsdl.utils.etree_to_string(envelope),
+                                              headers=headers) as resp:
+                    content = await resp.read()
+
+            try:
+                return process(_Response(resp.status, resp.headers, content))
+            except zeep.exceptions.Fault as x:
+                if attempt == 2 or x.code not in SESSION_ERRORS:
+                    raise
+                log.warning("%s - %s", x.code, x.message)
+
+    async def _login(self) -> None:
+        handle = self._soap.session_handle
+        async with self._login_lock:
+            # someone else may have logged in while we were waiting
+            if handle is self._soap.session_handle:
+                await asyncio.get_event_loop().run_in_executor(None, self._soap.login_with_access_token)
+
+    async def _refresh_token(self) -> None:
+        await asyncio.get_event_loop().run_in_executor(None, self._auth.refresh_token)
+
+
+class _ApiExceptionResponse:
+    def __init__(self, status, reason, headers, data):
+        self.status = status
+        self.reason = reason
+        self.data = data
+        self._headers = headers
+
+    def getheaders(self):
+        return self._headers
+
+
+def _listing_params(category_id, offset, limit, sort, include, fallback, dynamic_filters) \
+        -> typing.List[typing.Tuple[str, str]]:
+    params = []
+    for key, value in [('category.id', category_id), ('offset', offset), ('limit', limit), ('sort', sort),
+                       ('fallback', fallback)]:
+        if value is not None:
+            params.append((key, _query_value(value)))
+    params.extend(('include', i) for i in include or [])
+    params.extend((key, _query_value(value)) for key, value in (dynamic_filters or {}).items())
+    return params
+
+
+def _query_value(value) -> str:
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
+def _is_invalid_token(content: bytes) -> bool:
+    try:
+        return json.loads(content).get('error') == 'invalid_token'
+    except ValueError:
+        return False
@@ -0,0 +1,221 @@
+import collections
+import datetime
+import decimal
+import functools
+import gzip
+import json
+import logging
+import pathlib
+import threading
+import time
+import types
+import typing
+
+import allegro_api
+import allegro_pl
+import zeep.helpers
+
+log = logging.getLogger(__name__)
+
+MODE_RECORD = 'record'
+MODE_REPLAY = 'replay'
+
+_REST_METHODS = ['get_categories', 'get_category_parameters', 'get_listing']
+_SOAP_METHODS = ['get_items_info', 'get_states_info']
+
+_K_METHOD = 'm'
+_K_KEY = 'k'
+_K_TYPE = 't'
+_K_RESPONSE = 'r'
+
+_T_DECIMAL = '$decimal'
+_T_DATETIME = '$datetime'
+_T_DATE = '$date'
+
+_IGNORED_ARGS = ('_request_timeout',)
+"""Arguments that don't change the response, left out of the key"""
+
+
+def _call_key(args: tuple, kwargs: dict) -> str:
+    kwargs = {k: v for k, v in kwargs.items() if k not in _IGNORED_ARGS}
+    return json.dumps([args, kwargs], sort_keys=True, default=str, ensure_ascii=False)
+
+
+def _encode_soap(value):
+    if isinstance(value, decimal.Decimal):
+        return {_T_DECIMAL: str(value)}
+    if isinstance(value, datetime.datetime):
+        return {_T_DATETIME: value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {_T_DATE: value.isoformat()}
+    raise TypeError(type(value))
+
+
+def _decode_soap(value):
+    """Turn SOAP structures into objects with attribute access, like the ones zeep returns"""
+    if isinstance(value, list):
+        return [_decode_soap(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        if _T_DECIMAL in value:
+            return decimal.Decimal(value[_T_DECIMAL])
+        if _T_DATETIME in value:
+            return datetime.datetime.fromisoformat(value[_T_DATETIME])
+        if _T_DATE in value:
+            return datetime.date.fromisoformat(value[_T_DATE])
+    return types.SimpleNamespace(**{k: _decode_soap(v) for k, v in value.items()})
+
+
+class _JsonResponse:
+    """The part of a REST response that ApiClient.deserialize reads"""
+
+    def __init__(self, data: str):
+        self.data = data
+
+
+class CassetteWriter:
+    """Appends the responses to a gzipped file of JSON lines. Thread-safe"""
+
+    def __init__(self, path: pathlib.Path):
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._rest_client = allegro_api.ApiClient()
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def write_rest(self, method: str, key: str, response) -> None:
+        self._write({_K_METHOD: method, _K_KEY: key, _K_TYPE: type(response).__name__,
+                     _K_RESPONSE: self._rest_client.sanitize_for_serialization(response)})
+
+    def write_soap(self, method: str, key: str, response) -> None:
+        self._write({_K_METHOD: method, _K_KEY: key, _K_RESPONSE: zeep.helpers.serialize_object(response, dict)})
+
+    def _write(self, record: dict) -> None:
+        line = json.dumps(record, default=_encode_soap, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._file.write(line)
+            self._file.write('\n')
+            self.count += 1
+
+    def close(self) -> None:
+        self._file.close()
+        log.info('Recorded %d responses', self.count)
+
+
+class _RecordingService:
+    def __init__(self, service, methods: typing.List[str], write: typing.Callable[[str, str, typing.Any], None]):
+        self._service = service
+        for name in methods:
+            setattr(self, name, self._wrap(name, getattr(service, name), write))
+
+    @staticmethod
+    def _wrap(name: str, fn: typing.Callable, write: typing.Callable[[str, str, typing.Any], None]) -> typing.Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            result = fn(*args, **kwargs)
+            write(name, _call_key(args, kwargs), result)
+            return result
+
+        return wrapper
+
+    def __getattr__(self, name):
+        return getattr(self._service, name)
+
+
+class RecordingAllegro:
+    """
+    Allegro that writes the responses of the calls used by the updater to a cassette.
+
+    Everything else passes through.
+    """
+
+    def __init__(self, allegro: allegro_pl.Allegro, writer: CassetteWriter):
+        self._allegro = allegro
+        self._rest = _RecordingService(allegro.rest_service(), _REST_METHODS, writer.write_rest)
+        self._soap = _RecordingService(allegro.soap_service(), _SOAP_METHODS, writer.write_soap)
+
+    def rest_service(self):
+        return self._rest
+
+    def soap_service(self):
+        return self._soap
+
+    def __getattr__(self, name):
+        return getattr(self._allegro, name)
+
+
+class Cassette:
+    """Recorded responses, by method and arguments. Calls repeated with the same arguments get the responses in the
+    recorded order, and the last one after that."""
+
+    def __init__(self, path: pathlib.Path):
+        self._responses: typing.Dict[typing.Tuple[str, str], typing.List[dict]] = collections.defaultdict(list)
+        self._served: typing.Dict[typing.Tuple[str, str], int] = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self._responses[record[_K_METHOD], record[_K_KEY]].append(record)
+        log.info('Loaded %d responses from %s', sum(len(r) for r in self._responses.values()), path)
+
+    def get(self, method: str, key: str) -> dict:
+        k = method, key
+        with self._lock:
+            responses = self._responses.get(k)
+            if not responses:
+                raise LookupError('Not in cassette', method, key)
+            idx = min(self._served[k], len(responses) - 1)
+            self._served[k] += 1
+            return responses[idx]
+
+
+class _ReplayService:
+    def __init__(self, cassette: Cassette, latency: float, methods: typing.List[str], service_type: type,
+                 decode: typing.Callable[[dict], typing.Any]):
+        for name in methods:
+            setattr(self, name, self._replay(name, getattr(service_type, name), cassette, latency, decode))
+
+    @staticmethod
+    def _replay(name: str, fn: typing.Callable, cassette: Cassette, latency: float,
+                decode: typing.Callable[[dict], typing.Any]) -> typing.Callable:
+        # fn is only used for its attributes, like limit_max
+        @functools.wraps(fn)
+        def replay(*args, **kwargs):
+            record = cassette.get(name, _call_key(args, kwargs))
+            if latency:
+                time.sleep(latency)
+            return decode(record)
+
+        return replay
+
+
+class ReplayAllegro:
+    """
+    Allegro serving the responses recorded by RecordingAllegro, without network access.
+
+    latency is the time in seconds each call takes, to stand in for the network. Only the services are replayed, the
+    clients used by AsyncCarscannerAllegro are not connected.
+    """
+
+    def __init__(self, path: pathlib.Path, latency: float = 0.):
+        cassette = Cassette(path)
+        self._rest_client = allegro_api.ApiClient()
+        self._rest = _ReplayService(cassette, latency, _REST_METHODS, allegro_pl.AllegroRestService, self._decode_rest)
+        self._soap = _ReplayService(cassette, latency, _SOAP_METHODS, allegro_pl.AllegroSoapService,
+                                    lambda record: _decode_soap(record[_K_RESPONSE]))
+
+    def rest_client(self) -> allegro_api.ApiClient:
+        return self._rest_client
+
+    def rest_service(self):
+        return self._rest
+
+    def soap_client(self) -> None:
+        return None
+
+    def soap_service(self):
+        return self._soap
+
+    def _decode_rest(self, record: dict):
+        return self._rest_client.deserialize(_JsonResponse(json.dumps(record[_K_RESPONSE])), record[_K_TYPE])
@@ -0,0 +1,126 @@
+import io
+import typing
+
+import lxml.etree
+import zeep.exceptions
+
+SESSION_ERRORS = ('ERR_INVALID_ACCESS_TOKEN', 'ERR_NO_SESSION')
+"""Fault codes meaning the SOAP session must be renewed"""
+
+_NS = '{https://webapi.allegro.pl/service.php}'
+_SOAP_FAULT = '{http://schemas.xmlsoap.org/soap/envelope/}Fault'
+
+_ITEM = _NS + 'item'
+_ITEM_LIST = _NS + 'arrayItemListInfo'
+_ITEM_INFO = _NS + 'itemInfo'
+_ITEM_CATS = _NS + 'itemCats'
+_ITEM_ATTRIBS = _NS + 'itemAttribs'
+_ITEM_IMAGES = _NS + 'itemImages'
+_CAT_NAME = _NS + 'catName'
+_ATTRIB_NAME = _NS + 'attribName'
+_ATTRIB_VALUES = _NS + 'attribValues'
+_IMAGE_TYPE = _NS + 'imageType'
+_IMAGE_URL = _NS + 'imageUrl'
+
+_INFO_FIELDS = {
+    _NS + 'itId': 'id',
+    _NS + 'itName': 'name',
+    _NS + 'itDescription': 'description',
+    _NS + 'itLocation': 'location',
+    _NS + 'itState': 'state',
+}
+
+
+class ItemInfo:
+    """
+    The parts of a doGetItemsInfo item that CarOffersBuilder reads.
+
+    cats are the category names from the root down, attribs map attribute names to their values and images map image
+    types to the URL of the first image of that type.
+    """
+    __slots__ = ('id', 'name', 'description', 'location', 'state', 'cats', 'attribs', 'images')
+
+    def __init__(self, id: int = None, name: str = None, description: str = None, location: str = None,
+                 state: int = None, cats: typing.List[str] = None, attribs: typing.Dict[str, typing.List[str]] = None,
+                 images: typing.Dict[int, str] = None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.location = location
+        self.state = state
+        self.cats = cats if cats is not None else []
+        self.attribs = attribs if attribs is not None else {}
+        self.images = images if images is not None else {}
+
+    @classmethod
+    def from_struct(cls, o) -> 'ItemInfo':
+        """Copy an item returned by zeep"""
+        info = o.itemInfo
+        images = {}
+        if o.itemImages is not None:
+            for img in o.itemImages.item:
+                images.setdefault(img.imageType, img.imageUrl)
+        return cls(info.itId, info.itName, info.itDescription, info.itLocation, info.itState,
+                   [cat.catName for cat in o.itemCats.item],
+                   {a.attribName: a.attribValues.item for a in o.itemAttribs.item},
+                   images)
+
+    def __repr__(self):
+        return f'ItemInfo({self.id!r}, {self.name!r})'
+
+
+def parse_items_info(content: bytes, status: int = 200) -> typing.List[ItemInfo]:
+    """
+    Read the items of a doGetItemsInfo reply.
+
+    Each item is read as soon as it is parsed and then dropped from the tree, so memory doesn't grow with the reply.
+    Errors are raised as zeep would: TransportError for a reply that isn't XML, Fault for a SOAP fault.
+    """
+    if status != 200 and not content:
+        raise zeep.exceptions.TransportError(f'Server returned HTTP status {status} (no content available)',
+                                             status_code=status)
+
+    result = []
+    try:
+        for _, el in lxml.etree.iterparse(io.BytesIO(content), events=('end',), tag=(_ITEM, _SOAP_FAULT),
+                                          resolve_entities=False, no_network=True, huge_tree=True):
+            if el.tag == _SOAP_FAULT:
+                raise zeep.exceptions.Fault(el.findtext('faultstring'), el.findtext('faultcode'))
+
+            parent = el.getparent()
+            if parent.tag != _ITEM_LIST:
+                continue
+            result.append(_parse_item(el))
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+    except lxml.etree.XMLSyntaxError as x:
+        raise zeep.exceptions.TransportError(f'Server returned response ({status}) with invalid XML: {x}',
+                                             status_code=status, content=content)
+
+    if status != 200:
+        raise zeep.exceptions.Fault('Unknown fault occured')
+    return result
+
+
+def _parse_item(el) -> ItemInfo:
+    result = ItemInfo()
+    for part in el:
+        tag = part.tag
+        if tag == _ITEM_INFO:
+            for field in part:
+                name = _INFO_FIELDS.get(field.tag)
+                if name is not None:
+                    setattr(result, name, field.text)
+            result.id = int(result.id)
+            if result.state is not None:
+                result.state = int(result.state)
+        elif tag == _ITEM_CATS:
+            result.cats = [cat.findtext(_CAT_NAME) for cat in part]
+        elif tag == _ITEM_ATTRIBS:
+            result.attribs = {attrib.findtext(_ATTRIB_NAME): [v.text for v in attrib.find(_ATTRIB_VALUES)]
+                              for attrib in part}
+        elif tag == _ITEM_IMAGES:
+            for img in part:
+                result.images.setdefault(int(img.findtext(_IMAGE_TYPE)), img.findtext(_IMAGE_URL))
+    return result
@@ -0,0 +1,60 @@
+import json
+import typing
+
+import allegro_api.models
+
+
+class ListedOffer:
+    """The parts of a listed offer that OfferService and CarOffersBuilder read. amount is the price, as a string"""
+    __slots__ = ('id', 'name', 'amount', 'currency')
+
+    def __init__(self, id: str, name: str = None, amount: str = None, currency: str = None):
+        self.id = id
+        self.name = name
+        self.amount = amount
+        self.currency = currency
+
+    @classmethod
+    def from_model(cls, offer: allegro_api.models.ListingOffer) -> 'ListedOffer':
+        price = offer.selling_mode.price
+        return cls(offer.id, offer.name, price.amount, price.currency)
+
+    def __repr__(self):
+        return f'ListedOffer({self.id!r}, {self.name!r}, {self.amount!r}, {self.currency!r})'
+
+
+class ListingPage:
+    """A page of get_listing"""
+    __slots__ = ('promoted', 'regular', 'available_count', 'total_count')
+
+    def __init__(self, promoted: typing.List[ListedOffer], regular: typing.List[ListedOffer], available_count: int,
+                 total_count: int = None):
+        self.promoted = promoted
+        self.regular = regular
+        self.available_count = available_count
+        self.total_count = total_count
+
+    @classmethod
+    def from_response(cls, response: allegro_api.models.ListingResponse) -> 'ListingPage':
+        items = response.items
+        meta = response.search_meta
+        return cls([ListedOffer.from_model(o) for o in items.promoted or []] if items else [],
+                   [ListedOffer.from_model(o) for o in items.regular or []] if items else [],
+                   meta.available_count if meta else None, meta.total_count if meta else None)
+
+
+def parse_listing(content: typing.Union[bytes, str]) -> ListingPage:
+    """Read a get_listing reply without building the allegro_api models"""
+    doc = json.loads(content)
+    items = doc.get('items') or {}
+    meta = doc.get('searchMeta') or {}
+    return ListingPage(_offers(items.get('promoted')), _offers(items.get('regular')), meta.get('availableCount'),
+                       meta.get('totalCount'))
+
+
+def _offers(offers: typing.Optional[typing.List[dict]]) -> typing.List[ListedOffer]:
+    result = []
+    for o in offers or ():
+        price = (o.get('sellingMode') or {}).get('price') or {}
+        result.append(ListedOffer(o['id'], o.get('name'), price.get('amount'), price.get('currency')))
+    return result
@@ -0,0 +1,221 @@
+import asyncio
+import collections
+import dataclasses
+import functools
+import logging
+import random
+import threading
+import time
+import typing
+
+import aiohttp
+import allegro_api.rest
+import requests.exceptions
+import urllib3.exceptions
+import zeep.exceptions
+
+log = logging.getLogger(__name__)
+
+REST = 'rest'
+SOAP = 'soap'
+
+_TRANSIENT_STATUS = (429, 502, 503, 504)
+"""HTTP statuses meaning the request may succeed if sent again later"""
+
+_CONNECTION_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    urllib3.exceptions.HTTPError,
+    aiohttp.ClientConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average, and bursts of up to burst requests.
+
+    Thread-safe. Tokens are reserved before waiting, so concurrent callers queue up instead of all waking up at once.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: typing.Callable[[], float] = time.monotonic):
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self._rate if self._tokens < 0 else 0.
+
+
+@dataclasses.dataclass
+class EndpointStats:
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    latency: float = 0.
+    max_latency: float = 0.
+    wait: float = 0.
+
+    def report(self, name: str) -> None:
+        log.info('%s: %d requests, %d retries, %d errors, latency avg %.3fs max %.3fs, waited %.1fs',
+                 name, self.requests, self.retries, self.errors, self.latency / max(self.requests, 1),
+                 self.max_latency, self.wait)
+
+
+class RequestScheduler:
+    """
+    Paces the requests of each service with its own TokenBucket, and retries them when throttled.
+
+    Throttling (429), gateway errors and connection errors are retried up to max_retries times, with exponential
+    backoff and full jitter. Other errors are raised right away. Request counts, latencies and waits are kept per
+    endpoint, see report().
+
+    Coroutine functions are scheduled the same way with wrap_async, waiting without blocking the event loop. They share
+    the buckets and the stats with the threads.
+    """
+
+    def __init__(self, buckets: typing.Dict[str, TokenBucket], max_retries: int = 5, backoff: float = .5,
+                 max_backoff: float = 30., sleep: typing.Callable[[float], None] = time.sleep,
+                 async_sleep: typing.Callable[[float], typing.Awaitable] = asyncio.sleep):
+        self._buckets = buckets
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        self._stats: typing.Dict[str, EndpointStats] = collections.defaultdict(EndpointStats)
+        self._stats_lock = threading.Lock()
+
+    def wrap(self, service: str, name: str, fn: typing.Callable) -> typing.Callable:
+        """Send the calls to fn through the bucket of the service. Attributes of fn, like limit_max, are kept"""
+        name = f'{service}.{name}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self.call(service, name, fn, *args, **kwargs)
+
+        return wrapper
+
+    def call(self, service: str, name: str, fn: typing.Callable, *args, **kwargs):
+        bucket = self._buckets[service]
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait:
+                self._sleep(wait)
+
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as x:
+                attempt += 1
+                delay = self._failed(name, wait, time.perf_counter() - start, x, attempt)
+                if delay is None:
+                    raise
+                self._sleep(delay)
+                continue
+
+            self._record(name, wait, time.perf_counter() - start)
+            return result
+
+    def wrap_async(self, service: str, name: str, fn: typing.Callable[..., typing.Awaitable]) \
+            -> typing.Callable[..., typing.Awaitable]:
+        """Like wrap, for a coroutine function"""
+        name = f'{service}.{name}'
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.call_async(service, name, fn, *args, **kwargs)
+
+        return wrapper
+
+    async def call_async(self, service: str, name: str, fn: typing.Callable[..., typing.Awaitable], *args, **kwargs):
+        bucket = self._buckets[service]
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait:
+                await self._async_sleep(wait)
+
+            start = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as x:
+                attempt += 1
+                delay = self._failed(name, wait, time.perf_counter() - start, x, attempt)
+                if delay is None:
+                    raise
+                await self._async_sleep(delay)
+                continue
+
+            self._record(name, wait, time.perf_counter() - start)
+            return result
+
+    def report(self) -> None:
+        for name, stats in sorted(self._stats.items()):
+            stats.report(name)
+
+    def get_stats(self) -> typing.Dict[str, EndpointStats]:
+        return dict(self._stats)
+
+    def _failed(self, name: str, wait: float, latency: float, x: Exception, attempt: int) -> typing.Optional[float]:
+        """Record the failed attempt, and return how long to wait before the next one, or None not to retry"""
+        retry = attempt <= self._max_retries and _is_transient(x)
+        self._record(name, wait, latency, error=True, retry=retry)
+        if not retry:
+            return None
+        delay = self._retry_delay(x, attempt)
+        log.warning('%s: %s, retry %d in %.1fs', name, _describe(x), attempt, delay)
+        return delay
+
+    def _retry_delay(self, x: Exception, attempt: int) -> float:
+        retry_after = _retry_after(x)
+        if retry_after is not None:
+            return min(retry_after, self._max_backoff)
+        return random.uniform(0, min(self._max_backoff, self._backoff * 2 ** attempt))
+
+    def _record(self, name: str, wait: float, latency: float, error=False, retry=False) -> None:
+        with self._stats_lock:
+            stats = self._stats[name]
+            stats.requests += 1
+            stats.wait += wait
+            stats.latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            if error:
+                stats.errors += 1
+            if retry:
+                stats.retries += 1
+
+
+def _status(x: Exception) -> typing.Optional[int]:
+    if isinstance(x, allegro_api.rest.ApiException):
+        return x.status
+    if isinstance(x, zeep.exceptions.TransportError):
+        return x.status_code
+    return None
+
+
+def _is_transient(x: Exception) -> bool:
+    return _status(x) in _TRANSIENT_STATUS or isinstance(x, _CONNECTION_ERRORS)
+
+
+def _retry_after(x: Exception) -> typing.Optional[float]:
+    headers = getattr(x, 'headers', None)
+    try:
+        return float(headers['Retry-After']) if headers and 'Retry-After' in headers else None
+    except ValueError:
+        return None
+
+
+def _describe(x: Exception) -> str:
+    status = _status(x)
+    return f'HTTP {status}' if status else type(x).__name__
@@ -11,6 +11,7 @@ import carscanner.service
 import carscanner.utils
 from carscanner.cli import CarListCommand, CriteriaCommand, FilterCommand, OffersCommand, VoivodeshipCommand, \
     TokenCommand, CmdContext
+from carscanner.allegro.cassette import MODE_RECORD, MODE_REPLAY
 from carscanner.context import ENV_LOCAL, ENV_TRAVIS, Context, Config
 
 log = logging.getLogger(__name__)
@@ -25,6 +26,13 @@ def build_parser():
     parser.add_argument('--no-fetch', '--nf', action='store_true', default=False,
                         help="Don't fetch token if it's expired")
     parser.add_argument('--version', '-v', action='version', version=carscanner.__version__)
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', type=pathlib.Path, metavar='path',
+                          help='Write Allegro responses to a cassette file')
+    cassette.add_argument('--replay', type=pathlib.Path, metavar='path',
+                          help='Serve Allegro responses from a cassette file, without network access')
+    parser.add_argument('--replay-latency', type=float, default=0., metavar='seconds',
+                        help='Time each replayed call takes. Default is %(default)s')
     subparsers = parser.add_subparsers()
 
     for c in [
@@ -47,12 +55,17 @@ def main():
     ns = build_parser().parse_args()
     config = Config()
     config.allow_fetch = ns.environment == ENV_LOCAL
+    if ns.record or ns.replay:
+        config.cassette_mode = MODE_RECORD if ns.record else MODE_REPLAY
+        config.cassette_path = ns.record or ns.replay
+        config.cassette_latency = ns.replay_latency
 
     with pytel.Pytel([
         Context(),
         CmdContext(ns),
         {
             'config': config,
+            'ns': ns,
         },
     ]) as context:
 
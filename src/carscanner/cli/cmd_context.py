@@ -30,3 +30,6 @@ class CmdContext:
     def export_path(self, data_path: Path) -> Path:
         export_name = self._ns.output if 'output' in self._ns else 'export.json'
         return data_path / export_name
+
+    def export_artifacts_path(self, export_path: Path) -> Path:
+        return export_path.parent
@@ -1,5 +1,7 @@
 import pathlib
 
+from carscanner.service.export import LAYOUT_COLUMNS, LAYOUT_ROWS
+
 
 class OffersCommand:
     @staticmethod
@@ -8,15 +10,48 @@ class OffersCommand:
         offers_parser.set_defaults(func=lambda _: offers_parser.print_help())
         offers_subparsers = offers_parser.add_subparsers()
 
+        def update(ctx):
+            ctx.config.listing_workers = ctx.ns.workers
+            ctx.config.batch_size = ctx.ns.batch_size
+            ctx.config.pipelined = ctx.ns.pipeline
+            ctx.config.async_engine = ctx.ns.async_engine
+            ctx.config.incremental = ctx.ns.incremental
+            ctx.config.resume = ctx.ns.resume
+            ctx.config.build_processes = ctx.ns.build_processes
+            ctx.vehicle_updater_svc.update()
+
         offers_update_opt = offers_subparsers.add_parser('update', help='Update and export current offers')
-        offers_update_opt.set_defaults(func=lambda ctx: ctx.vehicle_updater_svc.update())
+        offers_update_opt.set_defaults(func=update)
         offers_update_opt.add_argument('--output', '-o', type=pathlib.Path, help='Output json file', metavar='path',
                                        default='export.json')
+        offers_update_opt.add_argument('--workers', '-w', type=int, default=1, metavar='n',
+                                       help='Number of categories to fetch concurrently. Default is %(default)s')
+        offers_update_opt.add_argument('--batch-size', '-b', type=int, metavar='n',
+                                       help='Process the listing in batches of n offers, keeping memory use flat. '
+                                            'By default the whole listing is processed at once')
+        offers_update_opt.add_argument('--pipeline', '-p', action='store_true', default=False,
+                                       help='Fetch offer details while the listing is still being fetched')
+        offers_update_opt.add_argument('--async', '-a', action='store_true', default=False, dest='async_engine',
+                                       help='Send the requests concurrently with asyncio')
+        offers_update_opt.add_argument('--incremental', '-i', action='store_true', default=False,
+                                       help='Only read each category listing down to the newest offer seen before. '
+                                            'A full sweep still runs once a day')
+        offers_update_opt.add_argument('--build-processes', '-P', type=int, default=0, metavar='n',
+                                       help='Build the offers from their details in n worker processes. '
+                                            'By default they are built in the main process')
+        offers_update_opt.add_argument('--resume', '-r', action='store_true', default=False,
+                                       help='Carry on with an interrupted update, skipping the work it finished')
+
+        def export(ctx):
+            ctx.config.export_layout = ctx.ns.layout
+            ctx.offer_export_svc.export(ctx.ns.data / ctx.ns.output)
 
         offers_export_opt = offers_subparsers.add_parser('export')
-        offers_export_opt.set_defaults(func=lambda ctx: ctx.offer_export_svc.export(ctx.ns.data / ctx.ns.output))
+        offers_export_opt.set_defaults(func=export)
         offers_export_opt.add_argument('--output', '-o', type=pathlib.Path, help='Output json file', metavar='path',
                                        default='export.json')
+        offers_export_opt.add_argument('--layout', '-l', choices=[LAYOUT_ROWS, LAYOUT_COLUMNS], default=LAYOUT_ROWS,
+                                       help='An object per car, or an array per field. Default is %(default)s')
 
         offers_backup_opt = offers_subparsers.add_parser('backup')
         offers_backup_opt.set_defaults(func=lambda ctx: ctx.backup_service.backup())
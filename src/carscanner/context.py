@@ -22,8 +22,35 @@ ENV_LOCAL = 'local'
 
 @dataclasses.dataclass
 class Config:
+    aggregate_export = True
     allow_fetch = False
+    async_concurrency = 100
+    async_engine = False
+    batch_size = None
+    build_processes = 0
+    cassette_latency = 0.
+    cassette_mode = None
+    cassette_path = None
+    check_indexes = True
+    executor_workers = None
+    export_artifacts = True
+    export_layout = 'rows'
+    full_sweep_hours = 24
+    incremental = False
+    insert_chunk = 1000
+    known_id_cache = True
+    lean_items_info = True
+    lean_listing = True
+    listing_workers = 1
+    max_item_failures = 3
     modify_static = False
+    pipelined = False
+    pretty_export = False
+    resume = False
+    rest_rate_limit = 100.
+    run_tag_sweep = True
+    soap_rate_limit = 20.
+    upsert_offers = False
 
 
 class Context:
@@ -34,8 +61,41 @@ class Context:
                      ) -> allegro_pl.oauth.AllegroAuth:
         return carscanner.allegro.CarScannerCodeAuth(client_code_store, token_store, config.allow_fetch)
 
-    def allegro(self, allegro_auth: allegro_pl.oauth.AllegroAuth) -> allegro_pl.Allegro:
-        return allegro_pl.Allegro(allegro_auth)
+    @contextlib.contextmanager
+    def allegro(self, allegro_auth: allegro_pl.oauth.AllegroAuth, config: Config) -> allegro_pl.Allegro:
+        from carscanner.allegro.cassette import MODE_RECORD, MODE_REPLAY
+        if config.cassette_mode == MODE_REPLAY:
+            yield carscanner.allegro.ReplayAllegro(config.cassette_path, config.cassette_latency)
+            return
+
+        allegro = allegro_pl.Allegro(allegro_auth)
+        if config.cassette_mode != MODE_RECORD:
+            yield allegro
+            return
+
+        writer = carscanner.allegro.CassetteWriter(config.cassette_path)
+        try:
+            yield carscanner.allegro.RecordingAllegro(allegro, writer)
+        finally:
+            writer.close()
+
+    def async_allegro(self,
+                      allegro: allegro_pl.Allegro,
+                      allegro_auth: allegro_pl.oauth.AllegroAuth,
+                      request_scheduler: carscanner.allegro.RequestScheduler,
+                      config: Config,
+                      ) -> carscanner.allegro.AsyncCarscannerAllegro:
+        return carscanner.allegro.AsyncCarscannerAllegro(allegro, allegro_auth, config.async_concurrency,
+                                                         request_scheduler=request_scheduler)
+
+    @contextlib.contextmanager
+    def build_executor(self, config: Config) -> futures.ProcessPoolExecutor:
+        # processes are only started when the first batch is sent
+        executor = carscanner.service.build_pool.build_executor(config.build_processes or 1)
+        try:
+            yield executor
+        finally:
+            executor.shutdown(True)
 
     def car_make_model_dao(self, static_data: tinydb.TinyDB) -> carscanner.dao.CarMakeModelDao:
         return carscanner.dao.CarMakeModelDao(static_data)
@@ -44,13 +104,31 @@ class Context:
 
     car_offers_builder = carscanner.service.CarOffersBuilder
 
-    def car_offer_dao(self, vehicle_collection_v4: pymongo.collection.Collection) -> carscanner.dao.CarOfferDao:
-        return carscanner.dao.CarOfferDao(vehicle_collection_v4)
-
-    carscanner_allegro = carscanner.allegro.CarscannerAllegro
+    def car_offer_dao(self,
+                      vehicle_collection_v4: pymongo.collection.Collection,
+                      known_id_cache: carscanner.dao.KnownIdCache,
+                      config: Config,
+                      ) -> carscanner.dao.CarOfferDao:
+        return carscanner.dao.CarOfferDao(vehicle_collection_v4, known_id_cache if config.known_id_cache else None,
+                                          config.insert_chunk, config.upsert_offers)
+
+    def carscanner_allegro(self,
+                           allegro: allegro_pl.Allegro,
+                           request_scheduler: carscanner.allegro.RequestScheduler,
+                           config: Config,
+                           ) -> carscanner.allegro.CarscannerAllegro:
+        # cassettes hold decoded replies, not the raw ones
+        lean = config.cassette_mode is None
+        return carscanner.allegro.CarscannerAllegro(allegro, request_scheduler, lean and config.lean_items_info,
+                                                    lean and config.lean_listing)
 
     categories_svc = carscanner.service.GetCategories
 
+    def checkpoint_dao(self, mongodb_carscanner_db: pymongo.database.Database) -> carscanner.dao.CheckpointDao:
+        from carscanner.dao.checkpoint import CHECKPOINT
+        return carscanner.dao.CheckpointDao(
+            mongodb_carscanner_db.get_collection(CHECKPOINT, codec_options=mongodb_carscanner_db.codec_options))
+
     def criteria_dao(self, static_data: tinydb.TinyDB) -> carscanner.dao.CriteriaDao:
         return carscanner.dao.CriteriaDao(static_data)
 
@@ -58,18 +136,38 @@ class Context:
         return unix_to_datetime(timestamp)
 
     @contextlib.contextmanager
-    def executor(self) -> futures.ThreadPoolExecutor:
-        executor = futures.ThreadPoolExecutor()
+    def executor(self, config: Config) -> futures.ThreadPoolExecutor:
+        executor = futures.ThreadPoolExecutor(config.executor_workers)
         try:
             yield executor
         finally:
             executor.shutdown(True)
 
+    def failed_item_dao(self, mongodb_carscanner_db: pymongo.database.Database) -> carscanner.dao.FailedItemDao:
+        from carscanner.dao.failed_item import FAILED_ITEM
+        return carscanner.dao.FailedItemDao(
+            mongodb_carscanner_db.get_collection(FAILED_ITEM, codec_options=mongodb_carscanner_db.codec_options))
+
     def filter_dao(self, mem_db: tinydb.TinyDB) -> carscanner.dao.FilterDao:
         return carscanner.dao.FilterDao(mem_db)
 
     filter_svc = carscanner.service.FilterService
 
+    @contextlib.contextmanager
+    def known_id_cache(self, data_path: pathlib.Path, vehicle_collection_v4: pymongo.collection.Collection) \
+            -> carscanner.dao.KnownIdCache:
+        # one file per database, next to the backups but not a part of them
+        cache = carscanner.dao.KnownIdCache(data_path / f'{vehicle_collection_v4.full_name}.ids')
+        try:
+            yield cache
+        finally:
+            cache.save()
+
+    def listing_mark_dao(self, mongodb_carscanner_db: pymongo.database.Database) -> carscanner.dao.ListingMarkDao:
+        from carscanner.dao.listing_mark import LISTING_MARK
+        return carscanner.dao.ListingMarkDao(
+            mongodb_carscanner_db.get_collection(LISTING_MARK, codec_options=mongodb_carscanner_db.codec_options))
+
     @contextlib.contextmanager
     def mem_db(self) -> tinydb.TinyDB:
         db = tinydb.TinyDB(storage=tinydb.storages.MemoryStorage)
@@ -84,10 +182,11 @@ class Context:
 
     metadata_dao = carscanner.dao.MetadataDao
 
-    def migration_service(self, mongodb_carscanner_db: pymongo.database.Database) \
+    def migration_service(self, mongodb_carscanner_db: pymongo.database.Database, config: Config) \
             -> carscanner.service.migration.MigrationService:
         return carscanner.service.migration.MigrationService(
             mongodb_carscanner_db,
+            check_indexes=config.check_indexes,
         )
 
     def mongodb_carscanner_db(self, mongodb_connection: pymongo.MongoClient) -> pymongo.database.Database:
@@ -97,9 +196,55 @@ class Context:
         import os
         return pymongo.MongoClient(os.environ.get('MONGODB_URI', 'mongodb://localhost/carscanner'), retryWrites=False)
 
-    offer_export_svc = carscanner.service.ExportService
+    def offer_export_svc(self,
+                         car_offer_dao: carscanner.dao.CarOfferDao,
+                         metadata_dao: carscanner.dao.MetadataDao,
+                         export_artifacts_path: pathlib.Path,
+                         config: Config,
+                         ) -> carscanner.service.ExportService:
+        return carscanner.service.ExportService(car_offer_dao, metadata_dao, config.aggregate_export,
+                                                config.pretty_export, config.export_layout,
+                                                export_artifacts_path if config.export_artifacts else None)
+
+    def offers_svc(self,
+                   carscanner_allegro: carscanner.allegro.CarscannerAllegro,
+                   criteria_dao: carscanner.dao.CriteriaDao,
+                   car_offers_builder: carscanner.service.CarOffersBuilder,
+                   car_offer_dao: carscanner.dao.CarOfferDao,
+                   filter_svc: carscanner.service.FilterService,
+                   datetime_now: datetime.datetime,
+                   executor: futures.ThreadPoolExecutor,
+                   failed_item_dao: carscanner.dao.FailedItemDao,
+                   async_allegro: carscanner.allegro.AsyncCarscannerAllegro,
+                   listing_mark_dao: carscanner.dao.ListingMarkDao,
+                   checkpoint_dao: carscanner.dao.CheckpointDao,
+                   build_executor: futures.ProcessPoolExecutor,
+                   config: Config,
+                   ) -> carscanner.service.OfferService:
+        return carscanner.service.OfferService(
+            carscanner_allegro, criteria_dao, car_offers_builder, car_offer_dao, filter_svc, datetime_now, executor,
+            listing_workers=config.listing_workers,
+            batch_size=config.batch_size,
+            pipelined=config.pipelined,
+            failed_item_dao=failed_item_dao,
+            max_item_failures=config.max_item_failures,
+            async_allegro=async_allegro if config.async_engine else None,
+            listing_mark_dao=listing_mark_dao,
+            incremental=config.incremental,
+            full_sweep_interval=datetime.timedelta(hours=config.full_sweep_hours),
+            checkpoint_dao=checkpoint_dao,
+            build_executor=build_executor if config.build_processes else None,
+            build_workers=config.build_processes,
+            run_tag_sweep=config.run_tag_sweep,
+        )
 
-    offers_svc = carscanner.service.OfferService
+    def request_scheduler(self, config: Config) -> carscanner.allegro.RequestScheduler:
+        from carscanner.allegro.ratelimit import REST, SOAP
+        return carscanner.allegro.RequestScheduler({
+            # allow a second worth of requests at once
+            REST: carscanner.allegro.TokenBucket(config.rest_rate_limit, int(config.rest_rate_limit)),
+            SOAP: carscanner.allegro.TokenBucket(config.soap_rate_limit, int(config.soap_rate_limit)),
+        })
 
     @contextlib.contextmanager
     def static_data(self, config: Config) -> tinydb.TinyDB:
@@ -112,7 +257,12 @@ class Context:
         finally:
             db.close()
 
-    def timestamp(self) -> int:
+    def timestamp(self, checkpoint_dao: carscanner.dao.CheckpointDao, config: Config) -> int:
+        if config.resume:
+            # carry on with the interrupted run, the offers it saw are stamped with its timestamp
+            run_timestamp = checkpoint_dao.get_run_timestamp()
+            if run_timestamp is not None:
+                return run_timestamp
         return carscanner.utils.now()
 
     def token_col(self, mongodb_carscanner_db: pymongo.database.Database) -> pymongo.collection.Collection:
@@ -121,8 +271,9 @@ class Context:
     token_store = carscanner.dao.MongoTrustStore
 
     def vehicle_collection_v4(self, mongodb_carscanner_db: pymongo.database.Database) -> pymongo.collection.Collection:
-        from carscanner.dao.car_offer import VEHICLE_V3
-        return mongodb_carscanner_db.get_collection(VEHICLE_V3, codec_options=mongodb_carscanner_db.codec_options)
+        from carscanner.dao.car_offer import VEHICLE_TYPE_REGISTRY, VEHICLE_V3
+        return mongodb_carscanner_db.get_collection(VEHICLE_V3, codec_options=mongodb_carscanner_db.codec_options
+                                                    .with_options(type_registry=VEHICLE_TYPE_REGISTRY))
 
     def vehicle_data_path_v3(self, data_path: pathlib.Path) -> pathlib.Path:
         from carscanner.dao.car_offer import VEHICLE_V3
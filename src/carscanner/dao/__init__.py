@@ -1,7 +1,11 @@
 from .car_make_model import CarMakeModelDao
-from .car_offer import CarOffer, CarOfferDao
+from .car_offer import CarOffer, CarOfferDao, YearStats
+from .checkpoint import CheckpointDao
 from .criteria import Criteria, CriteriaDao
+from .failed_item import FailedItemDao
 from .filter import FilterDao
+from .known_ids import KnownIdCache
+from .listing_mark import ListingMarkDao
 from .meta import MetadataDao
 from .mongo_trust_store import MongoTrustStore
 from .voivodship import VoivodeshipDao
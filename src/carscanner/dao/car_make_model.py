@@ -1,6 +1,6 @@
 import typing
 
-from tinydb import TinyDB, where
+from tinydb import TinyDB
 from tinydb.database import Table
 
 _TABLE = 'make_model'
@@ -10,15 +10,23 @@ class CarMakeModelDao:
     def __init__(self, db: TinyDB):
         self._db = db
         self._tbl: Table = db.table(_TABLE)
+        self._models: typing.Optional[typing.Dict[str, typing.List[str]]] = None
 
     def get_models_by_make(self, make: str) -> typing.List[str]:
-        doc = self._tbl.get(where('make') == make.lower())
-        return doc["models"] if doc else []
+        if self._models is None:
+            models = {}
+            for doc in self._tbl.all():
+                # the first document of a make wins, like Table.get
+                models.setdefault(doc['make'], doc['models'])
+            self._models = models
+        return self._models.get(make.lower(), [])
 
     def insert(self, make: dict) -> int:
+        self._models = None
         return self._tbl.insert(make)
 
     def purge(self):
+        self._models = None
         self._db.purge_table(_TABLE)
 
     def all(self):
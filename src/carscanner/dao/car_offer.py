@@ -1,11 +1,17 @@
 import datetime
 import decimal
 import logging
+import time
 import typing
 
 import attr
 import bson
+import bson.codec_options
 import pymongo
+import pymongo.errors
+
+from carscanner.utils import chunks_iter
+from .known_ids import KnownIdCache
 
 log = logging.getLogger(__name__)
 
@@ -13,10 +19,56 @@ _K_ACTIVE = 'active'
 _K_FIRST_SPOTTED = 'first_spotted'
 _K_ID = '_id.id'
 _K_LAST_SPOTTED = 'last_spotted'
+_K_LISTED = 'listed'
 _K_PRICE = 'price'
 
+_LISTED_CHUNK = 1000
+"""Offer ids per update when stamping the listed offers"""
+
+_LISTED_BULK = 100
+"""Updates per bulk_write when stamping the listed offers"""
+
+_INSERT_CHUNK = 1000
+"""Offers per insert_many or bulk_write when inserting"""
+
+_DUPLICATE_KEY = 11000
+
 VEHICLE_V3 = 'vehicle'
 
+EXPORT_FIELDS = ('image', 'imported', 'location', 'make', 'mileage', 'model', 'name', _K_PRICE, 'url', 'voivodeship',
+                 'year')
+"""Fields ExportService reads"""
+
+ID_FIELDS = ()
+"""No fields but the id"""
+
+_D128_SPECIAL = 0x6000000000000000
+"""Infinity, NaN and the second form of coefficient, all left to Decimal128.to_decimal"""
+_D128_COEFFICIENT = 0x1ffffffffffff
+_D128_EXPONENT_BIAS = 6176
+
+
+def _decimal128_to_decimal(value: bson.Decimal128) -> decimal.Decimal:
+    """Like Decimal128.to_decimal, which builds the decimal digit by digit, but several times faster"""
+    bid = value.bid
+    high = int.from_bytes(bid[8:], 'little')
+    if high & _D128_SPECIAL == _D128_SPECIAL:
+        return value.to_decimal()
+    coefficient = (high & _D128_COEFFICIENT) << 64 | int.from_bytes(bid[:8], 'little')
+    exponent = (high >> 49 & 0x3fff) - _D128_EXPONENT_BIAS
+    return decimal.Decimal(f'{"-" if high >> 63 else ""}{coefficient}E{exponent}')
+
+
+class _DecimalDecoder(bson.codec_options.TypeDecoder):
+    bson_type = bson.Decimal128
+
+    def transform_bson(self, value: bson.Decimal128) -> decimal.Decimal:
+        return _decimal128_to_decimal(value)
+
+
+VEHICLE_TYPE_REGISTRY = bson.codec_options.TypeRegistry([_DecimalDecoder()])
+"""Decodes the prices as they are read, so CarOffer.from_dict doesn't convert them"""
+
 
 @attr.s(slots=True, auto_attribs=True)
 class CarOffer:
@@ -48,30 +100,127 @@ class CarOffer:
 
     @classmethod
     def from_dict(cls, d: dict):
-        doc = d.copy()
-        doc['id'] = d['_id']['id']
-        del doc['_id']
-        doc.setdefault(_K_ACTIVE, None)
-        doc[_K_PRICE] = doc[_K_PRICE].to_decimal()
-        return cls(**doc)
+        # runs for every offer read; positional arguments, in the order of the fields, are the cheapest to pass
+        get = d.get
+        price = get(_K_PRICE)
+        if isinstance(price, bson.Decimal128):
+            price = _decimal128_to_decimal(price)
+        return cls(get(_K_FIRST_SPOTTED), get(_K_ACTIVE), get('fuel'), d['_id']['id'], get('image'), get('imported'),
+                   get(_K_LAST_SPOTTED), get('location'), get('make'), get('mileage'), get('model'), get('name'), price,
+                   get('url'), get('voivodeship'), get('year'))
 
     def is_valid(self) -> bool:
         return self.year is not None and self.mileage is not None
 
 
+class InsertStats(typing.NamedTuple):
+    """Outcome of inserting a chunk of offers. duplicates are the offers already in the database, left as they were"""
+    offers: int
+    inserted: int
+    duplicates: int
+    seconds: float
+
+
+class YearStats(typing.NamedTuple):
+    """Offers and their total mileage, by year"""
+    mileage_totals: typing.Dict[int, int]
+    counts: typing.Dict[int, int]
+
+
 class CarOfferDao:
-    def __init__(self, col: pymongo.collection.Collection):
+    def __init__(self,
+                 col: pymongo.collection.Collection,
+                 known_ids: KnownIdCache = None,
+                 insert_chunk: int = _INSERT_CHUNK,
+                 upsert: bool = False,
+                 ):
+        """
+        :param insert_chunk: offers sent in one request by insert_multiple
+        :param upsert: insert the offers with upserts that only set the fields of new documents, rather than inserts
+            that fail on the existing ones
+        """
         self._col = col
+        self._known_ids = known_ids
+        self._known_ids_checked = False
+        self._insert_chunk = insert_chunk
+        self._upsert = upsert
+
+    def insert_multiple(self, car_offers: typing.Iterable[CarOffer]) -> typing.List[InsertStats]:
+        """
+        Insert the offers in unordered chunks, so an offer already in the database doesn't stop the others.
+
+        The offers are read lazily, chunk by chunk.
+        """
+        result = []
+        for chunk in chunks_iter(car_offers, self._insert_chunk):
+            start = time.perf_counter()
+            inserted, duplicates = self._upsert_docs(chunk) if self._upsert else self._insert_docs(chunk)
+            stats = InsertStats(len(chunk), inserted, duplicates, time.perf_counter() - start)
+            log.debug('Inserted %d of %d offers, %d duplicates in %.3fs', stats.inserted, stats.offers,
+                      stats.duplicates, stats.seconds)
+            result.append(stats)
+            if self._known_ids is not None:
+                self._known_ids.add(o.id for o in chunk)
+
+        duplicates = sum(stats.duplicates for stats in result)
+        if duplicates:
+            log.info('%d offers were already in the database', duplicates)
+        return result
 
-    def insert_multiple(self, car_offers: typing.List[CarOffer]) -> typing.List[int]:
-        if len(car_offers):
-            return self._col.insert_many(o.to_dict() for o in car_offers).inserted_ids
+    def _insert_docs(self, chunk: typing.List[CarOffer]) -> typing.Tuple[int, int]:
+        try:
+            return len(self._col.insert_many((self._new_doc(o) for o in chunk), ordered=False).inserted_ids), 0
+        except pymongo.errors.BulkWriteError as x:
+            return self._bulk_error_counts(x, x.details['nInserted'])
+
+    def _upsert_docs(self, chunk: typing.List[CarOffer]) -> typing.Tuple[int, int]:
+        requests = []
+        for o in chunk:
+            doc = self._new_doc(o)
+            requests.append(pymongo.UpdateOne({'_id': doc.pop('_id')}, {'$setOnInsert': doc}, upsert=True))
+        try:
+            result = self._col.bulk_write(requests, ordered=False)
+        except pymongo.errors.BulkWriteError as x:
+            # concurrent upserts of the same offer
+            return self._bulk_error_counts(x, x.details['nUpserted'])
+        return result.upserted_count, result.matched_count
+
+    @staticmethod
+    def _bulk_error_counts(x: pymongo.errors.BulkWriteError, inserted: int) -> typing.Tuple[int, int]:
+        errors = x.details['writeErrors']
+        if any(e['code'] != _DUPLICATE_KEY for e in errors):
+            raise x
+        return inserted, len(errors) + x.details.get('nMatched', 0)
+
+    @staticmethod
+    def _new_doc(offer: CarOffer) -> dict:
+        result = offer.to_dict()
+        # offers are inserted by the run that first listed them
+        result[_K_LISTED] = offer.first_spotted
+        return result
 
     def _search_ids(self, cond) -> typing.List[str]:
         return [d['_id']['id'] for d in self._col.find(cond, {_K_ID: 1})]
 
     def search_existing_ids(self, ids: typing.List[str]) -> typing.List[str]:
-        return self._search_ids({_K_ID: {'$in': ids}})
+        """The ids of offers in the database. With a known id cache only the ids it doesn't know are looked up"""
+        if self._known_ids is None:
+            return self._search_ids({_K_ID: {'$in': ids}})
+
+        self._check_known_ids()
+        known, unknown = self._known_ids.split(ids)
+        found = self._search_ids({_K_ID: {'$in': unknown}}) if unknown else []
+        self._known_ids.add(found)
+        return known + found
+
+    def _check_known_ids(self) -> None:
+        # offers are never removed, so a cache with more ids than the collection is from another database
+        if self._known_ids_checked:
+            return
+        self._known_ids_checked = True
+        if len(self._known_ids) > self._col.estimated_document_count():
+            log.warning('Known id cache is out of date, dropping it')
+            self._known_ids.clear()
 
     def update_status(self, ids: typing.List[str], timestamp: datetime.datetime) -> typing.List[int]:
         result = self._col.update_many({
@@ -95,15 +244,80 @@ class CarOfferDao:
             }}
         ).upserted_id
 
-    def search_by_year_between_and_mileage_lt(self, min_year: int, max_year, mileage: int) -> typing.List[CarOffer]:
-        docs = self._col.find({
+    def mark_listed(self, ids: typing.Iterable[str], timestamp: datetime.datetime) -> None:
+        """
+        Stamp the offers with the timestamp of the run that listed them, and activate the inactive ones.
+
+        The ids are sent in chunks, so the updates stay small however many offers are listed.
+        """
+        requests = (pymongo.UpdateMany({_K_ID: {'$in': chunk}}, {'$set': {_K_LISTED: timestamp}})
+                    for chunk in chunks_iter(ids, _LISTED_CHUNK))
+        for bulk in chunks_iter(requests, _LISTED_BULK):
+            self._col.bulk_write(bulk, ordered=False)
+
+        modified_count = self._col.update_many({
+            _K_LISTED: timestamp,
+            _K_ACTIVE: {'$ne': True},
+        }, {'$set': {
             _K_ACTIVE: True,
-            'year': {'$gte': min_year, '$lt': max_year},
-            'mileage': {"$lt": mileage},
-        },
+        }}).modified_count
+        if modified_count != 0:
+            log.info('%d inactive offers were activated', modified_count)
+
+    def deactivate_unlisted(self, timestamp: datetime.datetime) -> int:
+        """Deactivate the offers not stamped by mark_listed with the timestamp, or a later one"""
+        modified_count = self._col.update_many({
+            '$or': [{_K_LISTED: {'$lt': timestamp}}, {_K_LISTED: None}],
+            _K_ACTIVE: {'$ne': False},
+        }, {'$set': {
+            _K_ACTIVE: False,
+            _K_LAST_SPOTTED: timestamp,
+        }}).modified_count
+        log.info('%d offers were deactivated', modified_count)
+        return modified_count
+
+    def search_by_year_between_and_mileage_lt(self, min_year: int, max_year, mileage: int,
+                                              fields: typing.Collection[str] = None) -> typing.List[CarOffer]:
+        return list(self.iter_by_year_between_and_mileage_lt(min_year, max_year, mileage, fields))
+
+    def iter_by_year_between_and_mileage_lt(self, min_year: int, max_year, mileage: int,
+                                            fields: typing.Collection[str] = None) -> typing.Iterator[CarOffer]:
+        """Like search_by_year_between_and_mileage_lt, but reads the offers as they are iterated"""
+        docs = self._col.find(
+            _by_year_between_and_mileage_lt(min_year, max_year, mileage),
+            _projection(fields),
             sort=[(_K_ID, pymongo.ASCENDING)],
         )
-        return [CarOffer.from_dict(d) for d in docs]
+        return (CarOffer.from_dict(d) for d in docs)
+
+    def year_stats_by_year_between_and_mileage_lt(self, min_year: int, max_year, mileage: int) -> YearStats:
+        """The mileage totals and counts per year of the offers search_by_year_between_and_mileage_lt finds"""
+        years = list(self._col.aggregate([
+            {'$match': _by_year_between_and_mileage_lt(min_year, max_year, mileage)},
+            {'$group': {'_id': '$year', 'mileage': {'$sum': '$mileage'}, 'count': {'$sum': 1}}},
+        ]))
+        return YearStats({d['_id']: d['mileage'] for d in years}, {d['_id']: d['count'] for d in years})
+
+    def all(self, fields: typing.Collection[str] = None) -> typing.Iterable[CarOffer]:
+        return (CarOffer.from_dict(d) for d in self._col.find({}, _projection(fields)).sort([(_K_ID, 1)]))
+
+
+def _by_year_between_and_mileage_lt(min_year: int, max_year, mileage: int) -> dict:
+    return {
+        _K_ACTIVE: True,
+        'year': {'$gte': min_year, '$lt': max_year},
+        'mileage': {"$lt": mileage},
+    }
+
+
+def _projection(fields: typing.Optional[typing.Collection[str]]) -> dict:
+    """
+    Only the fields, and the id, are sent by the server. The offers read have the other attributes set to None.
 
-    def all(self) -> typing.Iterable[CarOffer]:
-        return (CarOffer.from_dict(d) for d in self._col.find().sort([(_K_ID, 1)]))
+    By default all the fields of CarOffer are sent.
+    """
+    if fields is None:
+        return {_K_LISTED: 0}
+    result = dict.fromkeys(fields, 1)
+    result['_id'] = 1
+    return result
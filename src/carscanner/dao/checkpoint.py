@@ -0,0 +1,66 @@
+import typing
+
+import pymongo
+
+CHECKPOINT = 'checkpoint'
+
+STAGE_FILTERS = 'filters'
+STAGE_OFFERS = 'offers'
+STAGE_META = 'meta'
+STAGE_BACKUP = 'backup'
+_STAGE_LISTING = 'listing:'
+_STAGE_PLAN = 'plan:'
+
+_RUN = '_run'
+_K_TIMESTAMP = 'timestamp'
+_K_DATA = 'data'
+
+
+def listing_stage(category_id: str, part: typing.Optional[str] = None) -> str:
+    return _STAGE_LISTING + category_id + (':' + part if part else '')
+
+
+def listing_page_stage(listing: str, offset: int) -> str:
+    """A page of a listing stage, by the offset of its first offer in the listing"""
+    return f'{listing}@{offset}'
+
+
+def plan_stage(category_id: str) -> str:
+    return _STAGE_PLAN + category_id
+
+
+class CheckpointDao:
+    """
+    Progress of the current update run: the stages done so far, with the data needed to resume after them.
+
+    One document per stage, plus one holding the run timestamp. Everything is removed once the run finishes.
+    """
+
+    def __init__(self, col: pymongo.collection.Collection):
+        self._col = col
+
+    def get_run_timestamp(self) -> typing.Optional[int]:
+        """Timestamp of the unfinished run, or None"""
+        doc = self._col.find_one({'_id': _RUN})
+        return doc[_K_TIMESTAMP] if doc else None
+
+    def start(self, timestamp: int) -> None:
+        """Start a run, or carry on with the unfinished one if it has the same timestamp"""
+        if self.get_run_timestamp() == timestamp:
+            return
+        self._col.delete_many({})
+        self._col.insert_one({'_id': _RUN, _K_TIMESTAMP: timestamp})
+
+    def finish(self) -> None:
+        self._col.delete_many({})
+
+    def done(self, stage: str, data=None) -> None:
+        self._col.replace_one({'_id': stage}, {'_id': stage, _K_DATA: data}, upsert=True)
+
+    def is_done(self, stage: str) -> bool:
+        return self._col.count_documents({'_id': stage}, limit=1) > 0
+
+    def get(self, stage: str):
+        """The data saved with a stage, None if it isn't done"""
+        doc = self._col.find_one({'_id': stage})
+        return doc[_K_DATA] if doc else None
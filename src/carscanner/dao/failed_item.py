@@ -0,0 +1,28 @@
+import datetime
+import typing
+
+import pymongo
+
+FAILED_ITEM = 'failed_item'
+
+_K_FAILURES = 'failures'
+_K_LAST_FAILED = 'last_failed'
+
+
+class FailedItemDao:
+    """Offers whose details couldn't be fetched, with the number of runs they failed in"""
+
+    def __init__(self, col: pymongo.collection.Collection):
+        self._col = col
+
+    def get_failures(self) -> typing.Dict[str, int]:
+        return {d['_id']: d[_K_FAILURES] for d in self._col.find({}, {_K_FAILURES: 1})}
+
+    def add(self, item_id: str, timestamp: datetime.datetime) -> None:
+        self._col.update_one({'_id': item_id}, {
+            '$inc': {_K_FAILURES: 1},
+            '$set': {_K_LAST_FAILED: timestamp},
+        }, upsert=True)
+
+    def remove(self, item_id: str) -> None:
+        self._col.delete_one({'_id': item_id})
@@ -1,22 +1,36 @@
 import typing
 
 import tinydb
-from tinydb import TinyDB, Query
+from tinydb import TinyDB
+
+_FilterKey = typing.Tuple[typing.Optional[str], str]
 
 
 class FilterDao:
+    """
+    Listing filters, looked up by category and name.
+
+    Lookups go through dict indexes, built on first use and dropped on every write. Filters stored without a
+    category_id match any category.
+    """
+
     def __init__(self, db: TinyDB):
         self._tbl: tinydb.database.Table = db.table('filter')
+        self._filters: typing.Optional[typing.Dict[_FilterKey, dict]] = None
+        self._values: typing.Optional[typing.Dict[typing.Tuple[typing.Optional[str], str, str], list]] = None
 
     def insert_multiple(self, data: list) -> typing.List[int]:
+        self._invalidate()
         return self._tbl.insert_multiple(data)
 
     def insert(self, data) -> int:
+        self._invalidate()
         return self._tbl.insert(data)
 
     def get(self, cat_id, name) -> dict:
-        params = Query()
-        return self._tbl.get(params.name == name)
+        self._build_index()
+        result = self._filters.get((cat_id, name))
+        return result if result is not None else self._filters.get((None, name))
 
     def get_required(self, cat_id, name) -> dict:
         result = self.get(cat_id, name)
@@ -35,8 +49,46 @@ class FilterDao:
 
         if param_value is None:
             raise ValueError('Missing parameter param_value', param_type)
-        value_objects = [p['value'] for p in param_obj['values'] if p['name'] == param_value]
+        value_objects = self._values.get((param_obj.get('category_id'), param_name, param_value), [])
         if len(value_objects) == 1:
             return param_obj['id'], value_objects[0]
         else:
             raise ValueError("Didn't find single value", value_objects)
+
+    def range_to_keys(self, category_id: str, param_name, value_from=None, value_to=None) -> typing.Dict[str, str]:
+        """Listing parameters selecting the given range of a NUMERIC filter. A bound that is None is left open"""
+        param_obj = self.get_required(category_id, param_name)
+        if param_obj['type'] != 'NUMERIC':
+            raise ValueError('Not a NUMERIC parameter', param_name, param_obj['type'])
+
+        suffixes = [v.get('idSuffix', v.get('id_suffix')) for v in param_obj['values']]
+        result = {}
+        for bound, value in (('from', value_from), ('to', value_to)):
+            if value is None:
+                continue
+            suffix = [s for s in suffixes if s.endswith(bound)]
+            if len(suffix) != 1:
+                raise ValueError("Didn't find single suffix", param_name, bound, suffixes)
+            result[param_obj['id'] + suffix[0]] = str(value)
+        return result
+
+    def _invalidate(self) -> None:
+        self._filters = None
+        self._values = None
+
+    def _build_index(self) -> None:
+        if self._filters is not None:
+            return
+        filters = {}
+        values = {}
+        for doc in self._tbl.all():
+            key = doc.get('category_id'), doc['name']
+            if key in filters:
+                # the first document wins, like Table.get
+                continue
+            filters[key] = doc
+            for v in doc.get('values') or []:
+                if 'value' in v:
+                    values.setdefault(key + (v['name'],), []).append(v['value'])
+        self._values = values
+        self._filters = filters
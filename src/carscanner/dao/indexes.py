@@ -0,0 +1,141 @@
+import datetime
+import logging
+import typing
+
+import pymongo
+import pymongo.collection
+import pymongo.database
+import pymongo.errors
+
+from .car_offer import VEHICLE_V3, _K_ACTIVE, _K_ID, _K_LISTED
+from .meta import META_V2
+
+log = logging.getLogger(__name__)
+
+_COLLSCAN = 'COLLSCAN'
+
+
+class IndexSpec(typing.NamedTuple):
+    name: str
+    keys: typing.List[typing.Tuple[str, int]]
+
+
+class QueryShape(typing.NamedTuple):
+    """A query the application runs often, with sample values. The shape matters to the planner, not the values"""
+    name: str
+    filter: dict
+    sort: typing.Optional[typing.List[typing.Tuple[str, int]]] = None
+
+
+class CollectionScanException(Exception):
+    pass
+
+
+_SAMPLE_TS = datetime.datetime(2020, 1, 1)
+
+INDEXES: typing.Dict[str, typing.List[IndexSpec]] = {
+    VEHICLE_V3: [
+        # offer lookups and the sort of exports; active narrows update_status
+        IndexSpec('id_active', [(_K_ID, pymongo.ASCENDING), (_K_ACTIVE, pymongo.ASCENDING)]),
+        # the run tag sweep
+        IndexSpec('listed_active', [(_K_LISTED, pymongo.ASCENDING), (_K_ACTIVE, pymongo.ASCENDING)]),
+        # equality, sort, range: the sort by id doesn't happen in memory, and year and mileage are filtered on the index
+        IndexSpec('active_id_year_mileage', [(_K_ACTIVE, pymongo.ASCENDING), (_K_ID, pymongo.ASCENDING),
+                                             ('year', pymongo.ASCENDING), ('mileage', pymongo.ASCENDING)]),
+    ],
+    META_V2: [
+        IndexSpec('version', [('version', pymongo.ASCENDING)]),
+    ],
+}
+"""The indexes of each collection, by collection name"""
+
+HOT_QUERIES: typing.Dict[str, typing.List[QueryShape]] = {
+    VEHICLE_V3: [
+        QueryShape('search_existing_ids', {_K_ID: {'$in': ['0']}}),
+        QueryShape('update_status', {_K_ID: {'$in': ['0']}, _K_ACTIVE: {'$ne': True}}),
+        QueryShape('mark_listed', {_K_LISTED: _SAMPLE_TS, _K_ACTIVE: {'$ne': True}}),
+        QueryShape('deactivate_unlisted', {'$or': [{_K_LISTED: {'$lt': _SAMPLE_TS}}, {_K_LISTED: None}],
+                                           _K_ACTIVE: {'$ne': False}}),
+        QueryShape('search_by_year_between_and_mileage_lt',
+                   {_K_ACTIVE: True, 'year': {'$gte': 2000, '$lt': 2010}, 'mileage': {'$lt': 100000}},
+                   [(_K_ID, pymongo.ASCENDING)]),
+    ],
+}
+"""Queries that must not scan their collection"""
+
+
+class IndexManager:
+    """Creates the declared indexes and checks that the hot queries use them"""
+
+    def __init__(self,
+                 db: pymongo.database.Database,
+                 indexes: typing.Dict[str, typing.List[IndexSpec]] = None,
+                 queries: typing.Dict[str, typing.List[QueryShape]] = None,
+                 ):
+        self._db = db
+        self._indexes = INDEXES if indexes is None else indexes
+        self._queries = HOT_QUERIES if queries is None else queries
+
+    def _col(self, name: str) -> pymongo.collection.Collection:
+        return self._db.get_collection(name, codec_options=self._db.codec_options)
+
+    def ensure_indexes(self) -> None:
+        """
+        Create the missing indexes, and check that the existing ones have the declared keys.
+
+        An existing index with the same name and other keys makes Mongo refuse to create it, so drop it by hand first.
+        """
+        for col_name, specs in self._indexes.items():
+            col = self._col(col_name)
+            col.create_indexes([pymongo.IndexModel(spec.keys, name=spec.name) for spec in specs])
+            info = col.index_information()
+            for spec in specs:
+                keys = [(field, int(direction)) for field, direction in info[spec.name]['key']]
+                if keys != spec.keys:
+                    raise ValueError(f'Index {col_name}.{spec.name} has keys {keys}, expected {spec.keys}')
+            log.debug('Indexes of %s: %s', col_name, ', '.join(spec.name for spec in specs))
+
+    def check_plans(self) -> None:
+        """Explain the hot queries, and raise CollectionScanException if any of them scans its collection"""
+        scans = []
+        for col_name, shapes in self._queries.items():
+            col = self._col(col_name)
+            for shape in shapes:
+                plan = col.find(shape.filter, sort=shape.sort).explain()['queryPlanner']['winningPlan']
+                stages, index_names = _plan_stages(plan)
+                if _COLLSCAN in stages:
+                    scans.append(f'{col_name}.{shape.name}')
+                log.debug('Query %s.%s uses %s', col_name, shape.name,
+                          ', '.join(sorted(index_names)) if index_names else 'no index')
+        if scans:
+            raise CollectionScanException('Queries scan their collections: ' + ', '.join(scans))
+
+    def report_usage(self) -> None:
+        """Log how often each index was used since the server started"""
+        for col_name in self._indexes:
+            try:
+                stats = list(self._col(col_name).aggregate([{'$indexStats': {}}]))
+            except pymongo.errors.OperationFailure as x:
+                log.warning('Index stats of %s unavailable: %s', col_name, x)
+                continue
+            for stat in sorted(stats, key=lambda s: s['name']):
+                log.info('Index %s.%s used %d times since %s', col_name, stat['name'], stat['accesses']['ops'],
+                         stat['accesses']['since'])
+
+
+def _plan_stages(plan) -> typing.Tuple[typing.Set[str], typing.Set[str]]:
+    """Stages and index names anywhere in the plan tree; the tree's layout differs between server versions"""
+    stages = set()
+    index_names = set()
+    todo = [plan]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.add(node['stage'])
+            if 'indexName' in node:
+                index_names.add(node['indexName'])
+            todo.extend(node.values())
+        elif isinstance(node, list):
+            todo.extend(node)
+    return stages, index_names
@@ -0,0 +1,104 @@
+import array
+import bisect
+import logging
+import os
+import pathlib
+import typing
+
+log = logging.getLogger(__name__)
+
+_TYPECODE = 'Q'
+
+
+class KnownIdCache:
+    """
+    Ids of the offers known to be in the database, kept in a file between runs.
+
+    The file holds the ids as a sorted array of unsigned 64-bit integers, so a million of them take 8 MB and are
+    searched with bisect. Ids added during a run are kept in a set and merged into the file by save.
+
+    The cache only answers "known" for sure. Ids it doesn't have, and ids that aren't numbers, are left to the database.
+    """
+
+    def __init__(self, path: typing.Optional[pathlib.Path]):
+        self._path = path
+        self._ids: typing.Optional[array.array] = None
+        self._added: typing.Set[int] = set()
+
+    def _get_ids(self) -> array.array:
+        if self._ids is None:
+            self._ids = self._load()
+        return self._ids
+
+    def _load(self) -> array.array:
+        result = array.array(_TYPECODE)
+        if self._path is None or not self._path.exists():
+            return result
+        with open(self._path, 'rb') as f:
+            data = f.read()
+        if len(data) % result.itemsize:
+            log.warning('Ignoring malformed known id cache %s', self._path)
+            return result
+        result.frombytes(data)
+        log.debug('Loaded %d known ids from %s', len(result), self._path)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._get_ids()) + len(self._added)
+
+    def __contains__(self, offer_id: str) -> bool:
+        key = _key(offer_id)
+        if key is None:
+            return False
+        return key in self._added or self._saved(key)
+
+    def _saved(self, key: int) -> bool:
+        ids = self._get_ids()
+        i = bisect.bisect_left(ids, key)
+        return i < len(ids) and ids[i] == key
+
+    def split(self, ids: typing.Iterable[str]) -> typing.Tuple[typing.List[str], typing.List[str]]:
+        """The ids split into the known ones and the ones the cache can't decide"""
+        known = []
+        unknown = []
+        for offer_id in ids:
+            (known if offer_id in self else unknown).append(offer_id)
+        return known, unknown
+
+    def add(self, ids: typing.Iterable[str]) -> None:
+        for offer_id in ids:
+            key = _key(offer_id)
+            if key is not None and not self._saved(key):
+                self._added.add(key)
+
+    def clear(self) -> None:
+        self._ids = array.array(_TYPECODE)
+        self._added.clear()
+        if self._path is not None and self._path.exists():
+            self._path.unlink()
+
+    def save(self) -> None:
+        """Merge the added ids and write the file, replacing it atomically"""
+        if not self._added or self._path is None:
+            return
+        ids = self._get_ids()
+        merged = ids.tolist()
+        merged.extend(sorted(self._added))
+        # timsort only has to merge the sorted runs
+        merged.sort()
+        self._ids = array.array(_TYPECODE, merged)
+        self._added.clear()
+
+        tmp_path = self._path.with_name(self._path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            self._ids.tofile(f)
+        os.replace(tmp_path, self._path)
+        log.debug('Saved %d known ids to %s', len(self._ids), self._path)
+
+
+def _key(offer_id: str) -> typing.Optional[int]:
+    try:
+        key = int(offer_id)
+    except (TypeError, ValueError):
+        return None
+    return key if 0 <= key < 2 ** 64 else None
@@ -0,0 +1,35 @@
+import datetime
+import typing
+
+import pymongo
+
+LISTING_MARK = 'listing_mark'
+
+_K_MARK = 'mark'
+_K_TS = 'timestamp'
+_FULL_SWEEP = '_full_sweep'
+
+
+class ListingMarkDao:
+    """Newest offer seen in each category listing, and when the listings were last read in full"""
+
+    def __init__(self, col: pymongo.collection.Collection):
+        self._col = col
+
+    def get_marks(self) -> typing.Dict[str, int]:
+        return {d['_id']: d[_K_MARK] for d in self._col.find({'_id': {'$ne': _FULL_SWEEP}})}
+
+    def update_marks(self, marks: typing.Dict[str, int], timestamp: datetime.datetime) -> None:
+        """Raise the marks of the given categories; a mark never goes down"""
+        for category_id, mark in marks.items():
+            self._col.update_one({'_id': category_id}, {
+                '$max': {_K_MARK: mark},
+                '$set': {_K_TS: timestamp},
+            }, upsert=True)
+
+    def get_last_full_sweep(self) -> typing.Optional[datetime.datetime]:
+        doc = self._col.find_one({'_id': _FULL_SWEEP})
+        return doc[_K_TS] if doc else None
+
+    def set_last_full_sweep(self, timestamp: datetime.datetime) -> None:
+        self._col.update_one({'_id': _FULL_SWEEP}, {'$set': {_K_TS: timestamp}}, upsert=True)
@@ -7,9 +7,13 @@ class VoivodeshipDao:
     def __init__(self, db: tinydb.TinyDB):
         self._tbl: tinydb.database.Table = db.table('voivodeship')
         self._q = tinydb.Query()
+        self._names: typing.Optional[typing.Dict[int, str]] = None
 
     def insert_multiple(self, data: typing.List[dict]) -> typing.List[int]:
+        self._names = None
         return self._tbl.insert_multiple(data)
 
     def get_name_by_id(self, id: int) -> str:
-        return self._tbl.get(tinydb.Query().id == id)['name']
+        if self._names is None:
+            self._names = {doc['id']: doc['name'] for doc in self._tbl.all()}
+        return self._names[id]
@@ -5,7 +5,7 @@ from .export import ExportService
 from .file_backup import FileBackupService
 from .filter import FilterService
 from .git_backup import GitBackupService
-from .make_model import CarMakeModelService, derive_model
+from .make_model import CarMakeModelService, ModelMatcher, derive_model
 from .migration import MigrationService
 from .offers import OfferService
 from .vehicle_updater import VehicleUpdaterService
@@ -0,0 +1,59 @@
+"""
+Building offers from their details in worker processes.
+
+The executor must run init_build_worker in each worker. Everything sent to or from the workers is picklable: the
+listed offers, their details and the built CarOffers.
+"""
+import datetime
+import logging
+import multiprocessing
+import typing
+from concurrent import futures
+
+import tinydb
+
+from carscanner.allegro import ItemInfo, ListedOffer
+from carscanner.dao import CarMakeModelDao, CarOffer, VoivodeshipDao
+from .car_offer import CarOffersBuilder
+
+log = logging.getLogger(__name__)
+
+_builder: typing.Optional[CarOffersBuilder] = None
+"""The builder of this worker process"""
+
+
+class BuildBatch(typing.NamedTuple):
+    timestamp: datetime.datetime
+    offers: typing.List[ListedOffer]
+    infos: typing.List[ItemInfo]
+
+
+def build_executor(processes: int) -> futures.ProcessPoolExecutor:
+    """
+    Executor for build_car_offers.
+
+    Workers are spawned rather than forked, since the parent has threads running.
+    """
+    return futures.ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_build_worker)
+
+
+def init_build_worker() -> None:
+    """Load the static tables once per worker"""
+    global _builder
+    import carscanner.dao.resources
+    from carscanner.data import ReadOnlyMiddleware, ResourceStorage
+
+    db = tinydb.TinyDB(storage=ReadOnlyMiddleware(ResourceStorage), package=carscanner.dao.resources,
+                       resource='static.json')
+    _builder = CarOffersBuilder(VoivodeshipDao(db), CarMakeModelDao(db), None)
+    log.debug('Build worker ready')
+
+
+def build_car_offers(batch: BuildBatch) -> typing.List[CarOffer]:
+    """The valid offers of the batch, built from their details"""
+    _builder.ts = batch.timestamp
+    car_offers = _builder.to_car_offers(batch.offers)
+    for info in batch.infos:
+        _builder.update_from_item_info(car_offers[str(info.id)], info)
+    return [car for car in car_offers.values() if car.is_valid()]
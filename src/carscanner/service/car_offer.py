@@ -6,8 +6,9 @@ from decimal import Decimal
 import allegro_api
 import zeep.xsd
 
+from carscanner.allegro import ItemInfo, ListedOffer
 from carscanner.dao import CarMakeModelDao, CarOffer, VoivodeshipDao
-from .make_model import derive_model
+from .make_model import ModelMatcher, derive_model
 
 log = logging.getLogger(__name__)
 
@@ -25,55 +26,65 @@ class CarOffersBuilder:
         self._voivodeship_dao = voivodeship_dao
         self._car_make_model = car_make_model_dao
         self.ts = datetime_now
+        self._matchers: typing.Dict[str, ModelMatcher] = {}
 
     def new_car_offer(self):
         return CarOffer(first_spotted=self.ts)
 
     @staticmethod
-    def update_from_listing_model(car: CarOffer, model):
-        car.id = model.id
-        car.name = model.name
+    def update_from_listing_model(car: CarOffer, model: allegro_api.models.ListingOffer):
+        CarOffersBuilder.update_from_listed_offer(car, ListedOffer.from_model(model))
 
-        price = model.selling_mode.price.amount
+    @staticmethod
+    def update_from_listed_offer(car: CarOffer, offer: ListedOffer):
+        car.id = offer.id
+        car.name = offer.name
+
+        price = offer.amount
         if not isinstance(price, str):
-            log.warning("price %s (%s) is not a string for ID = %s", type(price), price, model.id)
+            log.warning("price %s (%s) is not a string for ID = %s", type(price), price, offer.id)
         car.price = Decimal(str(price))
 
-        car.url = 'https://allegro.pl/oferta/' + model.id
+        car.url = 'https://allegro.pl/oferta/' + offer.id
 
     def update_from_item_info_struct(self, car: CarOffer, o: zeep.xsd.valueobjects.CompoundValue):
+        self.update_from_item_info(car, ItemInfo.from_struct(o))
+
+    def update_from_item_info(self, car: CarOffer, info: ItemInfo):
         try:
-            _update_from_item_cats(car, o.itemCats.item)
-            _update_from_item_info_attributes(car, {a.attribName: a.attribValues.item for a in o.itemAttribs.item})
-            self._update_from_item_info(car, o.itemInfo)
-            if o.itemImages is not None:
-                _update_from_item_images(car, o.itemImages.item)
+            _update_from_item_cats(car, info.cats)
+            _update_from_item_info_attributes(car, info.attribs)
+            self._update_from_item_info(car, info)
+            if info.images:
+                car.image = info.images.get(2)
         except ValueError as x:
             raise ValueError(car.id, *x.args) from None
 
-    def _update_from_item_info(self, car: CarOffer, o: zeep.xsd.valueobjects.CompoundValue):
-        assert car.id == str(o.itId)
+    def _update_from_item_info(self, car: CarOffer, info: ItemInfo):
+        assert car.id == str(info.id)
 
-        car.location = o.itLocation
-        if o.itState is not None and o.itState != 0:
-            car.voivodeship = self._voivodeship_dao.get_name_by_id(o.itState)
+        car.location = info.location
+        if info.state is not None and info.state != 0:
+            car.voivodeship = self._voivodeship_dao.get_name_by_id(info.state)
         if car.make is not None and car.model is None:
-            car.model = self._derive_car_model(o, car.make)
+            car.model = self._derive_car_model(info, car.make)
 
-    def _derive_car_model(self, item_info: zeep.xsd.CompoundValue, make: str):
-        return derive_model(self._car_make_model, make, item_info.itName, item_info.itDescription)
+    def _derive_car_model(self, info: ItemInfo, make: str):
+        matcher = self._matchers.get(make)
+        if matcher is None:
+            matcher = self._matchers[make] = ModelMatcher(self._car_make_model.get_models_by_make(make))
+        return derive_model(self._car_make_model, make, info.name, info.description, matcher)
 
-    def _model_to_car(self, model: allegro_api.models.ListingOffer) -> CarOffer:
+    def _model_to_car(self, offer: ListedOffer) -> CarOffer:
         result = self.new_car_offer()
-        CarOffersBuilder.update_from_listing_model(result, model)
+        CarOffersBuilder.update_from_listed_offer(result, offer)
         return result
 
-    def to_car_offers(self, offers: typing.List[allegro_api.models.ListingOffer]) -> typing.Dict[str, CarOffer]:
+    def to_car_offers(self, offers: typing.List[ListedOffer]) -> typing.Dict[str, CarOffer]:
         return {i.id: self._model_to_car(i) for i in offers}
 
 
-def _update_from_item_cats(car: CarOffer, cats: list):
-    cat_names = [cat.catName for cat in cats]
+def _update_from_item_cats(car: CarOffer, cat_names: typing.List[str]):
     if 'Osobowe' in cat_names and 'Osobowe' != cat_names[-1]:
         idx = cat_names.index('Osobowe')
         if len(cat_names) <= idx + 1:
@@ -101,15 +112,3 @@ def _update_from_item_info_attributes(car: CarOffer, d: typing.Dict[str, typing.
         car.make = d[_KEY_MAKE][0]
     if _KEY_FUEL in d:
         car.fuel = d[_KEY_FUEL][0]
-
-
-def _update_from_item_images(car: CarOffer, o: typing.List[zeep.xsd.CompoundValue]):
-    car.image = _get_image(o, 2)
-
-
-def _get_image(images: typing.List[zeep.xsd.CompoundValue], image_type) -> typing.Optional[str]:
-    for img in images:
-        if img.imageType == image_type:
-            return img.imageUrl
-    else:
-        return None
@@ -1,19 +1,44 @@
+import contextlib
 import decimal
 import json
 import logging
 import pathlib
+import shutil
+import tempfile
 import typing
 
-from carscanner.dao import CarOffer, CarOfferDao, MetadataDao
+from carscanner.dao import CarOffer, CarOfferDao, MetadataDao, YearStats
+from carscanner.dao.car_offer import EXPORT_FIELDS
 from carscanner.utils import datetime_to_unix, join_str
+from .export_artifacts import write_artifacts
 
 log = logging.getLogger(__name__)
 
+LAYOUT_ROWS = 'rows'
+LAYOUT_COLUMNS = 'columns'
+
+_COLUMNS = ('image', 'link', 'name', 'price', 'year', 'mileage', 'imported')
+_CODED_COLUMNS = ('make', 'model', 'location')
+
 
 class ExportService:
-    def __init__(self, car_offer_dao: CarOfferDao, metadata_dao: MetadataDao):
+    def __init__(self, car_offer_dao: CarOfferDao, metadata_dao: MetadataDao, aggregate: bool = False,
+                 pretty: bool = False, layout: str = LAYOUT_ROWS, artifacts_path: typing.Optional[pathlib.Path] = None):
+        """
+        :param aggregate: compute the average mileage per year in the database, rather than from the offers read
+        :param pretty: indent the export by 2, the same as json.dump does. By default it is compact
+        :param layout: LAYOUT_ROWS, one object per car, or LAYOUT_COLUMNS, see write_columnar_export
+        :param artifacts_path: where to write the compressed and hashed copies of the export, see export_artifacts.
+            By default they aren't written
+        """
+        if layout not in (LAYOUT_ROWS, LAYOUT_COLUMNS):
+            raise ValueError(layout)
         self._dao = car_offer_dao
         self._meta_dao = metadata_dao
+        self._aggregate = aggregate
+        self._pretty = pretty
+        self._layout = layout
+        self._artifacts_path = artifacts_path
 
     def export(self, output: pathlib.Path):
         log.info("Exporting data for UI")
@@ -25,65 +50,191 @@ class ExportService:
         max_age = 20
         min_year = now_year - max_age
 
-        offers = self._dao.search_by_year_between_and_mileage_lt(min_year, now_year, 1_000_000)
-
-        model = ExportModel(ts, min_year, now_year, max_age, offers)
+        max_mileage = 1_000_000
+        year_stats = self._dao.year_stats_by_year_between_and_mileage_lt(min_year, now_year, max_mileage) \
+            if self._aggregate else None
+        offers = self._dao.iter_by_year_between_and_mileage_lt(min_year, now_year, max_mileage, EXPORT_FIELDS)
 
         with open(str(output), 'wt') as f:
-            json.dump(model.model(), f, indent=2)
+            if self._layout == LAYOUT_COLUMNS:
+                write_columnar_export(f, ts, min_year, now_year, max_age, offers, year_stats)
+            else:
+                write_export(f, ts, min_year, now_year, max_age, offers, year_stats, self._pretty)
 
+        if self._artifacts_path:
+            write_artifacts(output, self._artifacts_path.expanduser())
 
-class ExportModel:
-    def __init__(self, ts: int, min_year: int, now_year: int, max_age, offers: typing.List[CarOffer]):
-        self._ts = ts
-        self.min_year = min_year
-        self.max_age = max_age
-        self.average = AverageSeriesModel(min_year, now_year)
-        self.car_series = CarSeriesModel(now_year)
-        self.car_details = CarDetailsModel()
 
+def write_export(f: typing.TextIO, ts: int, min_year: int, now_year: int, max_age, offers: typing.Iterable[CarOffer],
+                 year_stats: YearStats = None, pretty: bool = False) -> None:
+    """
+    Write the export as the offers are read, in one pass and without holding them.
+
+    The document is {"data": {"series", "car_details", "avg_series", "timestamp", "min_year", "max_age"}}, with a row of
+    CarSeriesModel and of CarDetailsModel per car.
+
+    series is written straight to f, while car_details, which comes after it, is spooled to a temporary file.
+    """
+    writer = _JsonWriter(f, pretty)
+    average = _average_model(min_year, now_year, year_stats)
+
+    with tempfile.TemporaryFile('w+t', encoding='utf-8') as details_f:
+        details_writer = _JsonWriter(details_f, pretty)
+        writer.start('{')
+        writer.key('data', 0)
+        writer.start('{')
+        writer.key('series', 1)
+        writer.start('[')
         for car in offers:
-            self.average.update(car)
-            self.update(car)
+            if year_stats is None:
+                average.update(car)
+            writer.item(CarSeriesModel.row(car, now_year), 2)
+            details_writer.item(CarDetailsModel.row(car), 2)
+        writer.end(']', 2)
 
-    def update(self, car: CarOffer):
-        self.car_series.update(car)
-        self.car_details.update(car)
+        writer.key('car_details', 1)
+        writer.array(details_writer, 2)
 
-    def model(self):
-        return {
-            'data': {
-                'series': self.car_series.model(),
-                'car_details': self.car_details.model(),
-                'avg_series': self.average.model(),
-                'timestamp': self._ts,
-                'min_year': self.min_year,
-                'max_age': self.max_age
-            }
-        }
+    _write_end(writer, average, ts, min_year, max_age)
 
 
-class CarSeriesModel:
-    def __init__(self, now_year: int):
-        self._model = []
-        self._now_year = now_year
+def write_columnar_export(f: typing.TextIO, ts: int, min_year: int, now_year: int, max_age,
+                          offers: typing.Iterable[CarOffer], year_stats: YearStats = None) -> None:
+    """
+    Write the car details with an array per field rather than an object per car, marked with "layout": "columns".
 
-    def update(self, car: CarOffer):
-        self._model.append({
-            'x': self._now_year - car.year,
-            'y': car.mileage
-        })
+    data.count is the number of cars. make, model and location are dictionary encoded, as
+    {"values": [...], "codes": [...]}, where each code is the index of the car's value. There is no series, since its
+    x is min_year + max_age - year, and its y is the mileage. avg_series, timestamp, min_year and max_age are as in
+    write_export.
 
-    def model(self):
-        return self._model
+    Each column is spooled to a temporary file while the offers are read.
+    """
+    average = _average_model(min_year, now_year, year_stats)
+    codes = {name: {} for name in _CODED_COLUMNS}
+    with contextlib.ExitStack() as stack:
+        columns = {name: _JsonWriter(stack.enter_context(tempfile.TemporaryFile('w+t', encoding='utf-8')), False)
+                   for name in _COLUMNS + _CODED_COLUMNS}
+        count = 0
+        for car in offers:
+            if year_stats is None:
+                average.update(car)
+            row = CarDetailsModel.row(car)
+            for name in _COLUMNS:
+                columns[name].item(row[name], 0)
+            for name in _CODED_COLUMNS:
+                values = codes[name]
+                columns[name].item(values.setdefault(row[name], len(values)), 0)
+            count += 1
 
+        writer = _JsonWriter(f, False)
+        writer.start('{')
+        writer.key('data', 0)
+        writer.start('{')
+        for key, value in (('layout', LAYOUT_COLUMNS), ('count', count)):
+            writer.key(key, 1)
+            writer.value(value, 2)
+        for name in _COLUMNS:
+            writer.key(name, 1)
+            writer.array(columns[name], 2)
+        for name in _CODED_COLUMNS:
+            writer.key(name, 1)
+            writer.start('{')
+            writer.key('values', 2)
+            writer.value(list(codes[name]), 3)
+            writer.key('codes', 2)
+            writer.array(columns[name], 3)
+            writer.end('}', 2)
 
-class CarDetailsModel:
-    def __init__(self):
-        self._model = []
+    _write_end(writer, average, ts, min_year, max_age)
 
-    def update(self, car: CarOffer):
-        self._model.append({
+
+def _write_end(writer: '_JsonWriter', average: 'AverageSeriesModel', ts: int, min_year: int, max_age) -> None:
+    for key, value in (('avg_series', average.model()), ('timestamp', ts), ('min_year', min_year),
+                       ('max_age', max_age)):
+        writer.key(key, 1)
+        writer.value(value, 2)
+    writer.end('}', 1)
+    writer.end('}', 0)
+
+
+def _average_model(min_year: int, now_year: int, year_stats: typing.Optional[YearStats]) -> 'AverageSeriesModel':
+    average = AverageSeriesModel(min_year, now_year)
+    if year_stats is not None:
+        average.year_totals = year_stats.mileage_totals
+        average.year_counts = year_stats.counts
+    return average
+
+
+class _JsonWriter:
+    """
+    Writes JSON piece by piece, laid out the way json.dump lays it out: compact, or indented by 2.
+
+    levels are the nesting depth of the containers the pieces are written in.
+    """
+
+    def __init__(self, f: typing.TextIO, pretty: bool):
+        self._f = f
+        self._pretty = pretty
+        self._encoder = json.JSONEncoder(indent=2) if pretty else json.JSONEncoder(separators=(',', ':'))
+        self.items = 0
+        """Items written in the innermost open container"""
+        self._counts = []
+
+    def start(self, bracket: str) -> None:
+        self._f.write(bracket)
+        self._counts.append(self.items)
+        self.items = 0
+
+    def end(self, bracket: str, level: int) -> None:
+        if self._pretty and self.items:
+            self._f.write('\n' + '  ' * level)
+        self._f.write(bracket)
+        self.items = self._counts.pop()
+
+    def _separator(self, level: int) -> None:
+        if self._pretty:
+            self._f.write(('\n' if not self.items else ',\n') + '  ' * (level + 1))
+        elif self.items:
+            self._f.write(',')
+        self.items += 1
+
+    def key(self, key: str, level: int) -> None:
+        self._separator(level)
+        self._f.write(json.dumps(key) + (': ' if self._pretty else ':'))
+
+    def value(self, value, level: int) -> None:
+        if self._pretty:
+            self._f.write(self._encoder.encode(value).replace('\n', '\n' + '  ' * level))
+        else:
+            self._f.write(self._encoder.encode(value))
+
+    def item(self, value, level: int) -> None:
+        self._separator(level)
+        self.value(value, level + 1)
+
+    def array(self, items: '_JsonWriter', level: int) -> None:
+        """Write the items written by another writer, to a file open for reading and writing, as an array"""
+        self.start('[')
+        items._f.seek(0)
+        shutil.copyfileobj(items._f, self._f)
+        self.items = items.items
+        self.end(']', level)
+
+
+class CarSeriesModel:
+    @staticmethod
+    def row(car: CarOffer, now_year: int) -> dict:
+        return {
+            'x': now_year - car.year,
+            'y': car.mileage
+        }
+
+
+class CarDetailsModel:
+    @staticmethod
+    def row(car: CarOffer) -> dict:
+        return {
             'image': car.image,
             'link': car.url,
             'location': join_str(', ', car.voivodeship, car.location),
@@ -94,10 +245,7 @@ class CarDetailsModel:
             'price': int(car.price.to_integral_value(decimal.ROUND_DOWN)),
             'year': car.year,
             'imported': car.imported,
-        })
-
-    def model(self) -> list:
-        return self._model
+        }
 
 
 class AverageSeriesModel:
@@ -0,0 +1,134 @@
+"""
+Files served in place of the export: precompressed variants, and a copy named after its content.
+
+From export.json, write_artifacts writes, next to it or in another directory:
+
+- export.json.gz and export.json.br, compressed once at the highest levels, so the web tier doesn't compress per request
+- export.<hash>.json, with its .gz and .br. Its name changes with its content, so it can be cached for good
+- export.manifest.json, naming the current hashed copy
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import re
+import shutil
+import typing
+
+import brotli
+
+log = logging.getLogger(__name__)
+
+ENCODING_GZIP = 'gzip'
+ENCODING_BROTLI = 'br'
+
+_HASH_LENGTH = 16
+_CHUNK_SIZE = 1 << 16
+_K_FILE = 'file'
+
+
+def _gzip(src: typing.BinaryIO, dst: typing.BinaryIO) -> None:
+    # no name nor time in the header, the same content compresses to the same bytes
+    with gzip.GzipFile(filename='', mode='wb', fileobj=dst, compresslevel=9, mtime=0) as out:
+        shutil.copyfileobj(src, out, _CHUNK_SIZE)
+
+
+def _brotli(src: typing.BinaryIO, dst: typing.BinaryIO) -> None:
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=11)
+    for chunk in iter(lambda: src.read(_CHUNK_SIZE), b''):
+        dst.write(compressor.process(chunk))
+    dst.write(compressor.finish())
+
+
+_ENCODINGS: typing.List[typing.Tuple[str, str, typing.Callable[[typing.BinaryIO, typing.BinaryIO], None]]] = [
+    (ENCODING_GZIP, '.gz', _gzip),
+    (ENCODING_BROTLI, '.br', _brotli),
+]
+"""Content encoding, file suffix and compressor of each variant"""
+
+
+def write_artifacts(path: pathlib.Path, directory: pathlib.Path = None) -> dict:
+    """
+    Write the artifacts of the export at path to directory, by default the export's own, and return the manifest.
+
+    Every file is replaced atomically. Hashed copies named by neither the new manifest nor the previous one are
+    removed, so clients that have just read the previous manifest can still fetch its file.
+    """
+    directory = directory or path.parent
+    directory.mkdir(parents=True, exist_ok=True)
+    content_hash = _hash(path)
+    hashed = directory / f'{path.stem}.{content_hash}{path.suffix}'
+    manifest_path = directory / f'{path.stem}.manifest{path.suffix}'
+    previous = _read_manifest(manifest_path)
+
+    _write(hashed, lambda dst: _copy(path, dst))
+    manifest = {
+        _K_FILE: hashed.name,
+        'hash': content_hash,
+        'size': path.stat().st_size,
+        'encodings': {},
+    }
+    for encoding, suffix, compress in _ENCODINGS:
+        variant = directory / (path.name + suffix)
+        _write(variant, lambda dst: _copy(path, dst, compress))
+        _write(hashed.with_name(hashed.name + suffix), lambda dst: _copy(variant, dst))
+        manifest['encodings'][encoding] = {_K_FILE: hashed.name + suffix, 'size': variant.stat().st_size}
+
+    _write(manifest_path, lambda dst: dst.write(json.dumps(manifest, indent=2).encode()))
+    _remove_stale(directory, path, {hashed.name, previous.get(_K_FILE) if previous else None})
+    log.info('Export artifacts: %s, %s', hashed.name,
+             ', '.join(f'{encoding} {v["size"]} B' for encoding, v in manifest['encodings'].items()))
+    return manifest
+
+
+def artifact_globs(path: pathlib.Path) -> typing.List[str]:
+    """Glob patterns matching the names of the artifacts write_artifacts writes for the export at path"""
+    return [
+        path.name + '.*',
+        f'{path.stem}.{"[0-9a-f]" * _HASH_LENGTH}{path.suffix}*',
+        f'{path.stem}.manifest{path.suffix}',
+    ]
+
+
+def _hash(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:_HASH_LENGTH]
+
+
+def _copy(src_path: pathlib.Path, dst: typing.BinaryIO,
+          transform: typing.Callable[[typing.BinaryIO, typing.BinaryIO], None] = None) -> None:
+    with open(src_path, 'rb') as src:
+        (transform or shutil.copyfileobj)(src, dst)
+
+
+def _write(path: pathlib.Path, write: typing.Callable[[typing.BinaryIO], None]) -> None:
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def _read_manifest(path: pathlib.Path) -> typing.Optional[dict]:
+    try:
+        with open(path, 'rt') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove_stale(directory: pathlib.Path, path: pathlib.Path, keep: typing.Set[str]) -> None:
+    hashed_name = re.compile(re.escape(path.stem) + r'\.[0-9a-f]{%d}' % _HASH_LENGTH + re.escape(path.suffix))
+    for candidate in directory.iterdir():
+        match = hashed_name.match(candidate.name)
+        if match and match.group() not in keep:
+            log.debug('Removing stale export artifact %s', candidate.name)
+            candidate.unlink()
@@ -16,11 +16,16 @@ class FilterService:
         self._filter_dao = filter_dao
         self._crit_dao = criteria_dao
 
-    def load_filters(self):
+    def load_filters(self) -> typing.List[dict]:
         log.debug("Get filters for %s", crit.category_name)
         filters = self._allegro.get_filters(crit.category_id)
+        result = [FilterService._filter_to_dict(crit.category_id, filt) for filt in filters]
+        self.restore_filters(result)
+        return result
+
+    def restore_filters(self, filters: typing.List[dict]) -> None:
+        """Load filters returned by an earlier load_filters"""
         for filt in filters:
-            filt = FilterService._filter_to_dict(crit.category_id, filt)
             self._filter_dao.insert(filt)
 
     @staticmethod
@@ -28,9 +33,18 @@ class FilterService:
         param_dict = param.to_dict()
         return param_dict
 
-    def transform_filters(self, category_id, filters: typing.Dict[str, str]) -> typing.Dict[str, str]:
+    def transform_filters(self, category_id, filters: typing.Dict[str, typing.Union[str, tuple]]) \
+            -> typing.Dict[str, str]:
+        """
+        Translate filter and value names to listing parameters.
+
+        A (from, to) tuple value selects a range of a NUMERIC filter.
+        """
         result = {}
         for k, v in filters.items():
+            if isinstance(v, tuple):
+                result.update(self._filter_dao.range_to_keys(category_id, k, *v))
+                continue
             nk, nv = self._filter_dao.names_to_keys(category_id, k, v)
             result[nk] = nv
 
@@ -11,6 +11,7 @@ from carscanner.dao import CarOfferDao
 from carscanner.dao.car_offer import VEHICLE_V3 as _VEHICLE_V3
 from carscanner.data import VehicleShardLoader
 from carscanner.service import BackupService, ExportService
+from carscanner.service.export_artifacts import artifact_globs
 
 log = logging.getLogger(__name__)
 
@@ -58,13 +59,15 @@ def git_clone(uri: str, data_path: pathlib.Path, log_q: mp.Queue) -> typing.Opti
     return p
 
 
-def do_commit_push(repo_dir: pathlib.Path, log_q: mp.Queue) -> None:
+def do_commit_push(repo_dir: pathlib.Path, log_q: mp.Queue, exclude: typing.Sequence[str] = ()) -> None:
+    """Commit and push the JSON files of repo_dir but those matching the exclude patterns, relative to repo_dir"""
     try:
         r = git.Repo(repo_dir)
-        idx = r.index
 
         log_q.put_nowait('Adding items to index')
-        idx.add((str(f) for f in repo_dir.rglob('*.json')), write=True)
+        # -A stages the removal of files that are gone too
+        r.git.add('-A', '--', '*.json', *(':(exclude)' + pattern for pattern in exclude))
+        idx = r.index
 
         if len(idx.diff(r.head.commit)):
             from datetime import datetime
@@ -78,8 +81,8 @@ def do_commit_push(repo_dir: pathlib.Path, log_q: mp.Queue) -> None:
         log_q.put(str(e))
 
 
-def commit_push(repo_dir: pathlib.Path, log_q: mp.Queue) -> mp.Process:
-    p = mp.Process(target=do_commit_push, args=(repo_dir, log_q,))
+def commit_push(repo_dir: pathlib.Path, log_q: mp.Queue, exclude: typing.Sequence[str] = ()) -> mp.Process:
+    p = mp.Process(target=do_commit_push, args=(repo_dir, log_q, exclude,))
     p.start()
     return p
 
@@ -116,5 +119,13 @@ class GitBackupService(BackupService):
             self._offer_export_svc.export(self._export_path)
             VehicleShardLoader(tbl, self._vehicle_data_path).close()
 
-            commit_push(self._data_path, log_q).join()
+            commit_push(self._data_path, log_q, self._artifact_globs()).join()
         log.info('Backup done')
+
+    def _artifact_globs(self) -> typing.List[str]:
+        """The export artifacts aren't backup data, keep them out of the repo if they are written in it"""
+        try:
+            export_dir = pathlib.PurePosixPath(self._export_path.relative_to(self._data_path).parent)
+        except ValueError:
+            return []
+        return [str(export_dir / pattern) for pattern in artifact_globs(self._export_path)]
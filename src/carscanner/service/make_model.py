@@ -1,3 +1,4 @@
+import itertools
 import json
 import typing
 
@@ -6,23 +7,97 @@ from unidecode import unidecode
 from carscanner.dao import CarMakeModelDao
 
 
-def derive_model(car_make_model: CarMakeModelDao, make: str, name: str, description: str) -> typing.Optional[str]:
-    assert make
+class _Normalize(dict):
+    """
+    str.translate table doing unidecode and lower(), and turning everything but letters and digits into spaces.
 
-    if name is None and description is None:
-        raise ValueError('name or description required')
+    Filled as characters are seen, so that translating is done in C.
+    """
+
+    def __missing__(self, char: int) -> str:
+        result = unidecode(chr(char)).lower()
+        result = self[char] = ''.join(c if c.isascii() and c.isalnum() else ' ' for c in result)
+        return result
+
+
+_normalize = _Normalize()
+
+
+def _tokenize(text: str) -> typing.List[str]:
+    """Words of the text, normalised the same way as the stored models"""
+    return text.translate(_normalize).split()
+
+
+class ModelMatcher:
+    """
+    Finds the longest model name of a make in a text.
 
-    models = car_make_model.get_models_by_make(make)
+    Model names are matched as whole words, so that short names don't match inside other words. The models are compiled
+    to a trie of words, which is followed from each occurrence of a word starting a model.
+    """
 
-    name = name.lower() if name is not None else ''
-    description = description.lower() if description is not None else ''
+    _MODEL = None
+    """Key of the model ending at a trie node. Not a string, so it can't clash with a word"""
 
-    matches = []
-    for model in models:
-        if model in name or model in description:
-            matches.append(model.capitalize())
+    def __init__(self, models: typing.List[str]):
+        self._trie: dict = {}
+        for idx, model in enumerate(models):
+            words = _tokenize(model)
+            if not words:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            # with duplicates, keep the first one, like a scan of the list would
+            node.setdefault(ModelMatcher._MODEL, (len(model), -idx, model))
+
+    def match(self, *texts: typing.Optional[str]) -> typing.Optional[str]:
+        words = []
+        for text in texts:
+            if text:
+                # an empty word never matches, so that no model spans two texts
+                words.append('')
+                words.extend(_tokenize(text))
+
+        best = None
+        # only follow the trie from the words starting a model, found and located in C rather than by a loop over all
+        # the words
+        for first in self._trie.keys() & set(words):
+            start = -1
+            while True:
+                try:
+                    start = words.index(first, start + 1)
+                except ValueError:
+                    break
+                found = self._longest_at(words, start)
+                if found is not None and (best is None or found > best):
+                    best = found
+        return best[2].capitalize() if best else None
+
+    def _longest_at(self, words: typing.List[str], start: int) -> typing.Optional[tuple]:
+        best = None
+        node = self._trie
+        for word in itertools.islice(words, start, None):
+            node = node.get(word)
+            if node is None:
+                break
+            best = node.get(ModelMatcher._MODEL, best)
+        return best
+
+
+def derive_model(car_make_model: CarMakeModelDao, make: str, name: str, description: str,
+                 matcher: ModelMatcher = None) -> typing.Optional[str]:
+    """
+    :param matcher: Matcher of the make's models, to save compiling it for each call
+    """
+    assert make
+
+    if name is None and description is None:
+        raise ValueError('name or description required')
 
-    return max(matches, key=len, default=None)
+    if matcher is None:
+        matcher = ModelMatcher(car_make_model.get_models_by_make(make))
+    return matcher.match(name, description)
 
 
 class CarMakeModelService:
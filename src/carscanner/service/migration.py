@@ -4,6 +4,7 @@ import pymongo.database
 import pymongo.errors
 
 from carscanner.dao.car_offer import VEHICLE_V3 as _VEHICLE_V3
+from carscanner.dao.indexes import IndexManager
 from carscanner.dao.meta import META_V2 as _META_V2, META_VER as _META_VER
 from carscanner.utils import memoized
 
@@ -17,8 +18,14 @@ class MetadataVersionException(BaseException):
 class MigrationService:
     def __init__(self,
                  db_v4: pymongo.database.Database,
+                 check_indexes: bool = False,
                  ):
+        """
+        :param check_indexes: explain the hot queries and fail if any of them scans a collection, and log index usage.
+            Needs a real server
+        """
         self._db_v4 = db_v4
+        self._check_indexes = check_indexes
 
     def check_migrate(self):
         if self.is_current_version():
@@ -28,6 +35,14 @@ class MigrationService:
         elif self.is_previous_version():
             log.info("Database in the previous version")
             self.do_migrate()
+        self.check_indexes()
+
+    def check_indexes(self) -> None:
+        indexes = IndexManager(self._db_v4)
+        indexes.ensure_indexes()
+        if self._check_indexes:
+            indexes.report_usage()
+            indexes.check_plans()
 
     def is_previous_version(self) -> bool:
         return self._meta_col().count_documents({'version': 4}) == 1
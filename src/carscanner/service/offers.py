@@ -1,18 +1,106 @@
+import asyncio
 import datetime
+import decimal
 import logging
+import math
+import threading
+import time
 import typing
+from concurrent import futures
 
-import allegro_api.models
 import zeep
 import zeep.exceptions
 
-from carscanner.allegro import CarscannerAllegro
-from carscanner.dao import CarOfferDao, Criteria, CriteriaDao
-from carscanner.utils import chunks
+from carscanner.allegro import AsyncCarscannerAllegro, CarscannerAllegro, ItemInfo, ListedOffer, ListingPage
+from carscanner.dao import CarOffer, CarOfferDao, CheckpointDao, Criteria, CriteriaDao, FailedItemDao, ListingMarkDao
+from carscanner.dao.checkpoint import listing_page_stage, listing_stage, plan_stage
+from carscanner.utils import bounded_map, chunks, chunks_iter
 from . import CarOffersBuilder, FilterService
+from .build_pool import BuildBatch, build_car_offers
+from .pipeline import Pipeline, StageStats
 
 logger = logging.getLogger(__name__)
 
+_PIPE_CHUNKS = 10
+"""How many get_items_info chunks may wait between the pipeline stages"""
+
+_SLOW_CALL = 10.
+"""get_items_info calls taking longer than that many seconds shrink the chunk size"""
+
+_MAX_LISTING_OFFSET = 6000
+"""The listing endpoint doesn't serve offers past that offset"""
+
+_MAX_PRICE = 1_000_000_000
+"""Upper bound of the price filter"""
+
+_PRICE_FILTER = 'cena'
+
+_INSERT_BATCH = 100
+"""New offers are inserted in batches of that many, so that an interrupted run keeps the details fetched so far"""
+
+
+class PriceRange(typing.NamedTuple):
+    """Listing partition, offers priced from low up to, but not including, high. None high is unbounded"""
+    low: int
+    high: typing.Optional[int]
+
+    def to_filter(self) -> typing.Tuple[int, typing.Optional[decimal.Decimal]]:
+        # the price filter includes both ends, and prices are in full grosze
+        return self.low, decimal.Decimal(self.high) - decimal.Decimal('0.01') if self.high is not None else None
+
+    def split(self) -> typing.Optional[typing.Tuple['PriceRange', 'PriceRange']]:
+        """Split in two ranges with, hopefully, similar offer counts. None if the range is too narrow to split"""
+        high = self.high if self.high is not None else _MAX_PRICE
+        # prices are spread over orders of magnitude, so split at the geometric mean
+        middle = int(math.sqrt(max(self.low, 1) * high))
+        if middle <= self.low:
+            middle = (self.low + high) // 2
+        if middle <= self.low:
+            return None
+        return PriceRange(self.low, middle), PriceRange(middle, self.high)
+
+
+class AdaptiveChunkSize:
+    """
+    get_items_info chunk size, adjusted to the calls seen so far.
+
+    Grows by one after a fast successful call, up to the service limit, shrinks by one after a slow call and halves
+    after a failed call.
+    """
+
+    def __init__(self, max_size: int, slow_call: float = _SLOW_CALL):
+        self.max_size = max_size
+        self.size = max_size
+        self._slow_call = slow_call
+
+    def success(self, elapsed: float) -> None:
+        if elapsed > self._slow_call:
+            self.size = max(1, self.size - 1)
+        else:
+            self.size = min(self.max_size, self.size + 1)
+
+    def failure(self) -> None:
+        self.size = max(1, self.size // 2)
+
+
+def _offer_number(offer: ListedOffer) -> typing.Optional[int]:
+    try:
+        return int(offer.id)
+    except ValueError:
+        return None
+
+
+def _as_utc(dt: datetime.datetime) -> datetime.datetime:
+    return dt.replace(tzinfo=datetime.timezone.utc) if dt.tzinfo is None else dt
+
+
+def _offer_to_checkpoint(offer: ListedOffer) -> dict:
+    return {'id': offer.id, 'name': offer.name, 'amount': offer.amount, 'currency': offer.currency}
+
+
+def _offer_from_checkpoint(d: dict) -> ListedOffer:
+    return ListedOffer(d['id'], d['name'], d['amount'], d['currency'])
+
 
 class OfferService:
     _filter_template = {
@@ -33,100 +121,595 @@ class OfferService:
             car_offer_dao: CarOfferDao,
             filter_svc: FilterService,
             datetime_now: datetime.datetime,
+            executor: futures.Executor,
+            listing_workers: int = 1,
+            batch_size: typing.Optional[int] = None,
+            pipelined: bool = False,
+            failed_item_dao: typing.Optional[FailedItemDao] = None,
+            max_item_failures: int = 3,
+            async_allegro: typing.Optional[AsyncCarscannerAllegro] = None,
+            listing_mark_dao: typing.Optional[ListingMarkDao] = None,
+            incremental: bool = False,
+            full_sweep_interval: datetime.timedelta = datetime.timedelta(days=1),
+            checkpoint_dao: typing.Optional[CheckpointDao] = None,
+            build_executor: typing.Optional[futures.Executor] = None,
+            build_workers: int = 1,
+            run_tag_sweep: bool = False,
     ):
+        """
+        :param listing_workers: How many categories to fetch concurrently on the executor. 1 fetches them one after
+            another in the calling thread.
+        :param batch_size: How many listed offers to process at a time. None processes the whole listing at once.
+        :param pipelined: Fetch the offer details while the listing is still being fetched.
+        :param failed_item_dao: Where to remember the items whose details couldn't be fetched, between runs.
+        :param max_item_failures: After failing in that many runs, an item is no longer fetched.
+        :param async_allegro: If set, get_offers sends its requests concurrently with asyncio, through this client.
+        :param listing_mark_dao: Where to remember the newest offer seen in each category, between runs.
+        :param incremental: Stop reading a category listing once a page shows only offers older than its mark.
+            Offers not listed are then left alone, a full sweep is still made once per full_sweep_interval to update
+            their status.
+        :param checkpoint_dao: Where to save the listing of each category as soon as it's read, and to read it from if
+            it was saved by an interrupted run with the same timestamp.
+        :param build_executor: If set, offers are built from their details in this executor, usually a process pool
+            from build_pool.build_executor, while the details of the next batches are fetched.
+        :param build_workers: How many workers build_executor has, twice as many batches are kept in flight.
+        :param run_tag_sweep: Update the status of the offers by stamping the listed ones with the timestamp, then
+            deactivating those with an older stamp. Otherwise the listed ids are sent in a single update.
+        """
         self._allegro = carscanner_allegro
         self.criteria_dao = criteria_dao
         self.car_offers_builder = car_offers_builder
         self.car_offer_dao = car_offer_dao
         self.filter_service = filter_svc
         self.timestamp = datetime_now
+        self._executor = executor
+        self._listing_workers = listing_workers
+        self._batch_size = batch_size
+        self._pipelined = pipelined
+        self._failed_item_dao = failed_item_dao
+        self._max_item_failures = max_item_failures
+        self._known_failures: typing.Optional[typing.Dict[str, int]] = None
+        self._chunk_size: typing.Optional[AdaptiveChunkSize] = None
+        self._async_allegro = async_allegro
+        self._listing_mark_dao = listing_mark_dao
+        self._incremental = incremental
+        self._full_sweep_interval = full_sweep_interval
+        self._marks: typing.Optional[typing.Dict[str, int]] = None
+        self._newest: typing.Dict[str, int] = {}
+        # partitions of a category are listed concurrently
+        self._newest_lock = threading.Lock()
+        self._checkpoint_dao = checkpoint_dao
+        self._build_executor = build_executor
+        self._build_workers = build_workers
+        self._run_tag_sweep = run_tag_sweep
 
-    def _get_offers_for_criteria(self, crit: Criteria) -> typing.Iterable[typing.List[allegro_api.models.ListingOffer]]:
+    def _get_offers_for_criteria(self, crit: Criteria, price_range: typing.Optional[PriceRange] = None) \
+            -> typing.Iterable[typing.List[ListedOffer]]:
+        mark = self._get_mark(crit)
         offset = 0
         while True:
             try:
-                data = self._allegro.get_listing(**self._search_params(crit, offset))
+                data = self._allegro.get_listing_page(**self._search_params(crit, offset, price_range=price_range))
             except ValueError as e:
                 logger.warning(e)
-                params = self._search_params(crit, offset)
+                params = self._search_params(crit, offset, price_range=price_range)
                 params['_preload_content'] = False
                 raw_data = self._allegro.get_listing(**params)
                 logger.info(raw_data)
                 raise
 
-            size = len(data.items.promoted) + len(data.items.regular)
-            logger.info('get_listing: cat: %s, total %d, this run %d, offset %d',
+            size = len(data.promoted) + len(data.regular)
+            logger.info('get_listing: cat: %s, price: %s, total %d, this run %d, offset %d',
                         crit.category_id,
-                        data.search_meta.available_count,
+                        price_range,
+                        data.available_count,
                         size,
                         offset,
                         )
 
-            if data.items.promoted:
-                yield data.items.promoted
-            if data.items.regular:
-                yield data.items.regular
+            self._note_newest(crit, data.regular)
+            if data.promoted:
+                yield data.promoted
+            if data.regular:
+                yield data.regular
 
             offset += size
-            if offset >= data.search_meta.available_count:
+            if offset >= data.available_count or self._reached_mark(crit, mark, data, offset):
+                break
+            if offset >= _MAX_LISTING_OFFSET:
+                logger.warning('get_listing: cat: %s, price: %s, offers past offset %d are out of reach',
+                               crit.category_id, price_range, offset)
                 break
 
-    def _search_params(self, crit: Criteria, offset=0) -> dict:
+    def _search_params(self, crit: Criteria, offset=0, limit: int = None,
+                       price_range: typing.Optional[PriceRange] = None) -> dict:
+        filters = OfferService._filter_template
+        if price_range is not None:
+            filters = {**filters, _PRICE_FILTER: price_range.to_filter()}
+
         result = OfferService.search_params.copy()
-        result['dynamic_filters'] = self.filter_service.transform_filters(crit.category_id,
-                                                                          OfferService._filter_template)
+        result['dynamic_filters'] = self.filter_service.transform_filters(crit.category_id, filters)
         result['category_id'] = crit.category_id
         result['offset'] = offset
-        result['limit'] = self._allegro.get_listing.limit_max
+        result['limit'] = limit or self._allegro.get_listing.limit_max
 
         return result
 
+    def _start_listing(self) -> None:
+        """Decide between a full sweep and an incremental scan"""
+        self._newest = {}
+        self._marks = None
+        if not self._incremental or not self._listing_mark_dao:
+            return
+
+        last_full_sweep = self._listing_mark_dao.get_last_full_sweep()
+        if last_full_sweep is None or _as_utc(self.timestamp) - _as_utc(last_full_sweep) >= self._full_sweep_interval:
+            logger.info('Last full sweep at %s, sweeping', last_full_sweep)
+            return
+
+        self._marks = self._listing_mark_dao.get_marks()
+        logger.info('Incremental scan, last full sweep at %s', last_full_sweep)
+
+    def _finish_listing(self, listed_ids: typing.List[str]) -> None:
+        if self._marks is None and self._run_tag_sweep:
+            self.car_offer_dao.mark_listed(listed_ids, self.timestamp)
+            self.car_offer_dao.deactivate_unlisted(self.timestamp)
+        elif self._marks is None:
+            # new offers are already inserted as active, so every listed offer is active now
+            self.car_offer_dao.update_status(listed_ids, self.timestamp)
+        else:
+            logger.info('Incremental scan, leaving the status of unlisted offers')
+
+        if self._listing_mark_dao:
+            self._listing_mark_dao.update_marks(self._newest, self.timestamp)
+            if self._marks is None:
+                self._listing_mark_dao.set_last_full_sweep(self.timestamp)
+
+    def _get_mark(self, crit: Criteria) -> typing.Optional[int]:
+        return self._marks.get(crit.category_id) if self._marks is not None else None
+
+    def _note_newest(self, crit: Criteria, offers: typing.List[ListedOffer]) -> None:
+        numbers = [n for n in map(_offer_number, offers) if n is not None]
+        if numbers:
+            with self._newest_lock:
+                self._newest[crit.category_id] = max(self._newest.get(crit.category_id, 0), *numbers)
+
+    @staticmethod
+    def _reached_mark(crit: Criteria, mark: typing.Optional[int], data: ListingPage, offset: int) -> bool:
+        """Whether the page shows only offers older than the mark. Sponsored offers are unsorted, so they don't count"""
+        if mark is None or not data.regular:
+            return False
+        numbers = [_offer_number(o) for o in data.regular]
+        if any(n is None or n > mark for n in numbers):
+            return False
+
+        logger.info('get_listing: cat: %s, reached known offers at offset %d of %d', crit.category_id, offset,
+                    data.available_count)
+        return True
+
+    def _count_offers(self, crit: Criteria, price_range: typing.Optional[PriceRange]) -> int:
+        params = self._search_params(crit, 0, self._allegro.get_listing.limit_min, price_range)
+        params['include'] = ['-all', 'searchMeta']
+        return self._allegro.get_listing_page(**params).available_count
+
+    def _plan_partitions(self, crit: Criteria) -> typing.List[typing.Optional[PriceRange]]:
+        """
+        Split the category listing in price ranges small enough to be read in full.
+
+        The listing can't be read past _MAX_LISTING_OFFSET, so a bigger category is split in two, and so on until each
+        part fits. Returns [None] if the category fits as a whole.
+        """
+        total = self._count_offers(crit, None)
+        if total <= _MAX_LISTING_OFFSET:
+            return [None]
+
+        result = []
+        # depth first, so that the partitions come out ordered by price
+        pending = [(PriceRange(0, None), total)]
+        while pending:
+            price_range, count = pending.pop()
+            halves = price_range.split() if count > _MAX_LISTING_OFFSET else None
+            if halves is None:
+                if count > _MAX_LISTING_OFFSET:
+                    logger.warning('get_listing: cat: %s, price: %s, too many offers: %d', crit.category_id,
+                                   price_range, count)
+                # the top range is kept even if empty, so that it catches offers added in the meantime
+                if count or price_range.high is None:
+                    result.append(price_range)
+                continue
+            for half in reversed(halves):
+                pending.append((half, self._count_offers(crit, half)))
+
+        logger.info('get_listing: cat: %s, %d offers in %d partitions', crit.category_id, total, len(result))
+        return result
+
+    def _get_partitions(self, crit: Criteria) -> typing.List[typing.Optional[PriceRange]]:
+        """The partitions of the category, the same as in the interrupted run if there was one"""
+        if not self._checkpoint_dao:
+            return self._plan_partitions(crit)
+
+        stage = plan_stage(crit.category_id)
+        saved = self._checkpoint_dao.get(stage)
+        if saved is not None:
+            return [PriceRange(*p) if p else None for p in saved]
+
+        result = self._plan_partitions(crit)
+        self._checkpoint_dao.done(stage, [list(p) if p else None for p in result])
+        return result
+
+    def _get_partition_offers(self, crit: Criteria, price_range: typing.Optional[PriceRange]) \
+            -> typing.Iterable[typing.List[ListedOffer]]:
+        """
+        Pages of a partition, as they are read.
+
+        With checkpoints, each page is saved before it's yielded, and the partition is marked done with the offsets of
+        its pages after the last one. A partition that wasn't done is read again from the start.
+        """
+        if not self._checkpoint_dao:
+            yield from self._get_offers_for_criteria(crit, price_range)
+            return
+
+        stage = listing_stage(crit.category_id, f'{price_range.low}-{price_range.high}' if price_range else None)
+        offsets = self._checkpoint_dao.get(stage)
+        if offsets is not None:
+            logger.info('get_listing: cat: %s, price: %s, %d pages from checkpoint', crit.category_id, price_range,
+                        len(offsets))
+            for offset in offsets:
+                saved = self._checkpoint_dao.get(listing_page_stage(stage, offset))
+                offers = [_offer_from_checkpoint(d) for d in saved]
+                self._note_newest(crit, offers)
+                yield offers
+            return
+
+        offsets = []
+        offset = 0
+        for page in self._get_offers_for_criteria(crit, price_range):
+            self._checkpoint_dao.done(listing_page_stage(stage, offset), [_offer_to_checkpoint(o) for o in page])
+            offsets.append(offset)
+            offset += len(page)
+            yield page
+        self._checkpoint_dao.done(stage, offsets)
+
+    def _get_offers_for_all_criteria(self) -> typing.Iterable[typing.List[ListedOffer]]:
+        criteria = self.criteria_dao.all()
+        if self._listing_workers <= 1:
+            for crit in criteria:
+                for price_range in self._get_partitions(crit):
+                    yield from self._get_partition_offers(crit, price_range)
+        else:
+            logger.info('get_listing: %d categories, %d workers', len(criteria), self._listing_workers)
+
+            def fetch(part: typing.Tuple[Criteria, typing.Optional[PriceRange]]) \
+                    -> typing.List[typing.List[ListedOffer]]:
+                return list(self._get_partition_offers(*part))
+
+            parts = ((crit, price_range) for crit in criteria for price_range in self._get_partitions(crit))
+            # results come back in the criteria order, regardless of which category finishes first
+            for crit_items in bounded_map(self._executor, fetch, parts, self._listing_workers):
+                yield from crit_items
+
     def get_offers(self):
-        items = []
-        for crit in self.criteria_dao.all():
-            for crit_items in self._get_offers_for_criteria(crit):
-                items.append(crit_items)
-        items = [item for sublist in items for item in sublist]
+        """
+        Fetch the listing, add the new offers to the database and update the status of the known ones.
+
+        With batch_size set, the listing is processed in batches of that many items: each batch is checked against the
+        database, enriched and inserted before the next one is read. Otherwise the whole listing is one batch.
+        The status update runs once the whole listing has been read, since it deactivates every offer not listed.
+        """
+        self._start_listing()
+        if self._async_allegro:
+            asyncio.run(self.get_offers_async(self._async_allegro))
+            return
+        if self._pipelined:
+            self._get_offers_pipelined()
+            return
+
+        items = (item for crit_items in self._get_offers_for_all_criteria() for item in crit_items)
+        batches = chunks_iter(items, self._batch_size) if self._batch_size else [list(items)]
+
+        listed_ids = []
+        found = 0
+        known = 0
+        for batch in batches:
+            batch_ids = [item.id for item in batch]
+            existing = set(self.car_offer_dao.search_existing_ids(batch_ids))
+            logger.debug("Batch of %d vehicles, known: %d", len(batch), len(existing))
+
+            found += len(batch)
+            known += len(existing)
+            listed_ids.extend(batch_ids)
+
+            self._add_offers([item for item in batch if item.id not in existing])
+
+        logger.info("Found vehicles: %i, known: %i, new %i", found, known, found - known)
+
+        self._finish_listing(listed_ids)
+
+    def _get_offers_pipelined(self):
+        """
+        Fetch the listing and the details of the new offers at the same time.
+
+        The listing stage sends new offers to the details stage as soon as a page shows them, and the details stage
+        sends the built offers to the insert stage. The stages are joined by bounded queues, so a slow stage holds back
+        the others instead of piling up items in memory.
+        """
+        items_limit = self._allegro.get_items_info.items_limit
+        pipeline = Pipeline()
+        new_items = pipeline.pipe(items_limit * _PIPE_CHUNKS)
+        car_offers = pipeline.pipe(_PIPE_CHUNKS)
+
+        listed_ids = []
+        known = 0
+
+        def listing(stats: StageStats) -> None:
+            nonlocal known
+            queued = set()
+            for page in self._get_offers_for_all_criteria():
+                page_ids = [item.id for item in page]
+                existing = set(self.car_offer_dao.search_existing_ids(page_ids))
+                known += len(existing)
+                listed_ids.extend(page_ids)
 
-        item_ids = [item.id for item in items]
+                for item in page:
+                    # the same offer may be listed in more than one category
+                    if item.id not in existing and item.id not in queued:
+                        queued.add(item.id)
+                        new_items.put(item, stats)
+            new_items.close(stats)
 
-        existing = self.car_offer_dao.search_existing_ids(item_ids)
+        def details(stats: StageStats) -> None:
+            if self._build_executor:
+                for cars in self._build_offers_in_executor(chunks_iter(new_items.get_all(stats), items_limit)):
+                    car_offers.put(cars, stats)
+            else:
+                for chunk in chunks_iter(new_items.get_all(stats), items_limit):
+                    car_offers.put(self._build_offers(chunk), stats)
+            car_offers.close(stats)
 
-        found = len(items)
-        existing_len = len(existing)
-        logger.info("Found vehicles: %i, known: %i, new %i", found, existing_len, found - existing_len)
+        def insert(stats: StageStats) -> None:
+            cars = (car for chunk in car_offers.get_all(stats) for car in chunk)
+            for batch in chunks_iter(cars, self._batch_size or items_limit * _PIPE_CHUNKS):
+                self.car_offer_dao.insert_multiple(batch)
 
-        self.car_offer_dao.update_status(existing, self.timestamp)
+        pipeline.add_stage('listing', listing)
+        pipeline.add_stage('details', details)
+        pipeline.add_stage('insert', insert)
+        pipeline.run()
+
+        found = len(listed_ids)
+        logger.info("Found vehicles: %i, known: %i, new %i", found, known, found - known)
+
+        self._finish_listing(listed_ids)
+
+    async def get_offers_async(self, allegro: AsyncCarscannerAllegro) -> None:
+        """
+        Like get_offers, but with the requests sent concurrently from a single thread.
+
+        All categories are fetched at once: after the first page of a category, the remaining pages are requested
+        together. The details of each batch are then requested together too. The client limits how many requests are
+        in flight.
+        """
+        async with allegro:
+            criteria = self.criteria_dao.all()
+            crit_parts = await asyncio.gather(*(self._plan_partitions_async(allegro, crit) for crit in criteria))
+            crit_pages = await asyncio.gather(*(self._get_offers_for_criteria_async(allegro, crit, price_range)
+                                                for crit, parts in zip(criteria, crit_parts)
+                                                for price_range in parts))
+            items = [item for pages in crit_pages for page in pages for item in page]
+            batches = chunks(items, self._batch_size) if self._batch_size else [items]
+
+            listed_ids = []
+            known = 0
+            for batch in batches:
+                batch_ids = [item.id for item in batch]
+                existing = set(self.car_offer_dao.search_existing_ids(batch_ids))
+                known += len(existing)
+                listed_ids.extend(batch_ids)
+
+                new_items = [item for item in batch if item.id not in existing]
+                self.car_offer_dao.insert_multiple(await self._build_offers_async(allegro, new_items))
+
+        found = len(listed_ids)
+        logger.info("Found vehicles: %i, known: %i, new %i", found, known, found - known)
+
+        self._finish_listing(listed_ids)
+
+    async def _count_offers_async(self, allegro: AsyncCarscannerAllegro, crit: Criteria,
+                                  price_range: typing.Optional[PriceRange]) -> int:
+        params = self._search_params(crit, 0, allegro.get_listing.limit_min, price_range)
+        params['include'] = ['-all', 'searchMeta']
+        return (await allegro.get_listing_page(**params)).available_count
+
+    async def _plan_partitions_async(self, allegro: AsyncCarscannerAllegro, crit: Criteria) \
+            -> typing.List[typing.Optional[PriceRange]]:
+        """Like _plan_partitions, with both halves of a range counted at once"""
+        total = await self._count_offers_async(allegro, crit, None)
+        if total <= _MAX_LISTING_OFFSET:
+            return [None]
+
+        async def plan(price_range: PriceRange, count: int) -> typing.List[PriceRange]:
+            halves = price_range.split() if count > _MAX_LISTING_OFFSET else None
+            if halves is None:
+                if count > _MAX_LISTING_OFFSET:
+                    logger.warning('get_listing: cat: %s, price: %s, too many offers: %d', crit.category_id,
+                                   price_range, count)
+                return [price_range] if count or price_range.high is None else []
+            counts = await asyncio.gather(*(self._count_offers_async(allegro, crit, half) for half in halves))
+            parts = await asyncio.gather(*(plan(half, c) for half, c in zip(halves, counts)))
+            return [p for part in parts for p in part]
+
+        result = await plan(PriceRange(0, None), total)
+        logger.info('get_listing: cat: %s, %d offers in %d partitions', crit.category_id, total, len(result))
+        return result
 
-        # get non-existing ids
-        new_items = [item for item in items if item.id not in existing]
+    async def _get_offers_for_criteria_async(self, allegro: AsyncCarscannerAllegro, crit: Criteria,
+                                             price_range: typing.Optional[PriceRange] = None) \
+            -> typing.List[typing.List[ListedOffer]]:
+        limit = allegro.get_listing.limit_max
+        mark = self._get_mark(crit)
+        pages = [await allegro.get_listing_page(**self._search_params(crit, 0, limit, price_range))]
+        available_count = pages[0].available_count
+        offsets = range(limit, min(available_count, _MAX_LISTING_OFFSET), limit)
 
+        if mark is None:
+            logger.info('get_listing: cat: %s, price: %s, total %d, pages %d', crit.category_id, price_range,
+                        available_count, len(offsets) + 1)
+            pages.extend(await asyncio.gather(*(allegro.get_listing_page(**self._search_params(crit, offset, limit,
+                                                                                               price_range))
+                                                for offset in offsets)))
+        else:
+            # the next page is only needed if this one had new offers, so they can't be requested together
+            for offset in offsets:
+                if self._reached_mark(crit, mark, pages[-1], offset):
+                    break
+                pages.append(await allegro.get_listing_page(**self._search_params(crit, offset, limit,
+                                                                                   price_range)))
+
+        for data in pages:
+            self._note_newest(crit, data.regular)
+        return [data.promoted + data.regular for data in pages]
+
+    async def _build_offers_async(self, allegro: AsyncCarscannerAllegro,
+                                  new_items: typing.List[ListedOffer]) -> typing.List[CarOffer]:
+        car_offers = self.car_offers_builder.to_car_offers(new_items)
+        failures = self._get_known_failures()
+        offer_ids = [i for i in car_offers.keys() if failures.get(i, 0) < self._max_item_failures]
+
+        results = await asyncio.gather(*(self._get_items_info_async(allegro, chunk)
+                                         for chunk in chunks(offer_ids, allegro.get_items_info.items_limit)))
+        if self._build_executor:
+            batch = BuildBatch(self.timestamp, new_items, [info for chunk in results for info in chunk])
+            return await asyncio.get_event_loop().run_in_executor(self._build_executor, build_car_offers, batch)
+
+        for item_info_chunk in results:
+            for value in item_info_chunk:
+                self.car_offers_builder.update_from_item_info(car_offers[str(value.id)], value)
+
+        return [car for car in car_offers.values() if car.is_valid()]
+
+    async def _get_items_info_async(self, allegro: AsyncCarscannerAllegro, offer_ids: typing.List[str]) \
+            -> typing.List[ItemInfo]:
+        try:
+            return await allegro.get_item_infos(offer_ids, True, True, True)
+        except zeep.exceptions.TransportError as x:
+            if len(offer_ids) == 1:
+                self._item_failed(offer_ids[0], x)
+                return []
+            half = len(offer_ids) // 2
+            first, second = await asyncio.gather(self._get_items_info_async(allegro, offer_ids[:half]),
+                                                 self._get_items_info_async(allegro, offer_ids[half:]))
+            return first + second
+
+    def _add_offers(self, new_items: typing.List[ListedOffer]) -> None:
+        if self._build_executor:
+            for cars in self._build_offers_in_executor(chunks(new_items, _INSERT_BATCH)):
+                self.car_offer_dao.insert_multiple(cars)
+            return
+
+        for batch in chunks(new_items, _INSERT_BATCH):
+            self.car_offer_dao.insert_multiple(self._build_offers(batch))
+
+    def _build_offers_in_executor(self, batches: typing.Iterable[typing.List[ListedOffer]]) \
+            -> typing.Iterator[typing.List[CarOffer]]:
+        """Like _build_offers for each batch, with the offers built in the build executor, in the batch order"""
+
+        def with_details(batch: typing.List[ListedOffer]) -> BuildBatch:
+            infos = [info for chunk in self._get_items_info([item.id for item in batch]) for info in chunk]
+            return BuildBatch(self.timestamp, batch, infos)
+
+        # details are fetched here, lazily, while the workers build the batches before
+        yield from bounded_map(self._build_executor, build_car_offers, map(with_details, batches),
+                               2 * self._build_workers)
+
+    def _build_offers(self, new_items: typing.List[ListedOffer]) -> typing.List[CarOffer]:
         # pull their details
         car_offers = self.car_offers_builder.to_car_offers(new_items)
         for item_info_chunk in self._get_items_info(list(car_offers.keys())):
             for value in item_info_chunk:
-                item_id = str(value.itemInfo.itId)
-                self.car_offers_builder.update_from_item_info_struct(car_offers[item_id], value)
+                self.car_offers_builder.update_from_item_info(car_offers[str(value.id)], value)
+
+        return [car for car in car_offers.values() if car.is_valid()]
+
+    def _get_items_info(self, offer_ids: typing.List[str]) -> typing.Iterable[typing.List[ItemInfo]]:
+        """
+        Fetch item details in chunks, sized by the recent error rate and latency.
 
-        self.car_offer_dao.insert_multiple([car for car in car_offers.values() if car.is_valid()])
+        Items that failed in earlier runs are fetched one by one, so they don't break the chunks, and skipped
+        altogether after max_item_failures runs.
+        """
+        failures = self._get_known_failures()
+        regular = []
+        alone = []
+        for item_id in offer_ids:
+            item_failures = failures.get(item_id, 0)
+            if item_failures == 0:
+                regular.append(item_id)
+            elif item_failures < self._max_item_failures:
+                alone.append(item_id)
+            else:
+                logger.debug('Skipping item %s, failed in %d runs', item_id, item_failures)
 
-    def _get_items_info(self, offer_ids: typing.List[str]) -> typing.Iterable[zeep.xsd.CompoundValue]:
-        chunk_no = 1
-        from math import ceil
-        chunks_count = ceil(len(offer_ids) / self._allegro.get_items_info.items_limit)
-        for chunk in chunks(offer_ids, self._allegro.get_items_info.items_limit):
-            logger.info('get_items_info: chunk %d out of %d', chunk_no, chunks_count)
+        if len(regular) + len(alone) < len(offer_ids):
+            logger.info('get_items_info: skipping %d known bad items', len(offer_ids) - len(regular) - len(alone))
+
+        chunk_size = self._get_chunk_size()
+        pos = 0
+        while pos < len(regular):
+            chunk = regular[pos:pos + chunk_size.size]
+            pos += len(chunk)
+            logger.info('get_items_info: %d items, %d out of %d', len(chunk), pos, len(regular))
+
+            start = time.perf_counter()
             try:
-                yield self._do_get_items_info(chunk)
-            except zeep.exceptions.TransportError:
+                result = self._do_get_items_info(chunk)
+            except zeep.exceptions.TransportError as x:
                 # https://github.com/allegro/allegro-api/issues/1585
-                for item_id in chunk:
-                    try:
-                        yield self._do_get_items_info([item_id])
-                    except zeep.exceptions.TransportError as x2:
-                        logger.warning('Could not fetch item (%s) info: %s', item_id, x2)
-            chunk_no += 1
-
-    def _do_get_items_info(self, offer_ids: typing.List[str]):
-        container = self._allegro.get_items_info(offer_ids, True, True, True).arrayItemListInfo
-        return container.item if container else []
+                chunk_size.failure()
+                if len(chunk) == 1:
+                    self._item_failed(chunk[0], x)
+                else:
+                    yield from self._get_items_info_halves(chunk)
+            else:
+                chunk_size.success(time.perf_counter() - start)
+                yield result
+
+        for item_id in alone:
+            logger.info('get_items_info: known bad item %s', item_id)
+            yield from self._get_items_info_bisect([item_id])
+
+    def _get_items_info_bisect(self, offer_ids: typing.List[str]) -> typing.Iterable[typing.List[ItemInfo]]:
+        """Fetch the items, splitting the chunk in halves on failure until the bad items are isolated"""
+        try:
+            result = self._do_get_items_info(offer_ids)
+        except zeep.exceptions.TransportError as x:
+            if len(offer_ids) == 1:
+                self._item_failed(offer_ids[0], x)
+            else:
+                yield from self._get_items_info_halves(offer_ids)
+        else:
+            if len(offer_ids) == 1 and offer_ids[0] in self._get_known_failures():
+                self._failed_item_dao.remove(offer_ids[0])
+            yield result
+
+    def _get_items_info_halves(self, offer_ids: typing.List[str]) -> typing.Iterable[typing.List[ItemInfo]]:
+        half = len(offer_ids) // 2
+        yield from self._get_items_info_bisect(offer_ids[:half])
+        yield from self._get_items_info_bisect(offer_ids[half:])
+
+    def _item_failed(self, item_id: str, x: zeep.exceptions.TransportError) -> None:
+        logger.warning('Could not fetch item (%s) info: %s', item_id, x)
+        if self._failed_item_dao:
+            self._failed_item_dao.add(item_id, self.timestamp)
+
+    def _get_known_failures(self) -> typing.Dict[str, int]:
+        if self._known_failures is None:
+            self._known_failures = self._failed_item_dao.get_failures() if self._failed_item_dao else {}
+        return self._known_failures
+
+    def _get_chunk_size(self) -> AdaptiveChunkSize:
+        if self._chunk_size is None:
+            self._chunk_size = AdaptiveChunkSize(self._allegro.get_items_info.items_limit)
+        return self._chunk_size
+
+    def _do_get_items_info(self, offer_ids: typing.List[str]) -> typing.List[ItemInfo]:
+        return self._allegro.get_item_infos(offer_ids, True, True, True)
@@ -0,0 +1,134 @@
+import logging
+import queue
+import threading
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+_CLOSED = object()
+_POLL_INTERVAL = .1
+
+
+class PipelineCancelled(Exception):
+    pass
+
+
+class StageStats:
+    """Wall clock time of a pipeline stage, and how much of it the stage spent waiting on its neighbours"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.total = 0.
+        self.input_wait = 0.
+        self.output_wait = 0.
+
+    @property
+    def idle(self) -> float:
+        return self.input_wait + self.output_wait
+
+    def report(self) -> None:
+        log.info('stage %s: %.1fs total, %.1fs waiting for input, %.1fs waiting for output',
+                 self.name, self.total, self.input_wait, self.output_wait)
+
+
+class Pipe:
+    """Bounded queue connecting two pipeline stages"""
+
+    def __init__(self, maxsize: int):
+        self._q = queue.Queue(maxsize)
+        self._cancelled = threading.Event()
+
+    def put(self, item, stats: StageStats) -> None:
+        start = time.perf_counter()
+        try:
+            while True:
+                if self._cancelled.is_set():
+                    raise PipelineCancelled()
+                try:
+                    self._q.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+        finally:
+            stats.output_wait += time.perf_counter() - start
+
+    def close(self, stats: StageStats) -> None:
+        """Tell the consumer there will be no more items"""
+        self.put(_CLOSED, stats)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def get_all(self, stats: StageStats) -> typing.Iterator:
+        """Yield items until the producer closes the pipe"""
+        while True:
+            start = time.perf_counter()
+            try:
+                while True:
+                    if self._cancelled.is_set():
+                        raise PipelineCancelled()
+                    try:
+                        item = self._q.get(timeout=_POLL_INTERVAL)
+                        break
+                    except queue.Empty:
+                        pass
+            finally:
+                stats.input_wait += time.perf_counter() - start
+
+            if item is _CLOSED:
+                return
+            yield item
+
+
+class Pipeline:
+    """
+    Run stages concurrently, each in its own thread.
+
+    A stage is a function taking its StageStats. Stages talk to each other through Pipes created with pipe(). If any
+    stage fails, the pipes are cancelled, so that the other stages stop too, and run() raises the first error.
+    """
+
+    def __init__(self):
+        self._stages: typing.List[typing.Tuple[StageStats, typing.Callable[[StageStats], None]]] = []
+        self._pipes: typing.List[Pipe] = []
+        self._errors: typing.List[BaseException] = []
+
+    def pipe(self, maxsize: int) -> Pipe:
+        result = Pipe(maxsize)
+        self._pipes.append(result)
+        return result
+
+    def add_stage(self, name: str, fn: typing.Callable[[StageStats], None]) -> None:
+        self._stages.append((StageStats(name), fn))
+
+    def run(self) -> typing.List[StageStats]:
+        threads = [threading.Thread(target=self._run_stage, args=(stats, fn), name=f'pipeline-{stats.name}',
+                                    daemon=True)
+                   for stats, fn in self._stages]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        result = [stats for stats, _ in self._stages]
+        for stats in result:
+            stats.report()
+        return result
+
+    def _run_stage(self, stats: StageStats, fn: typing.Callable[[StageStats], None]) -> None:
+        start = time.perf_counter()
+        try:
+            fn(stats)
+        except PipelineCancelled:
+            log.debug('stage %s cancelled', stats.name)
+        except BaseException as x:
+            log.error('stage %s failed', stats.name, exc_info=True)
+            self._errors.append(x)
+            for p in self._pipes:
+                p.cancel()
+        finally:
+            stats.total = time.perf_counter() - start
@@ -1,7 +1,14 @@
 import datetime
+import logging
+import typing
 
 from . import BackupService, FilterService, OfferService
-from ..dao import MetadataDao
+from ..allegro import RequestScheduler
+from ..dao import CheckpointDao, MetadataDao
+from ..dao.checkpoint import STAGE_BACKUP, STAGE_FILTERS, STAGE_META, STAGE_OFFERS
+from ..utils import datetime_to_unix
+
+log = logging.getLogger(__name__)
 
 
 class VehicleUpdaterService:
@@ -11,16 +18,43 @@ class VehicleUpdaterService:
                  filter_svc: FilterService,
                  datetime_now: datetime.datetime,
                  backup_svc: BackupService,
+                 request_scheduler: RequestScheduler,
+                 checkpoint_dao: CheckpointDao,
                  ):
         self._ts = datetime_now
         self._filter_svc = filter_svc
         self._meta_dao = metadata_dao
         self._offer_svc = offers_svc
         self._backup_service = backup_svc
+        self._request_scheduler = request_scheduler
+        self._checkpoint = checkpoint_dao
 
     def update(self):
+        """
+        Run the update in stages, recording each one as done.
+
+        If an interrupted run had the same timestamp, the stages it finished are skipped, and the offers service picks
+        up the listing where it stopped.
+        """
         self._meta_dao.report()
-        self._filter_svc.load_filters()
-        self._offer_svc.get_offers()
-        self._meta_dao.update(self._ts)
-        self._backup_service.backup()
+        self._checkpoint.start(datetime_to_unix(self._ts))
+        try:
+            filters = self._checkpoint.get(STAGE_FILTERS)
+            if filters is None:
+                self._checkpoint.done(STAGE_FILTERS, self._filter_svc.load_filters())
+            else:
+                self._filter_svc.restore_filters(filters)
+
+            self._run_stage(STAGE_OFFERS, self._offer_svc.get_offers)
+        finally:
+            self._request_scheduler.report()
+        self._run_stage(STAGE_META, lambda: self._meta_dao.update(self._ts))
+        self._run_stage(STAGE_BACKUP, self._backup_service.backup)
+        self._checkpoint.finish()
+
+    def _run_stage(self, stage: str, fn: typing.Callable[[], None]) -> None:
+        if self._checkpoint.is_done(stage):
+            log.info('Stage %s done by an earlier run, skipping', stage)
+            return
+        fn()
+        self._checkpoint.done(stage)
@@ -1,9 +1,12 @@
+import collections
 import datetime
 import functools
+import itertools
 import logging
 import pathlib
 import time
 import typing
+from concurrent import futures
 
 
 def datetime_to_unix(dt: datetime.datetime) -> int:
@@ -36,6 +39,35 @@ def chunks(l, n):
         yield l[i:i + n]
 
 
+def chunks_iter(iterable: typing.Iterable, n: int) -> typing.Iterator[list]:
+    """Like chunks, but reads the input lazily, so it works with generators"""
+    it = iter(iterable)
+    while chunk := list(itertools.islice(it, n)):
+        yield chunk
+
+
+def bounded_map(executor: futures.Executor, fn: typing.Callable, iterable: typing.Iterable, window: int) \
+        -> typing.Iterator:
+    """
+    Like Executor.map, but keeps at most window calls in flight and yields the results in the input order.
+
+    Unlike Executor.map it doesn't submit the whole input upfront, so it can be used with shared executors and long
+    inputs. If a call fails or the generator is closed, the calls that haven't started are cancelled.
+    """
+    pending = collections.deque()
+    try:
+        for arg in iterable:
+            pending.append(executor.submit(fn, arg))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for f in pending:
+            f.cancel()
+
+
 def memoized(obj):
     @functools.wraps(obj)
     def memoizer(self=None):
@@ -17,3 +17,7 @@ class HerokuContext:
 
     def export_path(self, data_path: pathlib.Path) -> pathlib.Path:
         return data_path / 'export.json'
+
+    def export_artifacts_path(self, data_path: pathlib.Path) -> pathlib.Path:
+        # data_path is the clone of the backup repo, which only takes the backup data
+        return data_path.parent / f'{data_path.name}-artifacts'
@@ -0,0 +1,139 @@
+"""Local stand-in for the Allegro REST and SOAP endpoints"""
+import json
+import pathlib
+import typing
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
+
+import zeep
+from aiohttp import web
+
+WSDL_PATH = pathlib.Path(__file__).parent / 'resources' / 'webapi.wsdl'
+SOAP_PATH = '/service.php'
+
+_NS = 'https://webapi.allegro.pl/service.php'
+
+
+def soap_client() -> zeep.Client:
+    return zeep.Client(str(WSDL_PATH))
+
+
+def listing_json(ids: typing.List[str], available_count: int) -> dict:
+    return {
+        'items': {
+            'promoted': [],
+            'regular': [{'id': i, 'name': f'offer {i}', 'sellingMode': {'price': {'amount': '1000.00'}}}
+                        for i in ids],
+        },
+        'searchMeta': {'availableCount': available_count, 'totalCount': available_count},
+    }
+
+
+def item_info_xml(item_id: int) -> str:
+    return f'''<ns1:item>
+<ns1:itemInfo>
+<ns1:itId>{item_id}</ns1:itId>
+<ns1:itName>Audi A4 {item_id}</ns1:itName>
+<ns1:itLocation>Grudziądz</ns1:itLocation>
+<ns1:itState>2</ns1:itState>
+<ns1:itDescription>{escape('<p>Zadbane audi a4 avant, bezwypadkowe</p>')}</ns1:itDescription>
+</ns1:itemInfo>
+<ns1:itemCats>
+<ns1:item><ns1:catLevel>0</ns1:catLevel><ns1:catId>3</ns1:catId><ns1:catName>Motoryzacja</ns1:catName></ns1:item>
+<ns1:item><ns1:catLevel>1</ns1:catLevel><ns1:catId>4029</ns1:catId><ns1:catName>Osobowe</ns1:catName></ns1:item>
+<ns1:item><ns1:catLevel>2</ns1:catLevel><ns1:catId>4030</ns1:catId><ns1:catName>Audi</ns1:catName></ns1:item>
+<ns1:item><ns1:catLevel>3</ns1:catLevel><ns1:catId>4031</ns1:catId><ns1:catName>A4</ns1:catName></ns1:item>
+</ns1:itemCats>
+<ns1:itemImages>
+<ns1:item><ns1:imageUrl>https://img/1/{item_id}.jpg</ns1:imageUrl><ns1:imageType>1</ns1:imageType></ns1:item>
+<ns1:item><ns1:imageUrl>https://img/2/{item_id}.jpg</ns1:imageUrl><ns1:imageType>2</ns1:imageType></ns1:item>
+</ns1:itemImages>
+<ns1:itemAttribs>
+<ns1:item><ns1:attribName>Rok produkcji</ns1:attribName><ns1:attribValues><ns1:item>2010</ns1:item></ns1:attribValues></ns1:item>
+<ns1:item><ns1:attribName>Przebieg</ns1:attribName><ns1:attribValues><ns1:item>189000</ns1:item></ns1:attribValues></ns1:item>
+<ns1:item><ns1:attribName>Rodzaj paliwa</ns1:attribName><ns1:attribValues><ns1:item>Diesel</ns1:item></ns1:attribValues></ns1:item>
+<ns1:item><ns1:attribName>Pochodzenie</ns1:attribName><ns1:attribValues><ns1:item>import</ns1:item></ns1:attribValues></ns1:item>
+</ns1:itemAttribs>
+</ns1:item>'''
+
+
+def items_info_response(item_ids: typing.Iterable[int]) -> bytes:
+    items = ''.join(item_info_xml(i) for i in item_ids)
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/" xmlns:ns1="{_NS}">
+<SOAP-ENV:Body>
+<ns1:doGetItemsInfoResponse>
+<ns1:arrayItemListInfo>{items}</ns1:arrayItemListInfo>
+<ns1:arrayItemsNotFound/>
+<ns1:arrayItemsAdminKilled/>
+</ns1:doGetItemsInfoResponse>
+</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''.encode()
+
+
+def items_info(item_ids: typing.Iterable[int]):
+    """The reply to get_items_info, decoded by zeep"""
+    client = soap_client()
+    binding = client.service._binding
+    return binding.process_reply(client, binding.get('doGetItemsInfo'),
+                                 SimpleNamespace(status_code=200, headers={}, content=items_info_response(item_ids),
+                                                 encoding='utf-8'))
+
+
+def fault_response(code: str, message: str) -> bytes:
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<SOAP-ENV:Envelope xmlns:SOAP-ENV="http://schemas.xmlsoap.org/soap/envelope/">
+<SOAP-ENV:Body>
+<SOAP-ENV:Fault><faultcode>{code}</faultcode><faultstring>{message}</faultstring></SOAP-ENV:Fault>
+</SOAP-ENV:Body>
+</SOAP-ENV:Envelope>'''.encode()
+
+
+def requested_ids(body: bytes) -> typing.List[int]:
+    from lxml import etree
+    doc = etree.fromstring(body)
+    return [int(e.text) for e in doc.iter(f'{{{_NS}}}itemsIdArray') for e in e]
+
+
+class StandInAllegro:
+    """
+    Serves the listing from a dict of category id to offer ids, and item details for any requested id.
+
+    Records the requests it receives. The first throttled listing requests get a 429, the first throttled SOAP requests
+    a 503.
+    """
+
+    def __init__(self, categories: typing.Dict[str, typing.List[str]], bad_ids: typing.Iterable[int] = (),
+                 throttled: int = 0):
+        self.categories = categories
+        self.bad_ids = set(bad_ids)
+        self.throttled = throttled
+        self.listing_requests = []
+        self.soap_requests = []
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/offers/listing', self.listing)
+        app.router.add_post(SOAP_PATH, self.soap)
+        return app
+
+    async def listing(self, request: web.Request) -> web.Response:
+        self.listing_requests.append(request.query)
+        if len(self.listing_requests) <= self.throttled:
+            return web.Response(status=429)
+        if request.headers.get('Authorization') != 'Bearer token':
+            return web.json_response({'error': 'invalid_token'}, status=401)
+        ids = self.categories[request.query['category.id']]
+        offset = int(request.query.get('offset', 0))
+        limit = int(request.query.get('limit', 100))
+        return web.Response(body=json.dumps(listing_json(ids[offset:offset + limit], len(ids))),
+                            content_type='application/vnd.allegro.public.v1+json')
+
+    async def soap(self, request: web.Request) -> web.Response:
+        ids = requested_ids(await request.read())
+        self.soap_requests.append(ids)
+        if len(self.soap_requests) <= self.throttled:
+            return web.Response(status=503)
+        if self.bad_ids.intersection(ids):
+            return web.Response(status=500)
+        return web.Response(body=items_info_response(ids), content_type='text/xml')
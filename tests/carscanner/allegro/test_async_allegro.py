@@ -0,0 +1,144 @@
+import datetime
+import unittest
+from unittest.mock import Mock
+
+import allegro_api.configuration
+from aiohttp.test_utils import TestServer
+
+from carscanner.allegro import AsyncCarscannerAllegro, RequestScheduler, TokenBucket
+from carscanner.allegro.ratelimit import REST, SOAP
+from carscanner.dao import Criteria
+from carscanner.service import OfferService
+from .stand_in import SOAP_PATH, StandInAllegro, soap_client
+
+
+def async_allegro(server: TestServer, rest_token='token', max_concurrency=10,
+                  request_scheduler: RequestScheduler = None) -> AsyncCarscannerAllegro:
+    config = allegro_api.configuration.Configuration()
+    config.access_token = rest_token
+    allegro = Mock()
+    allegro.rest_client = Mock(return_value=allegro_api.ApiClient(config))
+    allegro.soap_client = Mock(return_value=soap_client())
+    allegro.soap_service().session_handle = 'session'
+
+    auth = Mock()
+    auth.refresh_token = Mock(side_effect=lambda: setattr(config, 'access_token', 'token'))
+
+    return AsyncCarscannerAllegro(allegro, auth, max_concurrency, rest_uri=str(server.make_url('')),
+                                  soap_uri=str(server.make_url(SOAP_PATH)), request_scheduler=request_scheduler)
+
+
+class TestAsyncCarscannerAllegro(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.stand_in = StandInAllegro({'1': [str(i) for i in range(250)]})
+        self.server = TestServer(self.stand_in.app())
+        await self.server.start_server()
+
+    async def asyncTearDown(self) -> None:
+        await self.server.close()
+
+    async def test_get_listing(self):
+        async with async_allegro(self.server) as allegro:
+            result = await allegro.get_listing(category_id='1', offset=200, limit=100, fallback=False,
+                                               include=['-all', 'items'], dynamic_filters={'parameter.1': '2'})
+
+        self.assertEqual(['200', '201'], [o.id for o in result.items.regular[:2]])
+        self.assertEqual(250, result.search_meta.available_count)
+        query = self.stand_in.listing_requests[0]
+        self.assertEqual(['-all', 'items'], query.getall('include'))
+        self.assertEqual('false', query['fallback'])
+        self.assertEqual('2', query['parameter.1'])
+
+    async def test_get_listing_page(self):
+        async with async_allegro(self.server) as allegro:
+            result = await allegro.get_listing_page(category_id='1', offset=240, limit=100)
+
+        self.assertEqual(['240', '241'], [o.id for o in result.regular[:2]])
+        self.assertEqual('1000.00', result.regular[0].amount)
+        self.assertEqual(250, result.available_count)
+
+    async def test_get_listing_refreshes_token(self):
+        async with async_allegro(self.server, rest_token='expired') as allegro:
+            result = await allegro.get_listing(category_id='1', limit=1)
+
+        self.assertEqual(['0'], [o.id for o in result.items.regular])
+        self.assertEqual(2, len(self.stand_in.listing_requests))
+
+    async def test_get_items_info(self):
+        async with async_allegro(self.server) as allegro:
+            result = await allegro.get_items_info(['1', '2'], True, True, True)
+
+        self.assertEqual([1, 2], [i.itemInfo.itId for i in result.arrayItemListInfo.item])
+        self.assertEqual([[1, 2]], self.stand_in.soap_requests)
+
+    async def test_get_item_infos(self):
+        async with async_allegro(self.server) as allegro:
+            result = await allegro.get_item_infos(['1', '2'], True, True, True)
+
+        self.assertEqual([1, 2], [i.id for i in result])
+        self.assertEqual('Grudziądz', result[0].location)
+
+    async def test_concurrency(self):
+        import asyncio
+        async with async_allegro(self.server, max_concurrency=5) as allegro:
+            results = await asyncio.gather(*(allegro.get_listing(category_id='1', offset=o, limit=10)
+                                             for o in range(0, 250, 10)))
+
+        self.assertEqual([str(i) for i in range(250)], [o.id for r in results for o in r.items.regular])
+
+
+class TestAsyncCarscannerAllegroScheduled(unittest.IsolatedAsyncioTestCase):
+    async def test_retry_and_pace(self):
+        stand_in = StandInAllegro({'1': [str(i) for i in range(10)]}, throttled=2)
+        sleeps = []
+
+        async def sleep(delay):
+            sleeps.append(delay)
+
+        scheduler = RequestScheduler({REST: TokenBucket(10., 1), SOAP: TokenBucket(10., 10)}, backoff=.01,
+                                     async_sleep=sleep)
+        async with TestServer(stand_in.app()) as server:
+            async with async_allegro(server, request_scheduler=scheduler) as allegro:
+                page = await allegro.get_listing_page(category_id='1', limit=5)
+                infos = await allegro.get_item_infos(['1', '2'])
+                limits = allegro.get_listing.limit_max, allegro.get_items_info.items_limit
+
+        self.assertEqual(['0', '1', '2', '3', '4'], [o.id for o in page.regular])
+        self.assertEqual([1, 2], [i.id for i in infos])
+        self.assertEqual((AsyncCarscannerAllegro.get_listing.limit_max,
+                          AsyncCarscannerAllegro.get_items_info.items_limit), limits)
+        self.assertEqual((3, 3), (len(stand_in.listing_requests), len(stand_in.soap_requests)))
+        stats = scheduler.get_stats()
+        self.assertEqual((3, 2), (stats['rest.get_listing_page'].requests, stats['rest.get_listing_page'].retries))
+        self.assertEqual((3, 2), (stats['soap.get_item_infos'].requests, stats['soap.get_item_infos'].retries))
+        # 4 backoffs, and waits for the single REST token
+        self.assertLessEqual(4, len(sleeps))
+
+
+class TestOfferServiceAsync(unittest.IsolatedAsyncioTestCase):
+    async def test_get_offers_async(self):
+        stand_in = StandInAllegro({'1': [str(i) for i in range(250)], '2': [str(i) for i in range(1000, 1030)]},
+                                  bad_ids=[13])
+        async with TestServer(stand_in.app()) as server:
+            criteria_dao = Mock()
+            criteria_dao.all = Mock(return_value=[Criteria('1', 'cat 1'), Criteria('2', 'cat 2')])
+            filter_svc = Mock()
+            filter_svc.transform_filters = Mock(return_value={})
+            builder = Mock()
+            builder.to_car_offers = lambda offers: {o.id: Mock(id=o.id) for o in offers}
+            car_offer_dao = Mock()
+            car_offer_dao.search_existing_ids = Mock(return_value=['0'])
+            failed_item_dao = Mock()
+            failed_item_dao.get_failures = Mock(return_value={})
+            svc = OfferService(Mock(), criteria_dao, builder, car_offer_dao, filter_svc, datetime.datetime.utcnow(),
+                               Mock(), failed_item_dao=failed_item_dao)
+
+            await svc.get_offers_async(async_allegro(server))
+
+        inserted = [o.id for o in car_offer_dao.insert_multiple.call_args.args[0]]
+        self.assertEqual(279, len(inserted))
+        self.assertNotIn('0', inserted)
+        self.assertEqual(280, len(car_offer_dao.update_status.call_args.args[0]))
+        failed_item_dao.add.assert_called_once_with('13', svc.timestamp)
+        # a count of each category, 3 pages of category 1 and one of category 2
+        self.assertEqual(6, len(stand_in.listing_requests))
@@ -0,0 +1,72 @@
+import decimal
+import pathlib
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock
+
+import zeep.helpers
+from allegro_api.models import ListingOffer, ListingResponse, ListingResponseOffers, ListingResponseSearchMeta, \
+    OfferPrice, OfferSellingMode
+
+from carscanner.allegro import CarscannerAllegro, CassetteWriter, RecordingAllegro, ReplayAllegro
+from .stand_in import items_info
+
+
+def listing(ids) -> ListingResponse:
+    return ListingResponse(
+        items=ListingResponseOffers(promoted=[], regular=[
+            ListingOffer(id=i, name=f'offer {i}',
+                         selling_mode=OfferSellingMode(price=OfferPrice(amount='1000.00', currency='PLN')))
+            for i in ids]),
+        search_meta=ListingResponseSearchMeta(available_count=100, total_count=100),
+    )
+
+
+class TestCassette(TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self._dir.name) / 'cassette.jsonl.gz'
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def test_record_replay(self):
+        allegro = Mock()
+        allegro.rest_service().get_listing = Mock(side_effect=[listing(['1', '2']), listing(['3'])])
+        allegro.rest_service().get_listing.limit_max = 100
+        allegro.soap_service().get_items_info = Mock(return_value=items_info([1, 2]))
+
+        writer = CassetteWriter(self.path)
+        recording = CarscannerAllegro(RecordingAllegro(allegro, writer))
+        recorded_listing = [recording.get_listing(category_id='1', offset=o) for o in (0, 100)]
+        recorded_info = recording.get_items_info(['1', '2'], True, True, True)
+        writer.close()
+
+        replay = CarscannerAllegro(ReplayAllegro(self.path))
+
+        self.assertEqual(100, replay.get_listing.limit_max)
+        self.assertEqual(10, replay.get_items_info.items_limit)
+        self.assertEqual(recorded_listing[1], replay.get_listing(offset=100, category_id='1'))
+        self.assertEqual(recorded_listing[0], replay.get_listing(category_id='1', offset=0))
+        info = replay.get_items_info(['1', '2'], True, True, True)
+        self.assertEqual(zeep.helpers.serialize_object(recorded_info, dict)['arrayItemListInfo']['item'][1]['itemInfo'],
+                         vars(info.arrayItemListInfo.item[1].itemInfo))
+        self.assertEqual('Rok produkcji', info.arrayItemListInfo.item[0].itemAttribs.item[0].attribName)
+        self.assertRaises(LookupError, replay.get_items_info, ['3'], True, True, True)
+
+    def test_repeated_calls(self):
+        allegro = Mock()
+        allegro.rest_service().get_listing = Mock(side_effect=[listing(['1']), listing(['2'])])
+
+        writer = CassetteWriter(self.path)
+        recording = RecordingAllegro(allegro, writer).rest_service()
+        recording.get_listing(category_id='1')
+        recording.get_listing(category_id='1')
+        writer.close()
+
+        replay = ReplayAllegro(self.path).rest_service()
+        self.assertEqual(['1', '2', '2'], [replay.get_listing(category_id='1').items.regular[0].id for _ in range(3)])
+
+    def test_decimal(self):
+        from carscanner.allegro.cassette import _decode_soap, _encode_soap
+        self.assertEqual(decimal.Decimal('1.10'), _decode_soap(_encode_soap(decimal.Decimal('1.10'))))
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import Mock
+
+import zeep.exceptions
+
+from carscanner.allegro import CarscannerAllegro, ItemInfo, parse_items_info
+from .stand_in import fault_response, items_info, items_info_response, soap_client
+
+
+def as_dict(info: ItemInfo) -> dict:
+    return {k: getattr(info, k) for k in ItemInfo.__slots__}
+
+
+class TestParseItemsInfo(TestCase):
+    def test_same_as_zeep(self):
+        expected = [as_dict(ItemInfo.from_struct(i)) for i in items_info([1, 2]).arrayItemListInfo.item]
+
+        result = parse_items_info(items_info_response([1, 2]))
+
+        self.assertEqual(expected, [as_dict(i) for i in result])
+        self.assertEqual(1, result[0].id)
+        self.assertEqual(['Motoryzacja', 'Osobowe', 'Audi', 'A4'], result[0].cats)
+        self.assertEqual(['189000'], result[0].attribs['Przebieg'])
+        self.assertEqual('https://img/2/1.jpg', result[0].images[2])
+
+    def test_empty(self):
+        self.assertEqual([], parse_items_info(items_info_response([])))
+
+    def test_fault(self):
+        with self.assertRaises(zeep.exceptions.Fault) as cm:
+            parse_items_info(fault_response('ERR_NO_SESSION', 'Session expired'), 500)
+        self.assertEqual('ERR_NO_SESSION', cm.exception.code)
+
+    def test_not_xml(self):
+        with self.assertRaises(zeep.exceptions.TransportError) as cm:
+            parse_items_info(b'Internal Server Error', 500)
+        self.assertEqual(500, cm.exception.status_code)
+
+        self.assertRaises(zeep.exceptions.TransportError, parse_items_info, b'', 500)
+
+
+class TestCarscannerAllegroItemInfos(TestCase):
+    def test_zeep(self):
+        allegro = Mock()
+        allegro.soap_service().get_items_info = Mock(return_value=items_info([1, 2]))
+
+        result = CarscannerAllegro(allegro).get_item_infos(['1', '2'], True, True, True)
+
+        self.assertEqual([1, 2], [i.id for i in result])
+
+    def test_lean_renews_session(self):
+        allegro = Mock()
+        allegro.soap_client = Mock(return_value=soap_client())
+        soap = allegro.soap_service()
+        soap.get_items_info = Mock(side_effect=[
+            SimpleNamespace(status_code=500, content=fault_response('ERR_NO_SESSION', 'Session expired')),
+            SimpleNamespace(status_code=200, content=items_info_response([1, 2])),
+        ])
+
+        result = CarscannerAllegro(allegro, lean_items_info=True).get_item_infos(['1', '2'], True, True, True)
+
+        self.assertEqual([1, 2], [i.id for i in result])
+        self.assertEqual(2, soap.get_items_info.call_count)
+        self.assertIsNone(soap.session_handle)
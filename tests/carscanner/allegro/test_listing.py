@@ -0,0 +1,43 @@
+import json
+from unittest import TestCase
+from unittest.mock import Mock
+
+import allegro_api
+
+from carscanner.allegro import CarscannerAllegro, ListingPage, parse_listing
+from .stand_in import listing_json
+
+
+def as_tuples(page: ListingPage):
+    return ([(o.id, o.name, o.amount, o.currency) for o in page.promoted + page.regular], page.available_count,
+            page.total_count)
+
+
+class TestParseListing(TestCase):
+    def test_same_as_models(self):
+        content = json.dumps(listing_json(['1', '2'], 120))
+        response = allegro_api.ApiClient().deserialize(Mock(data=content), 'ListingResponse')
+
+        result = parse_listing(content.encode())
+
+        self.assertEqual(as_tuples(ListingPage.from_response(response)), as_tuples(result))
+        self.assertEqual(['1', '2'], [o.id for o in result.regular])
+        self.assertEqual('1000.00', result.regular[0].amount)
+        self.assertEqual(120, result.available_count)
+
+    def test_search_meta_only(self):
+        result = parse_listing(b'{"searchMeta": {"availableCount": 7, "totalCount": 9}}')
+
+        self.assertEqual(([], 7, 9), as_tuples(result))
+
+
+class TestCarscannerAllegroListingPage(TestCase):
+    def test_lean(self):
+        allegro = Mock()
+        get_listing = allegro.rest_service().get_listing
+        get_listing.return_value = Mock(data=json.dumps(listing_json(['1'], 1)).encode())
+
+        result = CarscannerAllegro(allegro, lean_listing=True).get_listing_page(category_id='1', offset=0)
+
+        self.assertEqual(['1'], [o.id for o in result.regular])
+        get_listing.assert_called_once_with(category_id='1', offset=0, _preload_content=False)
@@ -0,0 +1,103 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+import zeep.exceptions
+from allegro_api.rest import ApiException
+
+from carscanner.allegro import CarscannerAllegro, RequestScheduler, TokenBucket
+from carscanner.allegro.ratelimit import REST, SOAP
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def scheduler(rate=10., burst=2, max_retries=3):
+    sleeps = []
+    clock = FakeClock()
+    result = RequestScheduler({REST: TokenBucket(rate, burst, clock), SOAP: TokenBucket(rate, burst, clock)},
+                              max_retries=max_retries, sleep=sleeps.append)
+    return result, sleeps, clock
+
+
+class TestTokenBucket(TestCase):
+    def test_reserve(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10., 2, clock)
+
+        self.assertEqual([0., 0., .1, .2], [round(bucket.reserve(), 3) for _ in range(4)])
+        clock.now = 1.
+        # refilled up to the burst size only
+        self.assertEqual([0., 0., .1], [round(bucket.reserve(), 3) for _ in range(3)])
+
+
+class TestRequestScheduler(TestCase):
+    def test_retry_throttled(self):
+        sched, sleeps, _ = scheduler(burst=10)
+        fn = Mock(side_effect=[ApiException(status=429), zeep.exceptions.TransportError(status_code=503), 'ok'])
+
+        self.assertEqual('ok', sched.wrap(REST, 'fn', fn)(1, a=2))
+
+        self.assertEqual(3, fn.call_count)
+        fn.assert_called_with(1, a=2)
+        self.assertEqual(2, len(sleeps))
+        self.assertTrue(0 <= sleeps[0] <= 1. and 0 <= sleeps[1] <= 2., sleeps)
+        stats = sched.get_stats()['rest.fn']
+        self.assertEqual((3, 2, 2), (stats.requests, stats.errors, stats.retries))
+
+    def test_retry_after(self):
+        sched, sleeps, _ = scheduler(burst=10)
+        throttled = ApiException(status=429)
+        throttled.headers = {'Retry-After': '7'}
+
+        sched.wrap(REST, 'fn', Mock(side_effect=[throttled, 'ok']))()
+
+        self.assertEqual([7.], sleeps)
+
+    def test_no_retry(self):
+        sched, sleeps, _ = scheduler(burst=10)
+        fn = Mock(side_effect=zeep.exceptions.TransportError(status_code=500))
+
+        self.assertRaises(zeep.exceptions.TransportError, sched.wrap(SOAP, 'fn', fn))
+
+        fn.assert_called_once()
+        self.assertEqual([], sleeps)
+
+    def test_give_up(self):
+        sched, sleeps, _ = scheduler(burst=10, max_retries=2)
+        fn = Mock(side_effect=ApiException(status=429))
+
+        self.assertRaises(ApiException, sched.wrap(REST, 'fn', fn))
+
+        self.assertEqual(3, fn.call_count)
+
+    def test_pace(self):
+        sched, sleeps, _ = scheduler(rate=10., burst=1)
+        fn = sched.wrap(REST, 'fn', Mock(return_value='ok'))
+
+        for _ in range(3):
+            fn()
+
+        self.assertEqual([.1, .2], [round(s, 3) for s in sleeps])
+        self.assertAlmostEqual(.3, sched.get_stats()['rest.fn'].wait)
+
+
+class TestCarscannerAllegroScheduled(TestCase):
+    def test_wrapped(self):
+        allegro = Mock()
+        rest_service = Mock()
+        rest_service.get_listing = Mock(return_value='listing')
+        rest_service.get_listing.limit_max = 100
+        allegro.rest_service = Mock(return_value=rest_service)
+        sched, _, _ = scheduler()
+
+        t = CarscannerAllegro(allegro, sched)
+
+        self.assertEqual('listing', t.get_listing(category_id='1'))
+        self.assertEqual(100, t.get_listing.limit_max)
+        rest_service.get_listing.assert_called_once_with(category_id='1')
+        self.assertEqual(['rest.get_listing'], list(sched.get_stats()))
@@ -5,7 +5,8 @@ from unittest import TestCase
 import bson
 
 from carscanner.dao import CarOffer
-from carscanner.dao.car_offer import _K_PRICE, _K_FIRST_SPOTTED, _K_ACTIVE
+from carscanner.dao.car_offer import _K_PRICE, _K_FIRST_SPOTTED, _K_ACTIVE, _K_LISTED, VEHICLE_TYPE_REGISTRY, \
+    _decimal128_to_decimal
 
 
 class TestCarOffer(TestCase):
@@ -28,3 +29,19 @@ class TestCarOffer(TestCase):
         self.assertEqual(ts, o.first_spotted)
         self.assertEqual(decimal.Decimal(2), o.price)
         self.assertIsNone(o.active)
+
+    def test_from_dict_decoded(self):
+        ts = datetime.datetime.fromtimestamp(0, datetime.timezone.utc)
+        a = CarOffer(ts, id='1', price=decimal.Decimal('25000.50'), make='Skoda', mileage=1000, year=2010)
+        data = bson.encode(dict(a.to_dict(), **{_K_LISTED: ts}))
+        options = bson.CodecOptions(tz_aware=True, type_registry=VEHICLE_TYPE_REGISTRY)
+
+        self.assertEqual(a, CarOffer.from_dict(bson.decode(data, options)))
+        self.assertEqual(a, CarOffer.from_dict(bson.decode(data, bson.CodecOptions(tz_aware=True))))
+
+    def test_decimal128_to_decimal(self):
+        for value in ['25000.00', '0', '-0', '-1.5', '1E+3', '0.000', '9' * 34, '-1E-6176', '1.5E+6111', 'NaN',
+                      '-Infinity']:
+            with self.subTest(value):
+                d128 = bson.Decimal128(value)
+                self.assertEqual(str(d128.to_decimal()), str(_decimal128_to_decimal(d128)))
@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from tinydb import TinyDB
+from tinydb.storages import MemoryStorage
+
+from carscanner.dao import CarMakeModelDao, VoivodeshipDao
+
+
+class TestCarMakeModelDao(TestCase):
+    def setUp(self) -> None:
+        self.db = TinyDB(storage=MemoryStorage)
+
+    def tearDown(self) -> None:
+        self.db.close()
+
+    def test_get_models_by_make(self):
+        dao = CarMakeModelDao(self.db)
+        dao.insert({'make': 'skoda', 'models': ['fabia', 'octavia']})
+
+        self.assertEqual(['fabia', 'octavia'], dao.get_models_by_make('Skoda'))
+        self.assertEqual([], dao.get_models_by_make('tatra'))
+
+    def test_write_invalidates(self):
+        dao = CarMakeModelDao(self.db)
+        dao.insert({'make': 'skoda', 'models': ['fabia']})
+        self.assertEqual([], dao.get_models_by_make('tatra'))
+
+        dao.insert({'make': 'tatra', 'models': ['603']})
+        self.assertEqual(['603'], dao.get_models_by_make('tatra'))
+
+        dao.purge()
+        self.assertEqual([], dao.get_models_by_make('skoda'))
+
+
+class TestVoivodeshipDao(TestCase):
+    def test_get_name_by_id(self):
+        db = TinyDB(storage=MemoryStorage)
+        dao = VoivodeshipDao(db)
+        dao.insert_multiple([{'id': 1, 'name': 'dolnośląskie'}])
+        self.assertEqual('dolnośląskie', dao.get_name_by_id(1))
+
+        dao.insert_multiple([{'id': 2, 'name': 'kujawsko-pomorskie'}])
+        self.assertEqual('kujawsko-pomorskie', dao.get_name_by_id(2))
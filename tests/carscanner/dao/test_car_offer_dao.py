@@ -1,10 +1,15 @@
 import datetime
+import decimal
+import pathlib
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 
 from mongomock import MongoClient, Collection
 
-from carscanner.dao import CarOfferDao
-from carscanner.dao.car_offer import _K_ACTIVE, _K_FIRST_SPOTTED, _K_ID, _K_LAST_SPOTTED
+from carscanner.dao import CarOffer, CarOfferDao, KnownIdCache
+from carscanner.dao.car_offer import EXPORT_FIELDS, ID_FIELDS, _K_ACTIVE, _K_FIRST_SPOTTED, _K_ID, _K_LAST_SPOTTED, \
+    _K_LISTED
 
 
 class TestCarOfferDao(TestCase):
@@ -16,6 +21,20 @@ class TestCarOfferDao(TestCase):
         dao = CarOfferDao(self._db().vehicle)
         dao.all()
 
+    def test_search_fields(self):
+        ts = datetime.datetime(2020, 4, 2)
+        dao = CarOfferDao(self._db().vehicle)
+        offer = CarOffer(ts, id='1', price=decimal.Decimal('1000'), make='Skoda', mileage=1000, year=2010,
+                         location='Warszawa', last_spotted=ts)
+        dao.insert_multiple([offer])
+
+        self.assertEqual([offer], dao.search_by_year_between_and_mileage_lt(2000, 2020, 2000))
+        self.assertEqual([CarOffer(None, id='1', price=decimal.Decimal('1000'), make='Skoda', mileage=1000, year=2010,
+                                   location='Warszawa', active=None)],
+                         dao.search_by_year_between_and_mileage_lt(2000, 2020, 2000, EXPORT_FIELDS))
+        self.assertEqual([offer], list(dao.all()))
+        self.assertEqual([CarOffer(None, id='1', active=None)], list(dao.all(ID_FIELDS)))
+
     def test_update_status_in_list_not_active(self):
         ts = datetime.datetime.utcnow().replace(microsecond=0)
         db = self._db()
@@ -95,5 +114,84 @@ class TestCarOfferDao(TestCase):
         found = vehicle_col.find_one({_K_ID: '0'})
         self.assertEqual(doc, found)
 
+    def test_run_tag_sweep(self):
+        before = datetime.datetime(2020, 4, 1)
+        ts = datetime.datetime(2020, 4, 2)
+        vehicle_col: Collection = self._db().vehicle
+        vehicle_col.insert_many([
+            {'_id': {'id': '0'}, _K_ACTIVE: False, _K_LISTED: before},
+            {'_id': {'id': '1'}, _K_ACTIVE: True, _K_LISTED: before},
+            {'_id': {'id': '2'}, _K_ACTIVE: True},
+            {'_id': {'id': '3'}, _K_ACTIVE: False},
+        ])
+        dao = CarOfferDao(vehicle_col)
+        dao.insert_multiple([CarOffer(ts, id='4', price=decimal.Decimal('1000'))])
+
+        with patch('carscanner.dao.car_offer._LISTED_CHUNK', 1):
+            dao.mark_listed(iter(['0', '2']), ts)
+        deactivated = dao.deactivate_unlisted(ts)
+
+        docs = {d['_id']['id']: d for d in vehicle_col.find()}
+        self.assertEqual({'0': True, '1': False, '2': True, '3': False, '4': True},
+                         {i: d[_K_ACTIVE] for i, d in docs.items()})
+        self.assertEqual(1, deactivated)
+        self.assertEqual(ts, docs['1'][_K_LAST_SPOTTED])
+        self.assertNotIn(_K_LAST_SPOTTED, docs['3'])
+        self.assertEqual(ts, docs['4'][_K_LISTED])
+        self.assertEqual('4', CarOffer.from_dict(docs['4']).id)
+
+    def test_insert_multiple_duplicates(self):
+        ts = datetime.datetime(2020, 4, 2)
+        vehicle_col: Collection = self._db().vehicle
+        vehicle_col.insert_one({'_id': {'provider': 'allegro', 'id': '1'}, _K_ACTIVE: False})
+        dao = CarOfferDao(vehicle_col, insert_chunk=2)
+
+        stats = dao.insert_multiple(CarOffer(ts, id=str(i), price=decimal.Decimal('1000')) for i in range(5))
+
+        self.assertEqual([(2, 1, 1), (2, 2, 0), (1, 1, 0)], [s[:3] for s in stats])
+        self.assertEqual(5, vehicle_col.count_documents({}))
+        self.assertFalse(vehicle_col.find_one({_K_ID: '1'})[_K_ACTIVE])
+
+    def test_insert_multiple_upsert(self):
+        ts = datetime.datetime(2020, 4, 2)
+        vehicle_col: Collection = self._db().vehicle
+        vehicle_col.insert_one({'_id': {'provider': 'allegro', 'id': '1'}, _K_ACTIVE: False})
+        dao = CarOfferDao(vehicle_col, upsert=True)
+
+        stats = dao.insert_multiple(iter([CarOffer(ts, id=str(i), price=decimal.Decimal('1000')) for i in range(3)]))
+
+        self.assertEqual([(3, 2, 1)], [s[:3] for s in stats])
+        self.assertFalse(vehicle_col.find_one({_K_ID: '1'})[_K_ACTIVE])
+        doc = vehicle_col.find_one({_K_ID: '2'})
+        self.assertEqual(ts, doc[_K_LISTED])
+        self.assertEqual(CarOffer(ts, id='2', price=decimal.Decimal('1000')), CarOffer.from_dict(doc))
+
+    def test_search_existing_ids_known_id_cache(self):
+        ts = datetime.datetime(2020, 4, 2)
+        vehicle_col: Collection = self._db().vehicle
+        vehicle_col.insert_many([{'_id': {'id': str(i)}, _K_ACTIVE: True} for i in range(3)])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / 'vehicle.ids'
+            dao = CarOfferDao(vehicle_col, KnownIdCache(path))
+            self.assertEqual(['0', '1'], sorted(dao.search_existing_ids(['0', '1', '5'])))
+            dao.insert_multiple([CarOffer(ts, id='5', price=decimal.Decimal('1000'))])
+            dao._known_ids.save()
+
+            cache = KnownIdCache(path)
+            dao = CarOfferDao(vehicle_col, cache)
+            with patch.object(dao, '_search_ids', wraps=dao._search_ids) as search_ids:
+                self.assertEqual(['0', '5', '2'], dao.search_existing_ids(['0', '5', '2', '6']))
+            search_ids.assert_called_once_with({_K_ID: {'$in': ['2', '6']}})
+            self.assertIn('2', cache)
+
+    def test_search_existing_ids_stale_known_id_cache(self):
+        vehicle_col: Collection = self._db().vehicle
+        vehicle_col.insert_one({'_id': {'id': '0'}, _K_ACTIVE: True})
+        cache = KnownIdCache(None)
+        cache.add(['0', '1'])
+        dao = CarOfferDao(vehicle_col, cache)
+        self.assertEqual(['0'], dao.search_existing_ids(['0', '1']))
+        self.assertNotIn('1', cache)
+
     def _db(self):
         return MongoClient('mongodb://fakehost/mockdb').get_database()
@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+import mongomock
+
+from carscanner.dao import CheckpointDao
+from carscanner.dao.checkpoint import STAGE_FILTERS, listing_stage
+
+
+class TestCheckpointDao(TestCase):
+    def test_stages(self):
+        dao = CheckpointDao(self._db().checkpoint)
+        dao.start(100)
+
+        dao.done(STAGE_FILTERS, [{'id': 'price'}])
+        dao.done(listing_stage('1'))
+
+        self.assertEqual(100, dao.get_run_timestamp())
+        self.assertEqual([{'id': 'price'}], dao.get(STAGE_FILTERS))
+        self.assertTrue(dao.is_done(listing_stage('1')))
+        self.assertFalse(dao.is_done(listing_stage('2')))
+        self.assertIsNone(dao.get(listing_stage('2')))
+
+    def test_start(self):
+        dao = CheckpointDao(self._db().checkpoint)
+        dao.start(100)
+        dao.done(STAGE_FILTERS)
+
+        dao.start(100)
+        self.assertTrue(dao.is_done(STAGE_FILTERS))
+
+        dao.start(200)
+        self.assertEqual(200, dao.get_run_timestamp())
+        self.assertFalse(dao.is_done(STAGE_FILTERS))
+
+    def test_finish(self):
+        dao = CheckpointDao(self._db().checkpoint)
+        dao.start(100)
+        dao.done(STAGE_FILTERS)
+
+        dao.finish()
+
+        self.assertIsNone(dao.get_run_timestamp())
+        self.assertFalse(dao.is_done(STAGE_FILTERS))
+
+    def _db(self) -> mongomock.Database:
+        return mongomock.MongoClient('mongodb://fakehost/mockdb').get_database()
@@ -0,0 +1,29 @@
+import datetime
+from unittest import TestCase
+
+import mongomock
+
+from carscanner.dao import FailedItemDao
+
+
+class TestFailedItemDao(TestCase):
+    def test_add(self):
+        ts = datetime.datetime.utcnow().replace(microsecond=0)
+        dao = FailedItemDao(self._db().failed_item)
+
+        dao.add('1', ts)
+        dao.add('1', ts)
+        dao.add('2', ts)
+
+        self.assertEqual({'1': 2, '2': 1}, dao.get_failures())
+
+    def test_remove(self):
+        dao = FailedItemDao(self._db().failed_item)
+        dao.add('1', datetime.datetime.utcnow())
+
+        dao.remove('1')
+
+        self.assertEqual({}, dao.get_failures())
+
+    def _db(self) -> mongomock.Database:
+        return mongomock.MongoClient('mongodb://fakehost/mockdb').get_database()
@@ -96,3 +96,41 @@ class TestFilterDao(TestCase):
             result = dao.names_to_keys('1', 'cena')
 
         self.assertRaises(NotImplementedError, names_to_keys)
+
+    def test_range_to_keys(self):
+        dao = FilterDao(self.db)
+        dao.insert({
+            "category_id": '1',
+            "id": "price",
+            "type": "NUMERIC",
+            "name": "cena",
+            "values": [
+                {"idSuffix": ".from", "name": "od", "selected": False},
+                {"idSuffix": ".to", "name": "do", "selected": False},
+            ],
+        })
+
+        self.assertEqual({'price.from': '1000', 'price.to': '1999.99'},
+                         dao.range_to_keys('1', 'cena', 1000, '1999.99'))
+        self.assertEqual({'price.from': '1000'}, dao.range_to_keys('1', 'cena', 1000, None))
+
+    def test_get_after_insert(self):
+        dao = FilterDao(self.db)
+        dao.insert({"category_id": '1', "id": "price", "type": "NUMERIC", "name": "cena", "values": []})
+        self.assertIsNone(dao.get('1', 'stan'))
+
+        dao.insert({"category_id": '1', "id": "state", "type": "SINGLE", "name": "stan",
+                    "values": [{"value": "new", "name": "nowe"}]})
+        self.assertEqual(('state', 'new'), dao.names_to_keys('1', 'stan', 'nowe'))
+
+    def test_get_by_category(self):
+        dao = FilterDao(self.db)
+        dao.insert_multiple([
+            {"category_id": '1', "id": "a", "type": "SINGLE", "name": "stan", "values": []},
+            {"category_id": '2', "id": "b", "type": "SINGLE", "name": "stan", "values": []},
+            {"id": "c", "type": "SINGLE", "name": "kolor", "values": []},
+        ])
+
+        self.assertEqual('b', dao.get('2', 'stan')['id'])
+        self.assertIsNone(dao.get('3', 'stan'))
+        self.assertEqual('c', dao.get('3', 'kolor')['id'])
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+import pymongo.errors
+from mongomock import MongoClient
+
+from carscanner.dao.indexes import CollectionScanException, IndexManager, IndexSpec, QueryShape
+
+
+class TestIndexManager(TestCase):
+    def test_ensure_indexes(self):
+        db = self._db()
+        manager = IndexManager(db)
+        manager.ensure_indexes()
+        manager.ensure_indexes()
+
+        info = db.vehicle.index_information()
+        self.assertEqual([('_id.id', 1), ('active', 1)], info['id_active']['key'])
+        self.assertEqual([('active', 1), ('_id.id', 1), ('year', 1), ('mileage', 1)],
+                         info['active_id_year_mileage']['key'])
+
+    def test_ensure_indexes_conflict(self):
+        db = self._db()
+        db.vehicle.create_index([('year', 1)], name='id_active')
+        with self.assertRaises(pymongo.errors.OperationFailure):
+            IndexManager(db).ensure_indexes()
+
+    def test_check_plans(self):
+        db = Mock()
+        db.get_collection.return_value.find.return_value.explain.side_effect = [
+            {'queryPlanner': {'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN', 'indexName': 'a'}}}},
+            {'queryPlanner': {'winningPlan': {'queryPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}}},
+        ]
+        manager = IndexManager(db, {}, {'vehicle': [QueryShape('indexed', {'a': 1}), QueryShape('scan', {'b': 1})]})
+
+        with self.assertRaisesRegex(CollectionScanException, 'vehicle.scan$'):
+            manager.check_plans()
+
+    def test_ensure_indexes_other_keys(self):
+        db = Mock()
+        col = db.get_collection.return_value
+        col.index_information.return_value = {'a': {'key': [('b', 1.0)]}}
+        manager = IndexManager(db, {'vehicle': [IndexSpec('a', [('a', 1)])]}, {})
+
+        with self.assertRaises(ValueError):
+            manager.ensure_indexes()
+
+    def _db(self):
+        return MongoClient('mongodb://fakehost/mockdb').get_database()
@@ -0,0 +1,31 @@
+import pathlib
+import tempfile
+from unittest import TestCase
+
+from carscanner.dao import KnownIdCache
+
+
+class TestKnownIdCache(TestCase):
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / 'vehicle.ids'
+            cache = KnownIdCache(path)
+            cache.add(['30', '10', 'x'])
+            cache.save()
+            cache.add(['20', '10'])
+            cache.save()
+
+            cache = KnownIdCache(path)
+            self.assertEqual(3, len(cache))
+            self.assertEqual((['10', '20', '30'], ['15', 'x']), cache.split(['10', '15', '20', '30', 'x']))
+            self.assertEqual(24, path.stat().st_size)
+
+            cache.clear()
+            self.assertFalse(path.exists())
+            self.assertNotIn('10', cache)
+
+    def test_malformed_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = pathlib.Path(tmp) / 'vehicle.ids'
+            path.write_bytes(b'abc')
+            self.assertEqual(0, len(KnownIdCache(path)))
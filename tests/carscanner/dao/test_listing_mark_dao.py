@@ -0,0 +1,30 @@
+import datetime
+from unittest import TestCase
+
+import mongomock
+
+from carscanner.dao import ListingMarkDao
+
+
+class TestListingMarkDao(TestCase):
+    def test_update_marks(self):
+        ts = datetime.datetime.utcnow().replace(microsecond=0)
+        dao = ListingMarkDao(self._db().listing_mark)
+
+        dao.update_marks({'1': 10, '2': 20}, ts)
+        dao.update_marks({'1': 15, '2': 5}, ts)
+
+        self.assertEqual({'1': 15, '2': 20}, dao.get_marks())
+
+    def test_full_sweep(self):
+        ts = datetime.datetime.utcnow().replace(microsecond=0)
+        dao = ListingMarkDao(self._db().listing_mark)
+        self.assertIsNone(dao.get_last_full_sweep())
+
+        dao.set_last_full_sweep(ts)
+
+        self.assertEqual(ts, dao.get_last_full_sweep())
+        self.assertEqual({}, dao.get_marks())
+
+    def _db(self) -> mongomock.Database:
+        return mongomock.MongoClient('mongodb://fakehost/mockdb').get_database()
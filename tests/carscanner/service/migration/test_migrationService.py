@@ -1,6 +1,6 @@
 from datetime import datetime
 from unittest import TestCase
-from unittest.mock import Mock, PropertyMock
+from unittest.mock import Mock, PropertyMock, patch
 
 from bson import Decimal128
 from mongomock import MongoClient, Collection, Database
@@ -56,6 +56,8 @@ class TestMigrationService(TestCase):
         svc.check_migrate()
 
         self.assertEqual(META_VER, meta_col.find_one({})['version'])
+        self.assertIn('id_active', vehicle_col.index_information())
+        self.assertIn('version', meta_col.index_information())
 
         self.assertIs(1, vehicle_col.count_documents({}))
         vehicle_raw = vehicle_col.find_one({})
@@ -91,9 +93,12 @@ class TestMigrationService(TestCase):
         svc = MigrationService(
             db,
         )
-        svc.check_migrate()
+        with patch('carscanner.service.migration.IndexManager') as index_manager:
+            svc.check_migrate()
 
         db.vehicle.assert_not_called()
+        index_manager.return_value.ensure_indexes.assert_called_once_with()
+        index_manager.return_value.check_plans.assert_not_called()
 
     def _db(self) -> Database:
         return MongoClient('mongodb://fakehost/mockdb').get_database()
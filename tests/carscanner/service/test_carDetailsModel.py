@@ -7,7 +7,7 @@ from carscanner.utils import now
 
 
 class TestCarDetailsModel(TestCase):
-    def test_update(self):
+    def test_row(self):
         ts = now()
         o = CarOffer(ts, ts)
         o.id = 1
@@ -23,13 +23,9 @@ class TestCarDetailsModel(TestCase):
         o.url = 'offer url'
         o.imported = True
 
-        model = CarDetailsModel()
+        export = CarDetailsModel.row(o)
 
-        model.update(o)
-
-        export = model.model()
-
-        expected = [{
+        expected = {
             'image': 'image url',
             'link': 'offer url',
             'location': 'voivodeship, location',
@@ -40,6 +36,6 @@ class TestCarDetailsModel(TestCase):
             'price': 42,
             'year': 2000,
             'imported': True
-        }]
+        }
 
         self.assertEqual(expected, export)
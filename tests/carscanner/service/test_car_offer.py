@@ -61,7 +61,6 @@ class TestWebCarOffer(TestCase):
 
             ts = datetime.datetime.utcnow()
             car_offer = CarOffer(ts)
-            attribs = {a.attribName: a.attribValues.item for a in car_item_info.itemAttribs.item}
-            _update_from_item_info_attributes(car_offer, attribs)
+            _update_from_item_info_attributes(car_offer, car_item_info.attribs)
 
             pprint(car_offer)
@@ -0,0 +1,120 @@
+import datetime
+import decimal
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock
+
+from mongomock import MongoClient
+
+from carscanner.dao import CarOffer, CarOfferDao
+from carscanner.service import ExportService
+from carscanner.service.export import write_columnar_export, write_export
+
+
+def _rows_from_columns(data: dict) -> dict:
+    """What the UI does with a columnar export"""
+    columns = {name: data[name] for name in ('image', 'link', 'name', 'price', 'year', 'mileage', 'imported')}
+    for name in ('make', 'model', 'location'):
+        columns[name] = [data[name]['values'][code] for code in data[name]['codes']]
+    details = [{name: column[i] for name, column in columns.items()} for i in range(data['count'])]
+    now_year = data['min_year'] + data['max_age']
+    return {'data': {
+        'series': [{'x': now_year - car['year'], 'y': car['mileage']} for car in details],
+        'car_details': details,
+        'avg_series': data['avg_series'],
+        'timestamp': data['timestamp'],
+        'min_year': data['min_year'],
+        'max_age': data['max_age'],
+    }}
+
+
+def _offers(ts: datetime.datetime, count: int):
+    return [CarOffer(ts, id=str(i), price=decimal.Decimal(f'{10000 + i}.99'), make='Škoda', model='Octavia "RS"',
+                     mileage=i * 7919 % 1_100_000, year=1998 + i % 24, voivodeship='mazowieckie',
+                     location='Warszawa\nPraga', imported=bool(i % 2), active=i % 11 != 0)
+            for i in range(count)]
+
+
+def _fixed_offers(ts: datetime.datetime):
+    return [
+        CarOffer(ts, id='1', price=decimal.Decimal('10000.99'), make='Škoda', model='Octavia "RS"', mileage=150000,
+                 year=2005, name='Škoda Octavia', image='image 1', url='url 1', voivodeship='mazowieckie',
+                 location='Warszawa\nPraga', imported=True),
+        CarOffer(ts, id='2', price=decimal.Decimal('25000'), make='Fiat', model='Panda', mileage=50001, year=2015,
+                 name='Fiat Panda', image='image 2', url='url 2', voivodeship='śląskie', location='Katowice',
+                 imported=False),
+        CarOffer(ts, id='3', price=decimal.Decimal('21000.50'), make='Fiat', model='Panda', mileage=70000, year=2015,
+                 name='Fiat Panda 4x4', image='image 3', url='url 3', location='Katowice', imported=False),
+    ]
+
+
+_FIXED_EXPORT = {'data': {
+    'series': [{'x': 15, 'y': 150000}, {'x': 5, 'y': 50001}, {'x': 5, 'y': 70000}],
+    'car_details': [
+        {'image': 'image 1', 'link': 'url 1', 'location': 'mazowieckie, Warszawa\nPraga', 'make': 'Škoda',
+         'mileage': 150000, 'model': 'Octavia "RS"', 'name': 'Škoda Octavia', 'price': 10000, 'year': 2005,
+         'imported': True},
+        {'image': 'image 2', 'link': 'url 2', 'location': 'śląskie, Katowice', 'make': 'Fiat', 'mileage': 50001,
+         'model': 'Panda', 'name': 'Fiat Panda', 'price': 25000, 'year': 2015, 'imported': False},
+        {'image': 'image 3', 'link': 'url 3', 'location': 'Katowice', 'make': 'Fiat', 'mileage': 70000,
+         'model': 'Panda', 'name': 'Fiat Panda 4x4', 'price': 21000, 'year': 2015, 'imported': False},
+    ],
+    'avg_series': [{'x': 15, 'y': 150000}, {'x': 5, 'y': 60000}],
+    'timestamp': 1,
+    'min_year': 2000,
+    'max_age': 20,
+}}
+
+_EMPTY_EXPORT = {'data': {'series': [], 'car_details': [], 'avg_series': [], 'timestamp': 1, 'min_year': 2000,
+                          'max_age': 20}}
+
+
+class TestExportService(TestCase):
+    def test_write_export(self):
+        ts = datetime.datetime(2020, 4, 2)
+        for offers, document in (([], _EMPTY_EXPORT), (_fixed_offers(ts), _FIXED_EXPORT)):
+            with self.subTest(len(offers)):
+                expected = io.StringIO()
+                json.dump(document, expected, indent=2)
+
+                pretty = io.StringIO()
+                write_export(pretty, 1, 2000, 2020, 20, iter(offers), pretty=True)
+                compact = io.StringIO()
+                write_export(compact, 1, 2000, 2020, 20, iter(offers))
+
+                self.assertEqual(expected.getvalue(), pretty.getvalue())
+                self.assertEqual(json.loads(expected.getvalue()), json.loads(compact.getvalue()))
+                self.assertNotIn('\n', compact.getvalue())
+
+    def test_write_columnar_export(self):
+        ts = datetime.datetime(2020, 4, 2)
+        for offers, expected in (([], _EMPTY_EXPORT), (_fixed_offers(ts), _FIXED_EXPORT)):
+            with self.subTest(len(offers)):
+                columnar = io.StringIO()
+                write_columnar_export(columnar, 1, 2000, 2020, 20, iter(offers))
+                data = json.loads(columnar.getvalue())['data']
+
+                self.assertEqual('columns', data['layout'])
+                self.assertEqual(expected, _rows_from_columns(data))
+        self.assertEqual(['\u0160koda', 'Fiat'], data['make']['values'])
+        self.assertEqual([0, 1, 1], data['make']['codes'])
+
+    def test_export_aggregate(self):
+        ts = datetime.datetime(2020, 4, 2)
+        dao = CarOfferDao(MongoClient('mongodb://fakehost/mockdb').get_database().vehicle)
+        dao.insert_multiple(iter(_offers(ts, 200)))
+        meta_dao = Mock()
+        meta_dao.get_timestamp.return_value = ts
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            exports = []
+            for aggregate in (False, True):
+                output = Path(tmpdir) / f'export-{aggregate}.json'
+                ExportService(dao, meta_dao, aggregate).export(output)
+                exports.append(json.loads(output.read_text()))
+
+        self.assertEqual(exports[0], exports[1])
+        self.assertEqual(20, len(exports[0]['data']['avg_series']))
@@ -0,0 +1,54 @@
+import gzip
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import brotli
+
+from carscanner.service.export_artifacts import write_artifacts
+
+
+class TestWriteArtifacts(TestCase):
+    def test_write_artifacts(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'export.json'
+            manifests = []
+            for content in (b'{"data": 1}', b'{"data": 2}', b'{"data": 3}'):
+                path.write_bytes(content)
+                manifests.append(write_artifacts(path))
+
+            manifest = manifests[-1]
+            self.assertEqual(manifest, json.loads((Path(tmpdir) / 'export.manifest.json').read_text()))
+            self.assertEqual(['gzip', 'br'], list(manifest['encodings']))
+            self.assertEqual(b'{"data": 3}', (Path(tmpdir) / manifest['file']).read_bytes())
+            gz = Path(tmpdir) / manifest['encodings']['gzip']['file']
+            self.assertEqual(b'{"data": 3}', gzip.decompress(gz.read_bytes()))
+            self.assertEqual(gz.read_bytes(), (Path(tmpdir) / 'export.json.gz').read_bytes())
+            br = Path(tmpdir) / manifest['encodings']['br']['file']
+            self.assertEqual(path.read_bytes(), brotli.decompress(br.read_bytes()))
+            self.assertEqual(br.read_bytes(), (Path(tmpdir) / 'export.json.br').read_bytes())
+
+            names = {p.name for p in Path(tmpdir).iterdir()}
+            self.assertEqual({'export.json', 'export.json.gz', 'export.json.br', 'export.manifest.json',
+                              manifests[1]['file'], manifests[1]['file'] + '.gz', manifests[1]['file'] + '.br',
+                              manifest['file'], manifest['file'] + '.gz', manifest['file'] + '.br'}, names)
+
+    def test_same_content_same_name(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'export.json'
+            path.write_bytes(b'{}')
+            first = write_artifacts(path)
+            self.assertEqual(first, write_artifacts(path))
+
+    def test_other_directory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / 'data' / 'export.json'
+            path.parent.mkdir()
+            path.write_bytes(b'{}')
+            manifest = write_artifacts(path, Path(tmpdir) / 'artifacts')
+
+            self.assertEqual(['export.json'], [p.name for p in path.parent.iterdir()])
+            self.assertEqual({'export.json.gz', 'export.json.br', 'export.manifest.json', manifest['file'],
+                              manifest['file'] + '.gz', manifest['file'] + '.br'},
+                             {p.name for p in (Path(tmpdir) / 'artifacts').iterdir()})
@@ -3,6 +3,8 @@ from pathlib import Path
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+import git
+
 import carscanner.utils
 from carscanner.service import GitBackupService
 
@@ -46,3 +48,37 @@ class TestGitBackupService(TestCase):
 
         repo_mock.clone_from.assert_called_once_with('remote_repo_uri', data_path, depth=1)
         log_q.put.assert_called_with('Git repo ready')
+
+    def test_do_commit_push_after_two_exports(self):
+        from carscanner.service.export_artifacts import write_artifacts
+        from carscanner.service.git_backup import committer, do_commit_push
+        log_q = Mock()
+        with tempfile.TemporaryDirectory() as tmpDir:
+            remote = git.Repo.init(Path(tmpDir) / 'remote', bare=True)
+            repo_dir = Path(tmpDir) / 'repo'
+            r = git.Repo.clone_from(remote.working_dir, repo_dir)
+            (repo_dir / 'README').write_text('backup')
+            r.index.add(['README'])
+            r.index.commit('init', author=committer, committer=committer)
+            branch = r.active_branch.name
+            r.remote('origin').push(f'HEAD:refs/heads/{branch}')
+
+            export_path = repo_dir / 'export.json'
+            exclude = GitBackupService(Mock(), repo_dir, export_path, Mock(), 'remote_repo_uri',
+                                       repo_dir / 'vehicle')._artifact_globs()
+            (repo_dir / 'vehicle').mkdir()
+            for content in ('{"data": 1}', '{"data": 2}'):
+                (repo_dir / 'vehicle' / f'{content[-2]}.json').write_text(content)
+                export_path.write_text(content)
+                # artifacts written in the clone by mistake
+                write_artifacts(export_path)
+                do_commit_push(repo_dir, log_q, exclude)
+                (repo_dir / 'vehicle' / f'{content[-2]}.json').unlink()
+
+            tree = remote.commit(branch).tree
+            names = {b.path for b in tree.traverse() if b.type == 'blob'}
+            exported = (tree / 'export.json').data_stream.read()
+            log_q.put.assert_not_called()
+
+        self.assertEqual({'README', 'export.json', 'vehicle/2.json'}, names)
+        self.assertEqual(b'{"data": 2}', exported)
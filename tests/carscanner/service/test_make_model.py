@@ -0,0 +1,35 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+from carscanner.service import ModelMatcher, derive_model
+
+
+class TestModelMatcher(TestCase):
+    def setUp(self) -> None:
+        self.matcher = ModelMatcher(['ka', 'kuga', 'focus', 'focus c-max', 'c-max', 'mondeo', 'grand c-max'])
+
+    def test_longest(self):
+        self.assertEqual('Focus c-max', self.matcher.match('Ford Focus C-Max 1.6 TDCi'))
+        self.assertEqual('Grand c-max', self.matcher.match('Ford Grand C-MAX', 'ford focus'))
+
+    def test_word_boundaries(self):
+        self.assertIsNone(self.matcher.match('Kanapa, kamera cofania'))
+        self.assertEqual('Ka', self.matcher.match('Ford KA 1.3'))
+
+    def test_description(self):
+        self.assertEqual('Mondeo', self.matcher.match('Ford 2.0 TDCi', '<p>Sprzedam Forda Mondeo, stan bdb</p>'))
+        self.assertEqual('Mondeo', self.matcher.match(None, 'mondeo'))
+
+    def test_unidecode(self):
+        self.assertEqual('Kuga', ModelMatcher(['kuga']).match('FORD KUGÁ'))
+        self.assertEqual('Citroen c4', ModelMatcher(['citroen c4']).match('Citroën C4'))
+
+    def test_first_of_equal_length(self):
+        self.assertEqual('Kuga', ModelMatcher(['kuga', 'ka 1']).match('ka 1 kuga'))
+
+    def test_derive_model(self):
+        dao = Mock()
+        dao.get_models_by_make = Mock(return_value=['focus'])
+
+        self.assertEqual('Focus', derive_model(dao, 'ford', 'Ford Focus', None))
+        self.assertRaises(ValueError, derive_model, dao, 'ford', None, None)
@@ -0,0 +1,338 @@
+import datetime
+import time
+from concurrent import futures
+from unittest import TestCase
+from unittest.mock import Mock
+
+import zeep.exceptions
+import mongomock
+from allegro_api.models import ListingOffer, ListingResponse, ListingResponseOffers, ListingResponseSearchMeta, \
+    OfferPrice, OfferSellingMode
+
+from carscanner.allegro import ItemInfo, ListingPage
+from carscanner.dao import CheckpointDao, Criteria
+from carscanner.service import OfferService
+from carscanner.service.offers import AdaptiveChunkSize, PriceRange
+
+
+def listing_response(ids, available_count) -> ListingResponse:
+    return ListingResponse(
+        items=ListingResponseOffers(promoted=[], regular=[
+            ListingOffer(id=i, name=i, selling_mode=OfferSellingMode(price=OfferPrice(amount='100.00', currency='PLN')))
+            for i in ids]),
+        search_meta=ListingResponseSearchMeta(available_count=available_count),
+    )
+
+
+class FakeItemsInfo:
+    """get_item_infos stand-in failing for every chunk containing a bad item"""
+    items_limit = 10
+
+    def __init__(self, bad_ids):
+        self.bad_ids = bad_ids
+        self.calls = []
+
+    def __call__(self, ids, *_):
+        self.calls.append(ids)
+        if self.bad_ids.intersection(ids):
+            raise zeep.exceptions.TransportError()
+        return list(ids)
+
+
+class FakeListing:
+    """get_listing stand-in serving two pages per category, the first categories being the slowest"""
+    limit_min = 1
+    limit_max = 2
+
+    def __init__(self, cat_count: int):
+        self.cat_count = cat_count
+
+    def __call__(self, category_id, offset, **_):
+        time.sleep(0.01 * (self.cat_count - int(category_id)))
+        return listing_response([f'{category_id}-{offset}', f'{category_id}-{offset + 1}'], 4)
+
+
+class NewestFirstListing:
+    """get_listing stand-in serving a single category of numbered offers, newest first, two per page"""
+    limit_min = 1
+    limit_max = 2
+
+    def __init__(self, newest: int, count: int):
+        self.ids = [str(i) for i in range(newest, newest - count, -1)]
+        self.offsets = []
+
+    def __call__(self, offset, include, **_):
+        if 'items' in include:
+            self.offsets.append(offset)
+        return listing_response(self.ids[offset:offset + self.limit_max], len(self.ids))
+
+
+class PricedListing:
+    """get_listing stand-in serving offers priced 1 to count zł, filtered by a (from, to) 'price' dynamic filter"""
+    limit_min = 1
+    limit_max = 100
+
+    def __init__(self, count: int):
+        self.count = count
+
+    def __call__(self, offset, limit, dynamic_filters, **_):
+        low, high = dynamic_filters.get('price') or (0, None)
+        high = min(self.count, int(high)) if high is not None else self.count
+        ids = [str(i) for i in range(max(low, 1), high + 1)]
+        return listing_response(ids[offset:offset + limit], len(ids))
+
+
+def offer_service(cat_count: int, executor=None, listing_workers: int = 1, batch_size: int = None,
+                  car_offer_dao=None, pipelined=False, failed_item_dao=None, **kwargs) -> OfferService:
+    allegro = Mock()
+    allegro.get_listing = FakeListing(cat_count)
+    # like CarscannerAllegro without lean_listing, whichever get_listing the test sets
+    allegro.get_listing_page = lambda **kwargs: ListingPage.from_response(allegro.get_listing(**kwargs))
+    allegro.get_items_info.items_limit = 10
+    allegro.get_item_infos = Mock(return_value=[])
+    criteria_dao = Mock()
+    criteria_dao.all = Mock(return_value=[Criteria(str(i), f'cat {i}') for i in range(cat_count)])
+    filter_svc = Mock()
+    filter_svc.transform_filters = Mock(return_value={})
+    builder = Mock()
+    builder.to_car_offers = lambda offers: {o.id: Mock(id=o.id) for o in offers}
+
+    return OfferService(allegro, criteria_dao, builder, car_offer_dao or Mock(), filter_svc,
+                        datetime.datetime.utcnow(), executor or Mock(), listing_workers, batch_size, pipelined,
+                        failed_item_dao, **kwargs)
+
+
+class TestOfferService(TestCase):
+    def test_get_offers_for_all_criteria_serial(self):
+        svc = offer_service(3)
+
+        ids = [o.id for page in svc._get_offers_for_all_criteria() for o in page]
+
+        self.assertEqual(['0-0', '0-1', '0-2', '0-3', '1-0', '1-1', '1-2', '1-3', '2-0', '2-1', '2-2', '2-3'], ids)
+
+    def test_get_offers_for_all_criteria_concurrent_keeps_order(self):
+        with futures.ThreadPoolExecutor(4) as executor:
+            serial = [o.id for page in offer_service(5, executor, 1)._get_offers_for_all_criteria() for o in page]
+            concurrent = [o.id for page in offer_service(5, executor, 4)._get_offers_for_all_criteria() for o in page]
+
+        self.assertEqual(serial, concurrent)
+
+    def test_get_offers_batched(self):
+        dao = Mock()
+        dao.search_existing_ids = Mock(side_effect=lambda ids: [i for i in ids if i.endswith('-0')])
+        svc = offer_service(2, batch_size=3, car_offer_dao=dao)
+
+        svc.get_offers()
+
+        self.assertEqual([['0-0', '0-1', '0-2'], ['0-3', '1-0', '1-1'], ['1-2', '1-3']],
+                         [c.args[0] for c in dao.search_existing_ids.call_args_list])
+        self.assertEqual([['0-1', '0-2'], ['0-3', '1-1'], ['1-2', '1-3']],
+                         [[o.id for o in c.args[0]] for c in dao.insert_multiple.call_args_list])
+        dao.update_status.assert_called_once_with(['0-0', '0-1', '0-2', '0-3', '1-0', '1-1', '1-2', '1-3'],
+                                                  svc.timestamp)
+
+    def test_get_offers_single_batch(self):
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        svc = offer_service(2, car_offer_dao=dao)
+
+        svc.get_offers()
+
+        dao.search_existing_ids.assert_called_once()
+        dao.insert_multiple.assert_called_once()
+        self.assertEqual(8, len(dao.insert_multiple.call_args.args[0]))
+
+    def test_get_offers_run_tag_sweep(self):
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        svc = offer_service(2, car_offer_dao=dao, run_tag_sweep=True)
+
+        svc.get_offers()
+
+        dao.mark_listed.assert_called_once_with(['0-0', '0-1', '0-2', '0-3', '1-0', '1-1', '1-2', '1-3'],
+                                                svc.timestamp)
+        dao.deactivate_unlisted.assert_called_once_with(svc.timestamp)
+        dao.update_status.assert_not_called()
+
+    def test_get_offers_pipelined(self):
+        dao = Mock()
+        dao.search_existing_ids = Mock(side_effect=lambda ids: [i for i in ids if i.endswith('-0')])
+        svc = offer_service(3, car_offer_dao=dao, pipelined=True)
+
+        svc.get_offers()
+
+        inserted = [o.id for c in dao.insert_multiple.call_args_list for o in c.args[0]]
+        self.assertEqual(['0-1', '0-2', '0-3', '1-1', '1-2', '1-3', '2-1', '2-2', '2-3'], inserted)
+        dao.update_status.assert_called_once()
+        self.assertEqual(12, len(dao.update_status.call_args.args[0]))
+
+    def test_get_offers_build_processes(self):
+        from carscanner.service.build_pool import build_executor
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        with build_executor(2) as executor:
+            svc = offer_service(2, car_offer_dao=dao, build_executor=executor, build_workers=2)
+            svc._allegro.get_item_infos = lambda ids, *_: [
+                ItemInfo(i, f'Skoda Octavia {i}', '', 'Grudziądz', 2, ['Osobowe', 'Skoda'],
+                         {'Rok produkcji': ['2010'], 'Przebieg': ['189000']}) for i in ids if not i.endswith('-3')]
+
+            svc.get_offers()
+
+        inserted = [o for c in dao.insert_multiple.call_args_list for o in c.args[0]]
+        self.assertEqual(['0-0', '0-1', '0-2', '1-0', '1-1', '1-2'], [o.id for o in inserted])
+        self.assertEqual(('Skoda', 'Octavia', 'kujawsko-pomorskie', 2010), (inserted[0].make, inserted[0].model,
+                                                                            inserted[0].voivodeship, inserted[0].year))
+        self.assertEqual(svc.timestamp, inserted[0].first_spotted)
+
+    def test_get_items_info_bisect(self):
+        failed_item_dao = Mock()
+        failed_item_dao.get_failures = Mock(return_value={})
+        svc = offer_service(0, failed_item_dao=failed_item_dao)
+        svc._allegro.get_item_infos = FakeItemsInfo({'13'})
+        ids = [str(i) for i in range(16)]
+
+        fetched = [i for chunk in svc._get_items_info(ids) for i in chunk]
+
+        self.assertEqual([i for i in ids if i != '13'], fetched)
+        # chunks of 10 and 6, the failed one split in halves of 3, the failed half split into 1 and 2
+        self.assertEqual(6, len(svc._allegro.get_item_infos.calls))
+        failed_item_dao.add.assert_called_once_with('13', svc.timestamp)
+
+    def test_get_items_info_known_failures(self):
+        failed_item_dao = Mock()
+        failed_item_dao.get_failures = Mock(return_value={'1': 1, '2': 3})
+        svc = offer_service(0, failed_item_dao=failed_item_dao)
+        svc._allegro.get_item_infos = FakeItemsInfo(set())
+
+        fetched = [i for chunk in svc._get_items_info(['0', '1', '2', '3']) for i in chunk]
+
+        self.assertEqual(['0', '3', '1'], fetched)
+        self.assertEqual([['0', '3'], ['1']], svc._allegro.get_item_infos.calls)
+        failed_item_dao.remove.assert_called_once_with('1')
+
+    def test_get_offers_incremental(self):
+        mark_dao = Mock()
+        mark_dao.get_last_full_sweep = Mock(return_value=datetime.datetime.utcnow() - datetime.timedelta(hours=1))
+        mark_dao.get_marks = Mock(return_value={'0': 96})
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        svc = offer_service(1, car_offer_dao=dao, listing_mark_dao=mark_dao, incremental=True)
+        svc._allegro.get_listing = NewestFirstListing(100, 10)
+
+        svc.get_offers()
+
+        # the third page holds only the mark and older offers
+        self.assertEqual([0, 2, 4], svc._allegro.get_listing.offsets)
+        dao.update_status.assert_not_called()
+        mark_dao.update_marks.assert_called_once_with({'0': 100}, svc.timestamp)
+        mark_dao.set_last_full_sweep.assert_not_called()
+
+    def test_get_offers_incremental_full_sweep(self):
+        mark_dao = Mock()
+        mark_dao.get_last_full_sweep = Mock(return_value=datetime.datetime.utcnow() - datetime.timedelta(days=2))
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        svc = offer_service(1, car_offer_dao=dao, listing_mark_dao=mark_dao, incremental=True)
+        svc._allegro.get_listing = NewestFirstListing(100, 10)
+
+        svc.get_offers()
+
+        self.assertEqual([0, 2, 4, 6, 8], svc._allegro.get_listing.offsets)
+        mark_dao.get_marks.assert_not_called()
+        self.assertEqual(10, len(dao.update_status.call_args.args[0]))
+        mark_dao.set_last_full_sweep.assert_called_once_with(svc.timestamp)
+
+    def test_plan_partitions(self):
+        svc = offer_service(0)
+        svc._allegro.get_listing = PricedListing(20000)
+        svc.filter_service.transform_filters = lambda _, filters: {'price': filters.get('cena')}
+
+        parts = svc._plan_partitions(Criteria('0', 'cat 0'))
+
+        counts = [svc._count_offers(Criteria('0', 'cat 0'), p) for p in parts]
+        self.assertTrue(all(c <= 6000 for c in counts), counts)
+        self.assertEqual(20000, sum(counts))
+        self.assertEqual(0, parts[0].low)
+        self.assertIsNone(parts[-1].high)
+        self.assertEqual([p.high for p in parts[:-1]], [p.low for p in parts[1:]])
+
+    def test_plan_partitions_small_category(self):
+        svc = offer_service(0)
+        svc._allegro.get_listing = PricedListing(6000)
+
+        self.assertEqual([None], svc._plan_partitions(Criteria('0', 'cat 0')))
+
+    def test_get_offers_resume(self):
+        checkpoint_dao = CheckpointDao(mongomock.MongoClient().db.checkpoint)
+        checkpoint_dao.start(1)
+        dao = Mock()
+        dao.search_existing_ids = Mock(return_value=[])
+        svc = offer_service(2, car_offer_dao=dao, checkpoint_dao=checkpoint_dao)
+        svc._allegro.get_item_infos.side_effect = ConnectionError
+
+        self.assertRaises(ConnectionError, svc.get_offers)
+
+        svc = offer_service(2, car_offer_dao=dao, checkpoint_dao=checkpoint_dao)
+        svc._allegro.get_listing = Mock(side_effect=AssertionError('listing fetched again'))
+
+        svc.get_offers()
+
+        self.assertEqual(['0-0', '0-1', '0-2', '0-3', '1-0', '1-1', '1-2', '1-3'],
+                         dao.update_status.call_args.args[0])
+        self.assertEqual(8, len(dao.insert_multiple.call_args.args[0]))
+
+    def test_get_partition_offers_checkpoint_per_page(self):
+        from carscanner.dao.checkpoint import listing_page_stage, listing_stage
+        checkpoint_dao = CheckpointDao(mongomock.MongoClient().db.checkpoint)
+        checkpoint_dao.start(1)
+        svc = offer_service(1, checkpoint_dao=checkpoint_dao)
+        stage = listing_stage('0')
+
+        pages = svc._get_partition_offers(Criteria('0', 'cat 0'), None)
+
+        self.assertEqual(['0-0', '0-1'], [o.id for o in next(pages)])
+        self.assertFalse(checkpoint_dao.is_done(stage))
+        self.assertTrue(checkpoint_dao.is_done(listing_page_stage(stage, 0)))
+        self.assertFalse(checkpoint_dao.is_done(listing_page_stage(stage, 2)))
+
+        self.assertEqual([['0-2', '0-3']], [[o.id for o in page] for page in pages])
+        self.assertEqual([0, 2], checkpoint_dao.get(stage))
+
+
+class TestPriceRange(TestCase):
+    def test_split(self):
+        self.assertEqual((PriceRange(10, 100), PriceRange(100, 1000)), PriceRange(10, 1000).split())
+        self.assertEqual((PriceRange(0, 31622), PriceRange(31622, None)), PriceRange(0, None).split())
+        self.assertEqual((PriceRange(1, 2), PriceRange(2, 3)), PriceRange(1, 3).split())
+        self.assertIsNone(PriceRange(1, 2).split())
+
+    def test_to_filter(self):
+        self.assertEqual('(10, Decimal(\'99.99\'))', repr(PriceRange(10, 100).to_filter()))
+        self.assertEqual((10, None), PriceRange(10, None).to_filter())
+
+
+class TestAdaptiveChunkSize(TestCase):
+    def test_adapt(self):
+        size = AdaptiveChunkSize(10, 1.)
+        size.failure()
+        self.assertEqual(5, size.size)
+        size.success(.1)
+        self.assertEqual(6, size.size)
+        size.success(2.)
+        self.assertEqual(5, size.size)
+        for _ in range(10):
+            size.failure()
+        self.assertEqual(1, size.size)
+        for _ in range(20):
+            size.success(.1)
+        self.assertEqual(10, size.size)
+
+
+class TestCheckpointOffer(TestCase):
+    def test_round_trip(self):
+        from carscanner.service.offers import _offer_from_checkpoint, _offer_to_checkpoint
+        offer = ListingPage.from_response(listing_response(['1'], 1)).regular[0]
+
+        restored = _offer_from_checkpoint(_offer_to_checkpoint(offer))
+
+        self.assertEqual(('1', '1', '100.00', 'PLN'), (restored.id, restored.name, restored.amount, restored.currency))
@@ -0,0 +1,49 @@
+import time
+from unittest import TestCase
+
+from carscanner.service.pipeline import Pipeline
+
+
+class TestPipeline(TestCase):
+    def test_run(self):
+        pipeline = Pipeline()
+        numbers = pipeline.pipe(2)
+        result = []
+
+        def produce(stats):
+            for i in range(10):
+                numbers.put(i, stats)
+            numbers.close(stats)
+
+        def consume(stats):
+            for i in numbers.get_all(stats):
+                time.sleep(.001)
+                result.append(i)
+
+        pipeline.add_stage('produce', produce)
+        pipeline.add_stage('consume', consume)
+        stats = pipeline.run()
+
+        self.assertEqual(list(range(10)), result)
+        self.assertEqual(['produce', 'consume'], [s.name for s in stats])
+        self.assertGreater(stats[0].output_wait, 0)
+
+    def test_run_failure_stops_other_stages(self):
+        pipeline = Pipeline()
+        numbers = pipeline.pipe(1)
+
+        def produce(stats):
+            i = 0
+            while True:
+                numbers.put(i, stats)
+                i += 1
+
+        def consume(stats):
+            for i in numbers.get_all(stats):
+                if i == 3:
+                    raise ValueError(i)
+
+        pipeline.add_stage('produce', produce)
+        pipeline.add_stage('consume', consume)
+
+        self.assertRaises(ValueError, pipeline.run)
@@ -0,0 +1,43 @@
+from unittest import TestCase
+from unittest.mock import Mock
+
+import mongomock
+
+from carscanner.dao import CheckpointDao
+from carscanner.service import VehicleUpdaterService
+from carscanner.utils import unix_to_datetime
+
+
+class TestVehicleUpdaterService(TestCase):
+    def test_resume(self):
+        ts = unix_to_datetime(1000)
+        checkpoint_dao = CheckpointDao(mongomock.MongoClient().db.checkpoint)
+        offers_svc = Mock()
+        filter_svc = Mock()
+        filter_svc.load_filters = Mock(return_value=[{'id': 'price'}])
+        backup_svc = Mock()
+        backup_svc.backup = Mock(side_effect=[IOError, None])
+        svc = VehicleUpdaterService(offers_svc, Mock(), filter_svc, ts, backup_svc, Mock(), checkpoint_dao)
+
+        self.assertRaises(IOError, svc.update)
+        svc.update()
+
+        filter_svc.load_filters.assert_called_once()
+        filter_svc.restore_filters.assert_called_once_with([{'id': 'price'}])
+        offers_svc.get_offers.assert_called_once()
+        self.assertEqual(2, backup_svc.backup.call_count)
+        self.assertIsNone(checkpoint_dao.get_run_timestamp())
+
+    def test_new_run(self):
+        checkpoint_dao = CheckpointDao(mongomock.MongoClient().db.checkpoint)
+        offers_svc = Mock()
+        offers_svc.get_offers = Mock(side_effect=[IOError, None])
+        filter_svc = Mock()
+        filter_svc.load_filters = Mock(return_value=[])
+
+        self.assertRaises(IOError, VehicleUpdaterService(offers_svc, Mock(), filter_svc, unix_to_datetime(1000),
+                                                         Mock(), Mock(), checkpoint_dao).update)
+        VehicleUpdaterService(offers_svc, Mock(), filter_svc, unix_to_datetime(2000), Mock(), Mock(),
+                              checkpoint_dao).update()
+
+        self.assertEqual(2, offers_svc.get_offers.call_count)
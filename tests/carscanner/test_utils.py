@@ -1,7 +1,10 @@
 import datetime
+import time
+from concurrent import futures
 from unittest import TestCase
+from unittest.mock import Mock
 
-from carscanner.utils import unix_to_datetime, datetime_to_unix, join_str, chunks
+from carscanner.utils import unix_to_datetime, datetime_to_unix, join_str, chunks, bounded_map, chunks_iter
 
 EPOCH_START = datetime.datetime(1970, 1, 1, 0, 0, 0, 0, datetime.timezone.utc)
 
@@ -40,3 +43,38 @@ class UtilsTest(TestCase):
 
     def test_chunks_empty(self):
         self.assertEqual([], list(chunks([], 8)))
+
+    def test_bounded_map_keeps_order(self):
+        def slow_square(i):
+            time.sleep(0.01 * (5 - i))
+            return i * i
+
+        with futures.ThreadPoolExecutor(5) as executor:
+            self.assertEqual([0, 1, 4, 9, 16], list(bounded_map(executor, slow_square, range(5), 3)))
+
+    def test_bounded_map_empty(self):
+        with futures.ThreadPoolExecutor(1) as executor:
+            self.assertEqual([], list(bounded_map(executor, abs, [], 3)))
+
+    def test_bounded_map_close_cancels_pending(self):
+        submitted = []
+
+        def submit(fn, arg):
+            f = futures.Future()
+            if arg == 0:
+                f.set_result(fn(arg))
+            submitted.append(f)
+            return f
+
+        results = bounded_map(Mock(submit=submit), abs, range(5), 3)
+        self.assertEqual(0, next(results))
+        results.close()
+
+        self.assertEqual(3, len(submitted))
+        self.assertTrue(all(f.cancelled() for f in submitted[1:]))
+
+    def test_chunks_iter(self):
+        self.assertEqual([[0, 1, 2], [3, 4]], list(chunks_iter(iter(range(5)), 3)))
+
+    def test_chunks_iter_empty(self):
+        self.assertEqual([], list(chunks_iter(iter([]), 3)))